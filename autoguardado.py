@@ -0,0 +1,391 @@
+"""
+Módulo de autoguardado
+Diario de cambios de solo añadir junto a la imagen (<imagen>.diario): cada
+edición añade el contenido nuevo de la región que modificó, comprimido. Un
+hilo de fondo escribe los registros y hace fsync por lotes, así que la
+interfaz nunca espera al disco ni se reescribe la imagen entera en cada cambio.
+
+Cada cierto número de operaciones se escribe un punto de control comprimido
+con la imagen entera (<imagen>.diario.punto) y se vacía el diario. Para
+recuperar se parte del punto de control (o del archivo de imagen, si no lo hay
+y no ha cambiado) y se pegan las regiones en orden; un registro incompleto al
+final (el proceso murió mientras escribía) se descarta.
+"""
+
+import json
+import os
+import queue
+import struct
+import threading
+import time
+import uuid
+import zlib
+import numpy as np
+import config
+
+# Cabecera de cada registro: magia, secuencia, tipo, x0, y0, ancho, alto y
+# bytes comprimidos; detrás van los datos y el CRC32 de cabecera + datos
+_MAGIA = b"DIAR"
+_CABECERA = struct.Struct("<4sQBIIIII")
+_CRC = struct.Struct("<I")
+
+INICIO = 0   # Datos: JSON con la generación, el archivo base y (en el punto) la forma
+REGION = 1   # Datos: contenido nuevo de la región (alto x ancho x 3), comprimido
+
+
+def rutas(ruta_imagen):
+    """
+    Returns:
+        tuple: (ruta del diario, ruta del punto de control) de una imagen
+    """
+    diario = str(ruta_imagen) + config.AUTOGUARDADO_EXTENSION
+    return diario, diario + ".punto"
+
+
+def _describir_archivo(ruta):
+    """Tamaño y fecha de modificación de un archivo (None si no existe)"""
+    try:
+        estado = os.stat(ruta)
+    except OSError:
+        return None
+    return {"tamano": estado.st_size, "mtime_ns": estado.st_mtime_ns}
+
+
+def _registro(secuencia, tipo, x0, y0, ancho, alto, datos):
+    """Bytes de un registro completo (cabecera, datos y CRC)"""
+    cabecera = _CABECERA.pack(_MAGIA, secuencia, tipo, x0, y0, ancho, alto, len(datos))
+    return cabecera + datos + _CRC.pack(zlib.crc32(datos, zlib.crc32(cabecera)))
+
+
+def _leer_registros(ruta, datos=True):
+    """
+    Recorre los registros válidos de un archivo hasta el final o hasta el
+    primero incompleto o dañado
+
+    Args:
+        ruta (str): Diario o punto de control
+        datos (bool): False para saltar los datos de las regiones sin leerlos
+            (ni comprobar su CRC); los del INICIO se leen siempre
+
+    Yields:
+        tuple: (secuencia, tipo, x0, y0, ancho, alto, datos o None)
+    """
+    with open(ruta, "rb") as f:
+        tamano = os.fstat(f.fileno()).st_size
+        while True:
+            cabecera = f.read(_CABECERA.size)
+            if len(cabecera) < _CABECERA.size:
+                return
+            magia, secuencia, tipo, x0, y0, ancho, alto, longitud = _CABECERA.unpack(cabecera)
+            if magia != _MAGIA:
+                return
+            if not datos and tipo != INICIO:
+                if f.tell() + longitud + _CRC.size > tamano:
+                    return
+                f.seek(longitud + _CRC.size, os.SEEK_CUR)
+                yield secuencia, tipo, x0, y0, ancho, alto, None
+                continue
+            contenido = f.read(longitud)
+            crc = f.read(_CRC.size)
+            if (len(contenido) < longitud or len(crc) < _CRC.size or
+                    _CRC.unpack(crc)[0] != zlib.crc32(contenido, zlib.crc32(cabecera))):
+                return
+            yield secuencia, tipo, x0, y0, ancho, alto, contenido
+
+
+def _leer_inicio(ruta, datos=True):
+    """
+    Returns:
+        tuple: (información del registro INICIO, iterador con el resto de
+            registros) o (None, None) si el archivo no existe o no empieza por un INICIO
+    """
+    try:
+        registros = _leer_registros(ruta, datos)
+        primero = next(registros, None)
+    except OSError:
+        return None, None
+    if primero is None or primero[1] != INICIO:
+        return None, None
+    return json.loads(primero[6]), registros
+
+
+def _punto_valido(ruta_punto, generacion):
+    """Información del punto de control si pertenece a la generación del diario"""
+    info, _ = _leer_inicio(ruta_punto, datos=False)
+    if info is None or info.get("generacion") != generacion:
+        return None
+    return info
+
+
+def examinar(ruta_imagen):
+    """
+    Cuenta las operaciones que se podrían recuperar del diario de una imagen
+    (sin descomprimir nada)
+
+    Args:
+        ruta_imagen (str): Imagen junto a la que está el diario
+
+    Returns:
+        int: Operaciones sin guardar recuperables (0 si no hay diario o si no
+            se puede reproducir porque la imagen cambió)
+    """
+    ruta_diario, ruta_punto = rutas(ruta_imagen)
+    info, registros = _leer_inicio(ruta_diario, datos=False)
+    if info is None:
+        return 0
+
+    punto = _punto_valido(ruta_punto, info["generacion"])
+    if punto is None and _describir_archivo(ruta_imagen) != info["base"]:
+        return 0
+
+    desde = -1 if punto is None else punto["secuencia"]
+    operaciones = {secuencia for secuencia, tipo, *_ in registros
+                   if tipo == REGION and secuencia > desde}
+    return len(operaciones) + (0 if punto is None else punto["cambios"])
+
+
+def reproducir(ruta_imagen, destino, crear):
+    """
+    Reconstruye la imagen con el punto de control y el diario
+
+    Args:
+        ruta_imagen (str): Imagen junto a la que está el diario
+        destino (ndarray): Copia editable del archivo de imagen (se escribe encima)
+        crear (callable): Recibe una forma (alto, ancho, 3) y devuelve un array
+            editable, para cuando el punto de control tiene otras dimensiones
+
+    Returns:
+        tuple: (imagen recuperada, operaciones reproducidas)
+
+    Raises:
+        ValueError: Si no hay diario, si la imagen cambió desde que se escribió
+            o si un registro no cabe en la imagen
+    """
+    ruta_diario, ruta_punto = rutas(ruta_imagen)
+    info, registros = _leer_inicio(ruta_diario)
+    if info is None:
+        raise ValueError(config.MSG_ERROR_DIARIO_VACIO)
+
+    punto = _punto_valido(ruta_punto, info["generacion"])
+    desde, operaciones = -1, 0
+    if punto is not None:
+        if tuple(punto["forma"]) != destino.shape:
+            destino = crear(tuple(punto["forma"]))
+        _, registros_punto = _leer_inicio(ruta_punto)
+        filas = 0
+        for _, tipo, x0, y0, ancho, alto, datos in registros_punto:
+            if tipo == REGION:
+                _pegar(destino, x0, y0, ancho, alto, datos)
+                filas += alto
+        if filas != destino.shape[0]:
+            raise ValueError(config.MSG_ERROR_DIARIO_PUNTO)
+        desde, operaciones = punto["secuencia"], punto["cambios"]
+    elif _describir_archivo(ruta_imagen) != info["base"]:
+        raise ValueError(config.MSG_ERROR_DIARIO_BASE)
+
+    vistas = set()
+    for secuencia, tipo, x0, y0, ancho, alto, datos in registros:
+        if tipo == REGION and secuencia > desde:
+            _pegar(destino, x0, y0, ancho, alto, datos)
+            vistas.add(secuencia)
+    return destino, operaciones + len(vistas)
+
+
+def _pegar(destino, x0, y0, ancho, alto, datos):
+    """Descomprime el contenido de un registro y lo copia en su región"""
+    if x0 + ancho > destino.shape[1] or y0 + alto > destino.shape[0]:
+        raise ValueError(config.MSG_ERROR_DIARIO_REGION.format(x0, y0, ancho, alto))
+    contenido = np.frombuffer(zlib.decompress(datos), dtype=np.uint8)
+    destino[y0:y0 + alto, x0:x0 + ancho] = contenido.reshape(alto, ancho, 3)
+
+
+def borrar(ruta_imagen):
+    """Elimina el diario y el punto de control de una imagen, si existen"""
+    for ruta in rutas(ruta_imagen):
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+
+
+class DiarioAutoguardado:
+    """Diario de una imagen abierta; el hilo de Tk anota y un hilo de fondo escribe"""
+
+    def __init__(self, ruta_imagen):
+        """
+        Empieza un diario nuevo junto a la imagen (sustituye al que hubiera)
+
+        Args:
+            ruta_imagen (str): Archivo de la imagen; su contenido actual es la
+                base del diario mientras no haya punto de control
+
+        Raises:
+            OSError: Si no se puede escribir en la carpeta de la imagen
+        """
+        self.ruta_imagen = str(ruta_imagen)
+        self.ruta_diario, self.ruta_punto = rutas(ruta_imagen)
+        carpeta = os.path.dirname(os.path.abspath(self.ruta_diario))
+        if not os.access(carpeta, os.W_OK):
+            raise PermissionError(config.MSG_ERROR_DIARIO_CARPETA.format(carpeta))
+
+        self.generacion = uuid.uuid4().hex
+        self.secuencia = 0         # Número del último registro anotado
+        self.cambios = 0           # Operaciones anotadas (0 = nada que recuperar)
+        self.desde_punto = 0       # Operaciones desde el último punto de control
+        self.error = None          # Último error de escritura (el diario deja de escribir)
+        self._descartar = False
+        self._cola = queue.Queue()
+        self._hilo = threading.Thread(target=self._escribir, name="autoguardado", daemon=True)
+        self._hilo.start()
+
+    @property
+    def quiere_punto(self):
+        """True si conviene escribir un punto de control (ver punto_control)"""
+        return self.desde_punto >= config.AUTOGUARDADO_CADA_PUNTO
+
+    # ========== ANOTAR (HILO DE LA INTERFAZ) ==========
+
+    def anotar_region(self, x0, y0, contenido):
+        """
+        Añade al diario el contenido nuevo de una región modificada
+
+        Args:
+            x0, y0 (int): Esquina de la región
+            contenido (ndarray): Copia del contenido (alto x ancho x 3) que ya
+                no se modificará
+        """
+        if self.error is not None:
+            return
+        self.secuencia += 1
+        self.cambios += 1
+        self.desde_punto += 1
+        self._cola.put(("region", self.secuencia, x0, y0, contenido))
+
+    def punto_control(self, imagen, cambios=1):
+        """
+        Escribe la imagen entera como punto de control y vacía el diario
+
+        Args:
+            imagen (ndarray): Imagen actual que ya no se modificará (p. ej. un
+                punto de control del historial); se comprime en segundo plano
+            cambios (int): Operaciones sin guardar que representa por sí mismo
+                (1 si sustituye la imagen, 0 si solo resume lo ya anotado)
+        """
+        if self.error is not None:
+            return
+        self.cambios += cambios
+        self.desde_punto = 0
+        self._cola.put(("punto", self.secuencia, self.cambios, imagen))
+
+    def cerrar(self, borrar=False):
+        """
+        Escribe lo pendiente, termina el hilo de fondo y espera a que acabe
+
+        Args:
+            borrar (bool): True para descartar lo pendiente y eliminar los archivos
+        """
+        self._descartar = borrar
+        self._cola.put(("cerrar", borrar))
+        self._hilo.join()
+
+    # ========== ESCRIBIR (HILO DE FONDO) ==========
+
+    def _escribir(self):
+        """Bucle del hilo de fondo: escribe los registros y hace fsync por lotes"""
+        archivo = None
+        sin_sincronizar = 0
+        ultimo = time.monotonic()
+        while True:
+            try:
+                tarea = self._cola.get(timeout=config.AUTOGUARDADO_INTERVALO_S)
+            except queue.Empty:
+                tarea = None
+
+            try:
+                if tarea is not None and tarea[0] == "cerrar":
+                    if archivo is not None:
+                        self._sincronizar(archivo)
+                        archivo.close()
+                    if tarea[1]:
+                        borrar(self.ruta_imagen)
+                    return
+
+                if self.error is not None or self._descartar:
+                    continue
+                if archivo is None:
+                    archivo = self._empezar()
+
+                if tarea is not None and tarea[0] == "region":
+                    _, secuencia, x0, y0, contenido = tarea
+                    self._escribir_region(archivo, secuencia, x0, y0, contenido)
+                    sin_sincronizar += 1
+                elif tarea is not None and tarea[0] == "punto":
+                    _, secuencia, cambios, imagen = tarea
+                    self._escribir_punto(archivo, secuencia, cambios, imagen)
+                    sin_sincronizar, ultimo = 0, time.monotonic()
+
+                if sin_sincronizar and (sin_sincronizar >= config.AUTOGUARDADO_LOTE or
+                                        time.monotonic() - ultimo >= config.AUTOGUARDADO_INTERVALO_S):
+                    self._sincronizar(archivo)
+                    sin_sincronizar, ultimo = 0, time.monotonic()
+            except (OSError, ValueError, zlib.error) as e:
+                self.error = str(e)
+
+    def _empezar(self):
+        """Crea el diario con su registro INICIO (de forma atómica) y lo abre para añadir"""
+        inicio = _registro(0, INICIO, 0, 0, 0, 0, json.dumps({
+            "generacion": self.generacion,
+            "base": _describir_archivo(self.ruta_imagen),
+        }).encode())
+        temporal = self.ruta_diario + ".tmp"
+        with open(temporal, "wb") as f:
+            f.write(inicio)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.ruta_diario)
+        # Un punto de control de otra generación ya no sirve
+        try:
+            os.remove(self.ruta_punto)
+        except FileNotFoundError:
+            pass
+        self._tamano_inicio = len(inicio)
+        return open(self.ruta_diario, "ab")
+
+    @staticmethod
+    def _sincronizar(archivo):
+        """Vacía el búfer y fuerza la escritura en disco"""
+        archivo.flush()
+        os.fsync(archivo.fileno())
+
+    @staticmethod
+    def _escribir_region(archivo, secuencia, x0, y0, contenido):
+        """Escribe una región como uno o varios registros de franjas de filas"""
+        alto, ancho = contenido.shape[:2]
+        paso = max(1, config.AUTOGUARDADO_BYTES_FRANJA // max(1, ancho * 3))
+        for y in range(0, alto, paso):
+            franja = np.ascontiguousarray(contenido[y:y + paso])
+            datos = zlib.compress(franja, config.AUTOGUARDADO_COMPRESION)
+            archivo.write(_registro(secuencia, REGION, x0, y0 + y, ancho, franja.shape[0], datos))
+
+    def _escribir_punto(self, archivo, secuencia, cambios, imagen):
+        """
+        Escribe el punto de control en un temporal, lo pone en su sitio y deja
+        el diario solo con su INICIO (los registros anteriores ya están en el punto)
+        """
+        temporal = self.ruta_punto + ".tmp"
+        with open(temporal, "wb") as f:
+            f.write(_registro(secuencia, INICIO, 0, 0, 0, 0, json.dumps({
+                "generacion": self.generacion,
+                "secuencia": secuencia,
+                "cambios": cambios,
+                "forma": list(imagen.shape),
+            }).encode()))
+            self._escribir_region(f, secuencia, 0, 0, imagen)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.ruta_punto)
+        # Si el proceso muere antes de truncar, los registros viejos se saltan
+        # al recuperar (su secuencia no es mayor que la del punto)
+        archivo.flush()
+        archivo.truncate(self._tamano_inicio)
+        self._sincronizar(archivo)
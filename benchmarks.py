@@ -0,0 +1,325 @@
+"""
+Benchmarks de rendimiento de ImageHandler (sin interfaz gráfica)
+Mide la latencia y el pico de memoria de cada operación sobre imágenes
+sintéticas de distintos tamaños y compara con una línea base guardada
+
+Uso:
+    python benchmarks.py -o resultados.json
+    python benchmarks.py --tamanos 256 1024 -o nuevos.json --comparar resultados.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+from PIL import Image
+from image_handler import ImageHandler
+from vista import PiramideImagen, Viewport
+import config
+
+
+TAMANOS_POR_DEFECTO = [256, 1024, 2048, 4096, 8192]
+
+
+def imagen_sintetica(lado, semilla=0):
+    """Degradado con ruido: se comprime como una foto real, no como un color plano"""
+    rng = np.random.default_rng(semilla)
+    y, x = np.mgrid[0:lado, 0:lado]
+    base = np.stack([x * 255 // max(1, lado - 1),
+                     y * 255 // max(1, lado - 1),
+                     (x + y) * 255 // max(1, 2 * lado - 2)], axis=-1)
+    ruido = rng.integers(-12, 13, size=base.shape)
+    return np.clip(base + ruido, 0, 255).astype(np.uint8)
+
+
+# ========== CASOS ==========
+# Cada caso es (nombre, preparar, ejecutar). preparar(contexto) deja el estado
+# listo y no se mide; ejecutar(contexto) es lo que se cronometra.
+
+def _preparar_vacio(ctx):
+    pass
+
+
+def _preparar_con_historial(ctx):
+    lado = ctx["lado"]
+    ctx["handler"].modificar_pixeles_rectangulo(0, 0, lado // 2, lado // 2, 10, 20, 30)
+
+
+def _preparar_deshecho(ctx):
+    _preparar_con_historial(ctx)
+    ctx["handler"].deshacer()
+
+
+def _preparar_lote(ctx):
+    if "lote" not in ctx:
+        rng = np.random.default_rng(1)
+        n = min(50_000, ctx["lado"] ** 2 // 4)
+        ctx["lote"] = (rng.integers(0, ctx["lado"], n), rng.integers(0, ctx["lado"], n),
+                       rng.integers(0, 256, (n, 3)))
+
+
+def _preparar_vista(ctx):
+    ctx["piramide"] = PiramideImagen(ctx["handler"].img_array)
+    ctx["viewport"] = Viewport(config.CANVAS_WIDTH, config.CANVAS_HEIGHT)
+    ctx["viewport"].ajustar(ctx["lado"], ctx["lado"])
+
+
+def _preparar_vista_caliente(ctx):
+    _preparar_vista(ctx)
+    ctx["viewport"].renderizar(ctx["piramide"])
+
+
+def _trazo(ctx):
+    h, lado = ctx["handler"], ctx["lado"]
+    h.iniciar_trazo(10, 255, 0, 0)
+    for i in range(100):
+        h.agregar_punto_trazo(i * lado // 100, lado // 2 + (i % 7))
+        if i % 10 == 9:
+            h.procesar_trazo()
+    h.finalizar_trazo()
+
+
+def _actualizar_region_vista(ctx):
+    lado = ctx["lado"]
+    region = (lado // 4, lado // 4, lado // 4 + 64, lado // 4 + 64)
+    ctx["piramide"].invalidar(region)
+    rect = ctx["viewport"].region_en_vista(region)
+    if rect is not None:
+        ctx["viewport"].renderizar(ctx["piramide"], rect)
+
+
+def _preparar_capa(ctx):
+    # Capa transparente con un círculo pequeño encima de la imagen, ya compuesta
+    h, lado = ctx["handler"], ctx["lado"]
+    if h.capas is None:
+        h.agregar_capa()
+    h.modificar_capa(visible=True)
+    h.modificar_pixeles_circulo(lado // 4, lado // 4, 16, 200, 30, 30)
+    h.imagen_visible()
+
+
+def _pintar_y_componer(ctx):
+    lado = ctx["lado"]
+    ctx["handler"].modificar_pixeles_circulo(lado // 2, lado // 2, min(100, lado // 4), 1, 2, 3)
+    ctx["handler"].imagen_visible()
+
+
+def _ocultar_y_componer(ctx):
+    ctx["handler"].modificar_capa(visible=False)
+    ctx["handler"].imagen_visible()
+
+
+CASOS = [
+    ("cargar_imagen", _preparar_vacio,
+     lambda ctx: ctx["handler"].cargar_imagen(ctx["ruta_png"])),
+    ("guardar_imagen", _preparar_vacio,
+     lambda ctx: ctx["handler"].guardar_imagen(ctx["ruta_salida"])),
+    ("modificar_pixel", _preparar_vacio,
+     lambda ctx: ctx["handler"].modificar_pixel(ctx["lado"] // 2, ctx["lado"] // 2, 1, 2, 3)),
+    ("modificar_pixeles_rectangulo", _preparar_vacio,
+     lambda ctx: ctx["handler"].modificar_pixeles_rectangulo(
+         0, 0, ctx["lado"] // 2, ctx["lado"] // 2, 1, 2, 3)),
+    ("modificar_pixeles_circulo", _preparar_vacio,
+     lambda ctx: ctx["handler"].modificar_pixeles_circulo(
+         ctx["lado"] // 2, ctx["lado"] // 2, min(100, ctx["lado"] // 4), 1, 2, 3)),
+    ("modificar_pixeles_elipse", _preparar_vacio,
+     lambda ctx: ctx["handler"].modificar_pixeles_elipse(
+         ctx["lado"] // 2, ctx["lado"] // 2, ctx["lado"] // 4, ctx["lado"] // 8, 1, 2, 3)),
+    ("modificar_pixeles_rectangulo_redondeado", _preparar_vacio,
+     lambda ctx: ctx["handler"].modificar_pixeles_rectangulo_redondeado(
+         0, 0, ctx["lado"] // 2, ctx["lado"] // 2, 16, 1, 2, 3)),
+    ("modificar_pixeles_poligono", _preparar_vacio,
+     lambda ctx: ctx["handler"].modificar_pixeles_poligono(
+         [(0, 0), (ctx["lado"] // 2, 0), (0, ctx["lado"] // 2)], 1, 2, 3)),
+    ("modificar_pixeles_lote", _preparar_lote,
+     lambda ctx: ctx["handler"].modificar_pixeles_lote(*ctx["lote"])),
+    ("trazo_pincel", _preparar_vacio, _trazo),
+    ("filtro_gaussiano", _preparar_vacio,
+     lambda ctx: ctx["handler"].aplicar_filtro("gaussiano", sigma=2.0)),
+    ("filtro_caja", _preparar_vacio,
+     lambda ctx: ctx["handler"].aplicar_filtro("caja", radio=5)),
+    ("filtro_bordes", _preparar_vacio,
+     lambda ctx: ctx["handler"].aplicar_filtro("bordes")),
+    ("ajustar_tonos", _preparar_vacio,
+     lambda ctx: ctx["handler"].ajustar_tonos(brillo=10, contraste=1.2, gamma=0.9)),
+    ("ecualizar_histograma", _preparar_vacio,
+     lambda ctx: ctx["handler"].ecualizar_histograma()),
+    ("obtener_paleta", _preparar_vacio,
+     lambda ctx: ctx["handler"].obtener_paleta(8)),
+    ("cuantizar_paleta", _preparar_vacio,
+     lambda ctx: ctx["handler"].cuantizar_paleta(
+         [(0, 0, 0), (255, 255, 255), (200, 40, 40), (40, 200, 40), (40, 40, 200)])),
+    ("transformar_rotar_bilineal", _preparar_vacio,
+     lambda ctx: ctx["handler"].transformar_pasos([{"rotar": 17}])),
+    ("transformar_rotar_90", _preparar_vacio,
+     lambda ctx: ctx["handler"].transformar_pasos([{"rotar": 90}])),
+    ("obtener_histograma", _preparar_con_historial,
+     lambda ctx: ctx["handler"].obtener_histograma()),
+    ("deshacer", _preparar_con_historial,
+     lambda ctx: ctx["handler"].deshacer()),
+    ("rehacer", _preparar_deshecho,
+     lambda ctx: ctx["handler"].rehacer()),
+    ("restaurar_original", _preparar_vacio,
+     lambda ctx: ctx["handler"].restaurar_original()),
+    ("obtener_color_pixel", _preparar_vacio,
+     lambda ctx: ctx["handler"].obtener_color_pixel(1, 1)),
+    ("obtener_promedio_color_area", _preparar_vacio,
+     lambda ctx: ctx["handler"].obtener_promedio_color_area(0, 0, ctx["lado"] - 1, ctx["lado"] - 1)),
+    ("obtener_estadisticas_region", _preparar_con_historial,
+     lambda ctx: ctx["handler"].obtener_estadisticas_region(0, 0, ctx["lado"] - 1, ctx["lado"] - 1)),
+    ("obtener_imagen_actual", _preparar_vacio,
+     lambda ctx: ctx["handler"].obtener_imagen_actual()),
+    # Conversión para mostrar en CanvasImagen (sin Tk): vista completa y refresco parcial
+    ("vista_renderizar_frio", _preparar_vista,
+     lambda ctx: ctx["viewport"].renderizar(ctx["piramide"])),
+    ("vista_renderizar_caliente", _preparar_vista_caliente,
+     lambda ctx: ctx["viewport"].renderizar(ctx["piramide"])),
+    ("vista_actualizar_region", _preparar_vista_caliente, _actualizar_region_vista),
+    # Al final: dejan una pila de capas en el manejador
+    ("capas_pintar_componer", _preparar_capa, _pintar_y_componer),
+    ("capas_ocultar_componer", _preparar_capa, _ocultar_y_componer),
+]
+
+
+# ========== MEDICIÓN ==========
+
+def medir_caso(ctx, preparar, ejecutar, repeticiones):
+    """
+    Ejecuta un caso varias veces
+
+    Returns:
+        dict: Latencias (segundos) y pico de memoria (bytes) de la operación
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        ctx["handler"].restaurar_original()
+        preparar(ctx)
+        inicio = time.perf_counter()
+        ejecutar(ctx)
+        tiempos.append(time.perf_counter() - inicio)
+
+    # Pasada aparte para la memoria: tracemalloc ralentiza y falsearía los tiempos
+    ctx["handler"].restaurar_original()
+    preparar(ctx)
+    tracemalloc.start()
+    ejecutar(ctx)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "mediana_s": statistics.median(tiempos),
+        "min_s": min(tiempos),
+        "pico_bytes": pico,
+    }
+
+
+def ejecutar_benchmarks(tamanos, repeticiones=3, filtro=None, informar=print):
+    """
+    Mide todos los casos en todos los tamaños
+
+    Args:
+        tamanos (list): Lados de las imágenes cuadradas sintéticas
+        repeticiones (int): Veces que se cronometra cada caso
+        filtro (str): Solo los casos cuyo nombre contenga este texto
+        informar (callable): Recibe una línea por cada medición
+
+    Returns:
+        dict: Metadatos y lista de resultados
+    """
+    resultados = []
+    with tempfile.TemporaryDirectory(prefix="bench_editor_") as carpeta:
+        for lado in tamanos:
+            ruta_png = os.path.join(carpeta, f"sintetica_{lado}.png")
+            Image.fromarray(imagen_sintetica(lado)).save(ruta_png)
+
+            handler = ImageHandler()
+            handler.cargar_imagen(ruta_png)
+            ctx = {"handler": handler, "lado": lado, "ruta_png": ruta_png,
+                   "ruta_salida": os.path.join(carpeta, f"salida_{lado}.png")}
+
+            for nombre, preparar, ejecutar in CASOS:
+                if filtro and filtro not in nombre:
+                    continue
+                medida = medir_caso(ctx, preparar, ejecutar, repeticiones)
+                medida.update({"operacion": nombre, "tamano": lado})
+                resultados.append(medida)
+                informar(f"{nombre:<42} {lado:>6}²  {medida['mediana_s'] * 1000:10.2f} ms  "
+                         f"{medida['pico_bytes'] / 2**20:10.1f} MB")
+            handler.cerrar()
+
+    return {
+        "metadatos": {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "plataforma": platform.platform(),
+            "repeticiones": repeticiones,
+        },
+        "resultados": resultados,
+    }
+
+
+def comparar(actual, base, umbral):
+    """
+    Compara resultados con una línea base
+
+    Args:
+        actual, base (dict): Resultados en el formato de ejecutar_benchmarks
+        umbral (float): Empeoramiento relativo tolerado (0.25 = 25 %)
+
+    Returns:
+        list: Regresiones como (operacion, tamano, métrica, valor base, valor actual)
+    """
+    indice = {(r["operacion"], r["tamano"]): r for r in base["resultados"]}
+    regresiones = []
+    for r in actual["resultados"]:
+        anterior = indice.get((r["operacion"], r["tamano"]))
+        if anterior is None:
+            continue
+        for metrica in ("mediana_s", "pico_bytes"):
+            if r[metrica] > anterior[metrica] * (1 + umbral) and r[metrica] > 0:
+                regresiones.append((r["operacion"], r["tamano"], metrica,
+                                    anterior[metrica], r[metrica]))
+    return regresiones
+
+
+def main(argv=None):
+    """Punto de entrada de la línea de comandos"""
+    parser = argparse.ArgumentParser(description="Benchmarks de ImageHandler sin interfaz")
+    parser.add_argument("--tamanos", type=int, nargs="+", default=TAMANOS_POR_DEFECTO,
+                        help="Lados de las imágenes sintéticas (por defecto 256 a 8192)")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--filtro", default=None, help="Solo casos cuyo nombre contenga este texto")
+    parser.add_argument("-o", "--salida", default=None, help="Archivo JSON de resultados")
+    parser.add_argument("--comparar", default=None, help="Archivo JSON de línea base")
+    parser.add_argument("--umbral", type=float, default=0.25,
+                        help="Empeoramiento relativo que se marca como regresión (0.25 = 25 %%)")
+    args = parser.parse_args(argv)
+
+    resultados = ejecutar_benchmarks(args.tamanos, args.repeticiones, args.filtro)
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            base = json.load(f)
+        regresiones = comparar(resultados, base, args.umbral)
+        for operacion, tamano, metrica, antes, ahora in regresiones:
+            print(f"⚠️ REGRESIÓN {operacion} {tamano}² {metrica}: {antes:.6g} -> {ahora:.6g}")
+        if regresiones:
+            return 1
+        print("Sin regresiones respecto a la línea base")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
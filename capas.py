@@ -0,0 +1,294 @@
+"""
+Módulo de capas
+Pila de capas RGB (opacas) o RGBA (con transparencia) con opacidad,
+visibilidad y modo de fusión. La imagen compuesta se guarda entera y
+dividida en teselas de CAPAS_TESELA píxeles de lado: editar una capa o
+cambiar sus propiedades solo marca como sucias las teselas afectadas, y
+componer recalcula solo esas. Cada capa sabe además en qué teselas tiene
+algún píxel no transparente, así que ocultar, mover o cambiar una capa que
+ocupa poco no toca el resto de la imagen
+"""
+
+import numpy as np
+import config
+
+MODOS = config.CAPAS_MODOS
+
+# Modo -> mezcla del color de la capa (s) con lo que hay debajo (b), en float32 0-255
+_MEZCLAS = {
+    "normal": lambda b, s: s,
+    "multiplicar": lambda b, s: b * s / 255,
+    "pantalla": lambda b, s: 255 - (255 - b) * (255 - s) / 255,
+    "superponer": lambda b, s: np.where(b < 128, 2 * b * s / 255,
+                                        255 - 2 * (255 - b) * (255 - s) / 255),
+    "aclarar": np.maximum,
+    "oscurecer": np.minimum,
+    "diferencia": lambda b, s: np.abs(b - s),
+}
+
+# Bytes de temporales por píxel al componer (resultado, color, mezcla y peso en float32)
+_BYTES_PIXEL = 40
+
+
+class Capa:
+    """Una capa: su lienzo, cómo se mezcla con las de debajo y su propio historial"""
+
+    def __init__(self, nombre, lienzo, original, historial):
+        """
+        Args:
+            nombre (str): Nombre que se muestra
+            lienzo (ndarray): Píxeles (alto x ancho x 3, opaca, o x 4 con alfa)
+            original (ndarray): Lienzo al crear la capa, de solo lectura (estado
+                inicial del historial y destino de restaurar)
+            historial (HistorialComandos): Deshacer/rehacer de esta capa
+        """
+        self.nombre = nombre
+        self.lienzo = lienzo
+        self.original = original
+        self.historial = historial
+        self.opacidad = 1.0
+        self.visible = True
+        self.modo = "normal"
+        self.ocupadas = None       # Teselas con algún píxel no transparente (las fija la pila)
+
+    @property
+    def pixeles(self):
+        """Canales RGB del lienzo (una vista si la capa tiene alfa)"""
+        return self.lienzo if self.lienzo.shape[2] == 3 else self.lienzo[..., :3]
+
+    @property
+    def transparente(self):
+        """True si la capa tiene canal alfa"""
+        return self.lienzo.shape[2] == 4
+
+    @property
+    def tapa(self):
+        """True si la capa oculta por completo lo que tiene debajo"""
+        return not self.transparente and self.modo == "normal" and self.opacidad >= 1
+
+    def descripcion(self):
+        """Propiedades de la capa como diccionario (para la interfaz)"""
+        return {"nombre": self.nombre, "visible": self.visible, "opacidad": self.opacidad,
+                "modo": self.modo, "transparente": self.transparente}
+
+
+class PilaCapas:
+    """Capas de abajo arriba y su imagen compuesta, cacheada por teselas"""
+
+    def __init__(self, fondo, tesela=config.CAPAS_TESELA):
+        """
+        Args:
+            fondo (Capa): Primera capa (normalmente la imagen que ya se editaba)
+            tesela (int): Lado de las teselas de la imagen compuesta
+        """
+        self.alto, self.ancho = fondo.lienzo.shape[:2]
+        self.tesela = tesela
+        forma = (-(-self.alto // tesela), -(-self.ancho // tesela))
+        self.compuesta = np.empty((self.alto, self.ancho, 3), dtype=np.uint8)
+        self.sucias = np.ones(forma, dtype=bool)
+        self.capas = []
+        self.activa = 0
+        self.teselas_compuestas = 0   # Teselas recalculadas en total (para medir)
+        self.agregar(fondo, 0)
+
+    def __len__(self):
+        return len(self.capas)
+
+    @property
+    def capa_activa(self):
+        """Capa que se edita"""
+        return self.capas[self.activa]
+
+    # ========== TESELAS ==========
+
+    def _rango_teselas(self, caja):
+        """Índices (fila_min, col_min, fila_max, col_max) de las teselas que toca una caja"""
+        x_min, y_min, x_max, y_max = caja
+        t = self.tesela
+        return y_min // t, x_min // t, -(-y_max // t), -(-x_max // t)
+
+    def _caja_teselas(self, teselas):
+        """
+        Caja en píxeles que cubre las teselas marcadas de una rejilla
+
+        Returns:
+            tuple: (x_min, y_min, x_max, y_max) o None si no hay ninguna
+        """
+        filas, columnas = np.nonzero(teselas)
+        if len(filas) == 0:
+            return None
+        t = self.tesela
+        return (int(columnas.min()) * t, int(filas.min()) * t,
+                min(self.ancho, (int(columnas.max()) + 1) * t),
+                min(self.alto, (int(filas.max()) + 1) * t))
+
+    def _ocupacion(self, capa, caja=None):
+        """
+        Recalcula en qué teselas (de las que toca la caja) tiene la capa algún
+        píxel no transparente
+
+        Returns:
+            ndarray: Ocupación previa de esas teselas (copia)
+        """
+        if caja is None:
+            caja = (0, 0, self.ancho, self.alto)
+        f0, c0, f1, c1 = self._rango_teselas(caja)
+        previa = capa.ocupadas[f0:f1, c0:c1].copy()
+        if not capa.transparente:
+            capa.ocupadas[f0:f1, c0:c1] = True
+            return previa
+
+        t = self.tesela
+        inicios = np.arange(c0, c1) * t - c0 * t
+        for fila in range(f0, f1):
+            bloque = capa.lienzo[fila * t:(fila + 1) * t, c0 * t:c1 * t, 3]
+            columnas = bloque.any(axis=0)
+            capa.ocupadas[fila, c0:c1] = np.logical_or.reduceat(columnas, inicios)
+        return previa
+
+    def invalidar(self, caja=None):
+        """
+        Marca como sucias las teselas que toca una caja (None = todas)
+
+        Returns:
+            tuple: Caja de las teselas marcadas (para redibujar)
+        """
+        if caja is None:
+            self.sucias[:] = True
+            return 0, 0, self.ancho, self.alto
+        f0, c0, f1, c1 = self._rango_teselas(caja)
+        self.sucias[f0:f1, c0:c1] = True
+        t = self.tesela
+        return c0 * t, f0 * t, min(self.ancho, c1 * t), min(self.alto, f1 * t)
+
+    def invalidar_capa(self, capa):
+        """
+        Marca como sucias las teselas donde la capa tiene contenido (tras
+        cambiar su visibilidad, opacidad, modo o posición)
+
+        Returns:
+            tuple: Caja de esas teselas o None si la capa está vacía
+        """
+        self.sucias |= capa.ocupadas
+        return self._caja_teselas(capa.ocupadas)
+
+    def pintada(self, capa, caja):
+        """
+        Anota que se editó una caja de una capa: actualiza su ocupación y
+        marca las teselas donde la capa tenía o tiene ahora contenido
+
+        Returns:
+            tuple: Caja de las teselas marcadas o None si la composición no cambia
+        """
+        previa = self._ocupacion(capa, caja)
+        if not capa.visible:
+            return None
+        f0, c0, f1, c1 = self._rango_teselas(caja)
+        cambian = np.zeros_like(self.sucias)
+        cambian[f0:f1, c0:c1] = previa | capa.ocupadas[f0:f1, c0:c1]
+        self.sucias |= cambian
+        return self._caja_teselas(cambian)
+
+    # ========== CAPAS ==========
+
+    def agregar(self, capa, posicion):
+        """
+        Inserta una capa (de las dimensiones de la pila) y la hace activa
+
+        Returns:
+            tuple: Caja de las teselas que cambian o None
+        """
+        capa.ocupadas = np.zeros_like(self.sucias)
+        self._ocupacion(capa)
+        self.capas.insert(posicion, capa)
+        self.activa = posicion
+        return self.invalidar_capa(capa)
+
+    def quitar(self, indice):
+        """
+        Saca una capa de la pila (la activa pasa a ser la de debajo)
+
+        Returns:
+            tuple: (capa, caja de las teselas que cambian o None)
+        """
+        capa = self.capas.pop(indice)
+        if self.activa >= indice:
+            self.activa = max(0, self.activa - 1)
+        return capa, self.invalidar_capa(capa)
+
+    def mover(self, indice, destino):
+        """
+        Cambia una capa de posición: la composición solo cambia donde ella tiene contenido
+
+        Returns:
+            tuple: Caja de las teselas que cambian o None
+        """
+        activa = self.capas[self.activa]
+        capa = self.capas.pop(indice)
+        self.capas.insert(destino, capa)
+        self.activa = self.capas.index(activa)
+        return self.invalidar_capa(capa)
+
+    # ========== COMPOSICIÓN ==========
+
+    def componer(self):
+        """
+        Recalcula las teselas sucias de la imagen compuesta; las teselas
+        contiguas de una misma fila se componen de una vez
+
+        Returns:
+            ndarray: Imagen compuesta (alto x ancho x 3, uint8), al día
+        """
+        if not self.sucias.any():
+            return self.compuesta
+
+        t = self.tesela
+        por_bloque = max(1, config.CAPAS_BYTES_BLOQUE // (t * t * _BYTES_PIXEL))
+        for fila in np.flatnonzero(self.sucias.any(axis=1)).tolist():
+            columnas = np.flatnonzero(self.sucias[fila])
+            # Tramos de teselas sucias consecutivas, partidos a por_bloque teselas
+            cortes = np.flatnonzero(np.diff(columnas) != 1) + 1
+            for tramo in np.split(columnas, cortes):
+                for inicio in range(0, len(tramo), por_bloque):
+                    c0 = int(tramo[inicio])
+                    c1 = int(tramo[min(len(tramo), inicio + por_bloque) - 1]) + 1
+                    self._componer_bloque(fila, c0, c1)
+            self.teselas_compuestas += len(columnas)
+            self.sucias[fila] = False
+        return self.compuesta
+
+    def _componer_bloque(self, fila, c0, c1):
+        """Compone las teselas [c0, c1) de una fila de teselas"""
+        t = self.tesela
+        y0, y1 = fila * t, min(self.alto, (fila + 1) * t)
+        x0, x1 = c0 * t, min(self.ancho, c1 * t)
+        destino = self.compuesta[y0:y1, x0:x1]
+
+        # Solo cuentan las capas visibles con contenido en el bloque; por debajo
+        # de la última que tapa no hace falta mirar
+        capas = [capa for capa in self.capas
+                 if capa.visible and capa.opacidad > 0 and capa.ocupadas[fila, c0:c1].any()]
+        tapan = [i for i, capa in enumerate(capas) if capa.tapa]
+        if tapan:
+            capas = capas[tapan[-1]:]
+            if len(capas) == 1:
+                destino[...] = capas[0].lienzo[y0:y1, x0:x1]
+                return
+            resultado = capas.pop(0).lienzo[y0:y1, x0:x1].astype(np.float32)
+        else:
+            resultado = np.empty(destino.shape, dtype=np.float32)
+            resultado[...] = config.CAPAS_FONDO
+
+        for capa in capas:
+            fuente = capa.lienzo[y0:y1, x0:x1]
+            mezcla = _MEZCLAS[capa.modo](resultado, fuente[..., :3].astype(np.float32))
+            mezcla -= resultado
+            if capa.transparente:
+                mezcla *= fuente[..., 3:].astype(np.float32) * np.float32(capa.opacidad / 255)
+            else:
+                mezcla *= np.float32(capa.opacidad)
+            resultado += mezcla
+
+        resultado += 0.5
+        np.clip(resultado, 0, 255, out=resultado)
+        destino[...] = resultado.astype(np.uint8)
@@ -0,0 +1,242 @@
+"""
+Módulo de comandos de edición
+Cada edición se describe con un registro pequeño (operación + parámetros) que
+puede volver a aplicarse sobre la imagen completa o sobre un recorte de ella
+"""
+
+import numpy as np
+import mascaras
+import paleta
+import relleno
+import tonos
+
+
+def _mascara_desde_bits(bits, forma):
+    """Reconstruye una máscara guardada con np.packbits"""
+    alto, ancho = forma
+    return np.unpackbits(bits, count=alto * ancho).reshape(alto, ancho).view(bool)
+
+
+# Operación -> función que devuelve (x0, y0, máscara) a partir de los parámetros
+_MASCARAS = {
+    "pixel": lambda x, y, color: (x, y, mascaras.mascara_rectangulo(1, 1)),
+    "rectangulo": lambda x0, y0, ancho, alto, color:
+        (x0, y0, mascaras.mascara_rectangulo(ancho, alto)),
+    "rectangulo_redondeado": lambda x0, y0, ancho, alto, radio, color:
+        (x0, y0, mascaras.mascara_rectangulo_redondeado(ancho, alto, radio)),
+    "circulo": lambda x0, y0, radio, color: (x0, y0, mascaras.mascara_circulo(radio)),
+    "elipse": lambda x0, y0, radio_x, radio_y, color:
+        (x0, y0, mascaras.mascara_elipse(radio_x, radio_y)),
+    "poligono": lambda vertices, color: mascaras.mascara_poligono(vertices),
+    "mascara": lambda x0, y0, bits, forma, color: (x0, y0, _mascara_desde_bits(bits, forma)),
+}
+
+
+class Comando:
+    """Operación de edición registrada en el historial"""
+
+    __slots__ = ("operacion", "parametros", "region", "nbytes")
+
+    # Operaciones que sustituyen la imagen entera (el historial guarda la
+    # imagen antes y después en lugar de volver a aplicarlas)
+    REEMPLAZOS = ("transformar",)
+
+    def __init__(self, operacion, parametros, alto, ancho):
+        """
+        Args:
+            operacion (str): Nombre de la operación (clave de _MASCARAS, "lote",
+                "trazo", "parche", "lut", "reemplazo", "paleta" o "transformar")
+            parametros (tuple): Parámetros de la operación; el color va al final
+                (salvo en "parche": (x0, y0, contenido), en "lut":
+                (x_min, y_min, x_max, y_max, lut) y en "transformar":
+                (matriz, interpolacion, fondo)); en "reemplazo":
+                (x_min, y_min, x_max, y_max, origen, tolerancia, modo, bits, forma, color)
+                con la máscara de la caja (ya recortada a la imagen) empaquetada en
+                bits y forma, o ambos None; en "paleta":
+                (x_min, y_min, x_max, y_max, colores, bits, forma)
+            alto, ancho (int): Dimensiones de la imagen (para recortar la región;
+                en "transformar", las de la imagen resultante)
+        """
+        self.operacion = operacion
+        self.parametros = parametros
+        self.region = self._calcular_region(alto, ancho)
+        self.nbytes = self._calcular_nbytes()
+
+    @classmethod
+    def desde_region(cls, operacion, parametros, region):
+        """Recrea un comando guardado (p. ej. en un proyecto) con su región ya calculada"""
+        comando = cls.__new__(cls)
+        comando.operacion = operacion
+        comando.parametros = parametros
+        comando.region = region
+        comando.nbytes = comando._calcular_nbytes()
+        return comando
+
+    def _calcular_nbytes(self):
+        """Memoria que ocupa el comando; un contenido en disco (memmap) no cuenta"""
+        return 64 + sum(p.nbytes for p in self.parametros
+                        if isinstance(p, np.ndarray) and not isinstance(p, np.memmap))
+
+    @classmethod
+    def desde_mascara(cls, x0, y0, mascara, color, alto, ancho):
+        """Comando para una máscara arbitraria (se guarda empaquetada, 1 bit por píxel)"""
+        mascara = np.asarray(mascara, dtype=bool)
+        return cls("mascara", (x0, y0, np.packbits(mascara), mascara.shape, color), alto, ancho)
+
+    @property
+    def reemplaza(self):
+        """True si el comando sustituye la imagen entera (no se puede repetir por regiones)"""
+        return self.operacion in self.REEMPLAZOS
+
+    def _calcular_region(self, alto, ancho):
+        """Caja (x_min, y_min, x_max, y_max) que el comando modifica, o None"""
+        if self.reemplaza:
+            return 0, 0, ancho, alto
+
+        if self.operacion == "lote":
+            xs, ys, _ = self.parametros
+            if len(xs) == 0:
+                return None
+            return int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1
+
+        if self.operacion == "parche":
+            x0, y0, contenido = self.parametros
+            x_min, y_min = max(0, x0), max(0, y0)
+            x_max = min(ancho, x0 + contenido.shape[1])
+            y_max = min(alto, y0 + contenido.shape[0])
+            if x_max <= x_min or y_max <= y_min:
+                return None
+            return x_min, y_min, x_max, y_max
+
+        if self.operacion in ("lut", "reemplazo", "paleta"):
+            x_min, y_min, x_max, y_max = self.parametros[:4]
+            x_min, y_min = max(0, x_min), max(0, y_min)
+            x_max, y_max = min(ancho, x_max), min(alto, y_max)
+            if x_max <= x_min or y_max <= y_min:
+                return None
+            return x_min, y_min, x_max, y_max
+
+        if self.operacion == "trazo":
+            centros, radio, _ = self.parametros
+            if len(centros) == 0:
+                return None
+            x_min = max(0, int(centros[:, 0].min()) - radio)
+            y_min = max(0, int(centros[:, 1].min()) - radio)
+            x_max = min(ancho, int(centros[:, 0].max()) + radio + 1)
+            y_max = min(alto, int(centros[:, 1].max()) + radio + 1)
+            if x_max <= x_min or y_max <= y_min:
+                return None
+            return x_min, y_min, x_max, y_max
+
+        x0, y0, mascara = self._mascara((0, 0, ancho, alto))
+        recorte = mascaras.recortar_mascara(alto, ancho, x0, y0, mascara)
+        return None if recorte is None else recorte[:4]
+
+    def _mascara(self, caja):
+        """
+        (x0, y0, máscara) de una operación de _MASCARAS; el polígono solo se
+        rasteriza dentro de caja (x_min, y_min, x_max, y_max)
+        """
+        if self.operacion == "poligono":
+            return mascaras.mascara_poligono(self.parametros[0], caja)
+        return _MASCARAS[self.operacion](*self.parametros)
+
+    def aplicar(self, destino, x_off=0, y_off=0):
+        """
+        Aplica el comando sobre una imagen o sobre un recorte de ella
+
+        Sobre un lienzo RGBA (una capa transparente) las operaciones de pintar
+        dejan opacos los píxeles que pintan; las demás solo cambian el color.
+
+        Args:
+            destino (ndarray): Imagen o recorte donde escribir (x 3 o x 4 canales)
+            x_off, y_off (int): Posición de destino[0, 0] en la imagen completa
+
+        Returns:
+            int: Número de píxeles escritos dentro de destino
+        """
+        if self.reemplaza:
+            raise ValueError(f"'{self.operacion}' sustituye la imagen y no se aplica por regiones")
+
+        alto, ancho = destino.shape[:2]
+
+        if self.operacion == "lote":
+            xs, ys, colores = self.parametros
+            xs = xs - x_off
+            ys = ys - y_off
+            dentro = (xs >= 0) & (xs < ancho) & (ys >= 0) & (ys < alto)
+            if colores.ndim == 2:
+                colores = colores[dentro]
+            if destino.shape[2] == 4:
+                destino[ys[dentro], xs[dentro], 3] = 255
+                destino = destino[..., :3]
+            destino[ys[dentro], xs[dentro]] = colores
+            return int(np.count_nonzero(dentro))
+
+        if self.operacion == "parche":
+            # Contenido ya calculado (p. ej. un filtro): se copia la intersección
+            x0, y0, contenido = self.parametros
+            x0, y0 = x0 - x_off, y0 - y_off
+            xa, ya = max(0, x0), max(0, y0)
+            xb = min(ancho, x0 + contenido.shape[1])
+            yb = min(alto, y0 + contenido.shape[0])
+            if xb <= xa or yb <= ya:
+                return 0
+            # En una capa transparente el contenido (RGB) no cambia el alfa
+            fuente = contenido[ya - y0:yb - y0, xa - x0:xb - x0]
+            destino[ya:yb, xa:xb, :fuente.shape[2]] = fuente
+            return (xb - xa) * (yb - ya)
+
+        if self.operacion == "lut":
+            # Operación punto a punto: se puede repetir sobre cualquier recorte
+            x_min, y_min, x_max, y_max, lut = self.region + (self.parametros[-1],)
+            xa, ya = max(0, x_min - x_off), max(0, y_min - y_off)
+            xb, yb = min(ancho, x_max - x_off), min(alto, y_max - y_off)
+            if xb <= xa or yb <= ya:
+                return 0
+            zona = destino[ya:yb, xa:xb, :3]
+            tonos.aplicar_lut(zona, lut, zona)
+            return (xb - xa) * (yb - ya)
+
+        if self.operacion in ("reemplazo", "paleta"):
+            # Dependen solo del color de cada píxel: se repiten sobre cualquier recorte
+            x_min, y_min, x_max, y_max = self.region
+            if self.operacion == "reemplazo":
+                origen, tolerancia, modo, bits, forma, color = self.parametros[4:]
+            else:
+                colores, bits, forma = self.parametros[4:]
+            xa, ya = max(0, x_min - x_off), max(0, y_min - y_off)
+            xb, yb = min(ancho, x_max - x_off), min(alto, y_max - y_off)
+            if xb <= xa or yb <= ya:
+                return 0
+            mascara = None
+            if bits is not None:
+                mx, my = xa + x_off - x_min, ya + y_off - y_min
+                mascara = _mascara_desde_bits(bits, forma)[my:my + yb - ya, mx:mx + xb - xa]
+            zona = destino[ya:yb, xa:xb, :3]
+            if self.operacion == "paleta":
+                return paleta.cuantizar(zona, colores, mascara)
+            return relleno.reemplazar_color(zona, origen, tolerancia, modo, color, mascara)
+
+        color = self.parametros[-1]
+        if destino.shape[2] == 4 and len(color) == 3:
+            color = (*color, 255)
+
+        if self.operacion == "trazo":
+            centros, radio, _ = self.parametros
+            sello = mascaras.mascara_circulo(radio)
+            union = np.zeros((alto, ancho), dtype=bool)
+            for cx, cy in centros.tolist():
+                recorte = mascaras.recortar_mascara(alto, ancho, cx - radio - x_off,
+                                                    cy - radio - y_off, sello)
+                if recorte is not None:
+                    sx0, sy0, sx1, sy1, sub = recorte
+                    union[sy0:sy1, sx0:sx1] |= sub
+            return mascaras.rellenar_mascara(destino, 0, 0, union, color)
+
+        x0, y0, mascara = self._mascara((x_off, y_off, x_off + ancho, y_off + alto))
+        recorte = mascaras.recortar_mascara(alto, ancho, x0 - x_off, y0 - y_off, mascara)
+        if recorte is None:
+            return 0
+        x_min, y_min, _, _, sub = recorte
+        return mascaras.rellenar_mascara(destino, x_min, y_min, sub, color)
@@ -18,12 +18,15 @@ COLOR_TEXT_COORDS = "#7f8c8d"
 COLOR_RED = "#e74c3c"
 COLOR_GREEN = "#27ae60"
 COLOR_BLUE = "#3498db"
+COLOR_LUMINANCIA = "#7f8c8d"
 
 # ========== FORMATOS DE IMAGEN ==========
 IMAGE_FORMATS = [
     ("Imágenes", "*.png *.jpg *.jpeg *.bmp *.gif"),
     ("PNG", "*.png"),
     ("JPEG", "*.jpg *.jpeg"),
+    ("Array NumPy (imagen grande)", "*.npy"),
+    ("Proyecto del editor", "*.edproj"),
     ("Todos los archivos", "*.*")
 ]
 
@@ -36,28 +39,257 @@ SAVE_FORMATS = [
 
 DEFAULT_SAVE_EXTENSION = ".png"
 
+# ========== PROYECTOS ==========
+# Formato nativo: original, imagen actual, historial y metadatos sin comprimir
+PROYECTO_EXTENSION = ".edproj"
+PROYECTO_FORMATS = [
+    ("Proyecto del editor", "*.edproj"),
+    ("Todos los archivos", "*.*")
+]
+# Cada array del proyecto empieza en un múltiplo de estos bytes (una página) para proyectarlo con memmap
+PROYECTO_ALINEACION = 4096
+
 # ========== CANVAS ==========
 CANVAS_WIDTH = 400
 CANVAS_HEIGHT = 400
 CANVAS_CENTER_X = 200
 CANVAS_CENTER_Y = 200
 
+# ========== VISTA (ZOOM Y PIRÁMIDE) ==========
+ZOOM_PASO = 1.25               # Factor de zoom por paso de la rueda
+ZOOM_MAX = 32.0                # Píxeles de pantalla por píxel de imagen como máximo
+PIRAMIDE_TAMANO_BLOQUE = 256   # Lado de los bloques de cada nivel de la pirámide
+PIRAMIDE_MAX_BLOQUES = 256     # Bloques reducidos que se guardan en caché
+
+# ========== IMÁGENES GRANDES ==========
+# A partir de este número de píxeles la imagen se abre sobre un memmap en disco
+UMBRAL_IMAGEN_GRANDE = 100_000_000
+# Tamaño (en bytes) de cada franja que se decodifica o copia de una vez
+TESELA_BYTES = 32 * 1024 * 1024
+# Carpeta para los archivos de trabajo (None = carpeta temporal del sistema)
+DIRECTORIO_IMAGENES_GRANDES = None
+
 # ========== HISTORIAL ==========
-MAX_HISTORIAL = 10
+# Memoria máxima (en bytes) de los comandos y puntos de control guardados para deshacer
+MAX_HISTORIAL_BYTES = 64 * 1024 * 1024
+# Píxeles reescritos por los comandos, en imágenes completas, entre dos copias
+# completas de la imagen (puntos de control): acota lo que repite deshacer
+HISTORIAL_IMAGENES_ENTRE_PUNTOS = 4
+# Fracción del presupuesto que puede ocupar un punto de control en memoria (uno
+# mayor se guarda en disco) y los comandos desde el último (al llegar, se toma otro)
+HISTORIAL_FRACCION_PUNTO = 0.25
+
+# ========== MÁSCARAS ==========
+# Número de máscaras recientes (por forma y tamaño) que se guardan en caché
+MAX_MASCARAS_CACHE = 32
+
+# ========== RELLENO Y VARITA MÁGICA ==========
+# Tolerancia de color por defecto y vecindad (4 = en cruz, 8 = también en diagonal)
+RELLENO_TOLERANCIA = 32
+RELLENO_CONEXION = 4
+# Tope de memoria temporal por franja al comparar colores (relleno, varita y reemplazo)
+RELLENO_BYTES_FRANJA = 4 * 1024 * 1024
+# Formas de medir la diferencia de color: por canal, euclídea RGB y ΔE en CIE Lab
+DISTANCIAS_COLOR = ("canal", "euclidea", "perceptual")
+
+# ========== PALETAS ==========
+# Colores que se extraen por defecto y máximo que ofrece la interfaz
+PALETA_COLORES = 8
+PALETA_MAX_COLORES = 32
+# Métodos de agrupación: k-means o corte por la mediana
+PALETA_METODOS = ("kmeans", "mediana")
+# Píxeles que se muestrean (con semilla fija: mismo resultado para la misma imagen)
+PALETA_MUESTRAS = 50000
+PALETA_SEMILLA = 0
+PALETA_ITERACIONES = 20
+# Paletas recientes que se guardan por versión de la imagen
+PALETA_CACHE = 8
+# Tope de memoria temporal por franja al cuantizar
+PALETA_BYTES_FRANJA = 8 * 1024 * 1024
+
+# ========== CAPAS ==========
+# Lado (en píxeles) de las teselas en que se cachea la imagen compuesta
+CAPAS_TESELA = 256
+# Tope de memoria temporal al componer un bloque de teselas contiguas
+CAPAS_BYTES_BLOQUE = 8 * 1024 * 1024
+# Modos de fusión de una capa con las de debajo
+CAPAS_MODOS = ("normal", "multiplicar", "pantalla", "superponer", "aclarar", "oscurecer",
+               "diferencia")
+# Color que queda bajo las capas transparentes (la imagen compuesta es RGB)
+CAPAS_FONDO = (255, 255, 255)
+CAPAS_NOMBRE_FONDO = "Fondo"
+CAPAS_NOMBRE = "Capa {}"
+
+# ========== PINCEL ==========
+# Distancia entre sellos consecutivos, como fracción del radio del pincel
+PINCEL_ESPACIADO = 0.25
+# Milisegundos entre lotes de sellos (aprox. un fotograma)
+PINCEL_INTERVALO_MS = 16
+
+# ========== ESTADÍSTICAS ==========
+# Lado de las teselas de las tablas integrales locales (sumas en uint32)
+ESTADISTICAS_TESELA = 64
+# Tablas integrales locales (96 KB cada una con teselas de 64) que se conservan
+# para las teselas del borde de las consultas; el resto solo guarda su total
+ESTADISTICAS_TESELAS_CACHE = 512
+
+# ========== FILTROS ==========
+# Filas de cada franja que procesa un hilo (más un margen solapado)
+FILTRO_FILAS_FRANJA = 256
+# Hilos para los filtros (None = uno por núcleo)
+FILTRO_HILOS = None
+# Límites de los parámetros de los filtros
+FILTRO_SIGMA_MAX = 50.0
+FILTRO_RADIO_MAX = 100
+
+# ========== AJUSTES DE TONO ==========
+# Bytes de índices temporales por franja al aplicar una LUT (mejor si cabe en caché)
+TONO_BYTES_FRANJA = 1024 * 1024
+# Límites de los parámetros de los ajustes
+TONO_CONTRASTE_MAX = 5.0
+TONO_GAMMA_MIN = 0.1
+TONO_GAMMA_MAX = 5.0
+
+# ========== TRANSFORMACIONES GEOMÉTRICAS ==========
+# Bytes de temporales por franja al remuestrear y estimación de bytes por píxel de salida
+TRANSFORMACION_BYTES_FRANJA = 8 * 1024 * 1024
+TRANSFORMACION_BYTES_PIXEL = 128
+# Tamaño máximo de la imagen transformada (una perspectiva extrema puede crecer mucho)
+TRANSFORMACION_MAX_PIXELES = 400_000_000
+TRANSFORMACION_INTERPOLACION = "bilineal"
+
+# ========== HISTOGRAMAS ==========
+# Bytes de imagen por franja al contar (bincount trabaja sobre una copia de cada canal)
+HISTOGRAMA_BYTES_FRANJA = 1024 * 1024
+# Bytes máximos de una región que se copia antes de editarla para actualizar el
+# histograma solo con los píxeles que cambian (por encima se cuenta la región entera)
+HISTOGRAMA_MAX_COPIA_BYTES = 256 * 1024 * 1024
+# Porcentaje que se descarta en cada extremo en los niveles automáticos
+AUTONIVELES_RECORTE = 0.5
+# Milisegundos entre consultas del panel de histograma
+HISTOGRAMA_INTERVALO_MS = 200
+
+# ========== ARRANQUE ==========
+# Importar NumPy, PIL y el manejador en segundo plano en cuanto se muestra la ventana
+PRECARGAR_MODULOS = True
+
+# ========== CARGA Y GUARDADO EN SEGUNDO PLANO ==========
+# Bytes que se leen del archivo entre dos avisos de progreso
+LECTURA_BLOQUE_BYTES = 1024 * 1024
+# Milisegundos entre consultas del progreso desde la interfaz
+PROGRESO_INTERVALO_MS = 100
+
+# ========== EVENTOS DEL MOUSE ==========
+# Milisegundos mínimos entre dos actualizaciones por movimiento (aprox. un fotograma)
+MOVIMIENTO_INTERVALO_MS = 16
+# Latencias recientes que se guardan para las métricas del movimiento
+MOVIMIENTO_MUESTRAS_LATENCIA = 256
+
+# ========== AUTOGUARDADO ==========
+# Diario de cambios junto a la imagen abierta para recuperarlos si el editor se cierra mal
+AUTOGUARDADO_ACTIVO = True
+AUTOGUARDADO_EXTENSION = ".diario"
+# Registros escritos entre dos fsync y segundos máximos sin hacer fsync
+AUTOGUARDADO_LOTE = 16
+AUTOGUARDADO_INTERVALO_S = 2.0
+# Operaciones entre dos puntos de control comprimidos (la imagen entera)
+AUTOGUARDADO_CADA_PUNTO = 256
+# Bytes sin comprimir de cada registro y nivel de zlib (1 = el más rápido)
+AUTOGUARDADO_BYTES_FRANJA = 8 * 1024 * 1024
+AUTOGUARDADO_COMPRESION = 1
+
+# ========== INSTRUMENTACIÓN ==========
+# Medir tiempo y píxeles de cada operación y callback (coste: unos microsegundos)
+INSTRUMENTACION_ACTIVA = True
+# Llamadas recientes por operación que se guardan para los percentiles
+INSTRUMENTACION_MUESTRAS = 512
+# Medir también los bytes asignados con tracemalloc (ralentiza mucho las operaciones)
+INSTRUMENTACION_MEMORIA = False
+# Archivo de traza JSON lines (None = no escribir traza)
+INSTRUMENTACION_TRAZA = None
+# Milisegundos entre refrescos del panel de estadísticas (Ctrl+Mayús+E)
+INSTRUMENTACION_INTERVALO_MS = 1000
 
 # ========== MENSAJES ==========
 MSG_NO_IMAGE = "No hay imagen cargada"
 MSG_NO_IMAGE_WARNING = "No hay imagen cargada"
 MSG_NO_IMAGE_TO_SAVE = "No hay imagen para guardar"
 MSG_NO_UNDO = "No hay más acciones para deshacer"
+MSG_NO_REDO = "No hay más acciones para rehacer"
 MSG_RESTORED = "Imagen restaurada al original"
 MSG_PIXEL_CHANGED = "Píxel ({}, {}) cambiado a RGB({}, {}, {})"
 MSG_ERROR_OUT_OF_RANGE = "Coordenadas fuera de rango. Máximo: X={}, Y={}"
 MSG_ERROR_RGB_RANGE = "Los valores RGB deben estar entre 0 y 255"
+MSG_ERROR_LOTE_COORDENADAS = "Las coordenadas X e Y deben ser listas de la misma longitud"
+MSG_ERROR_LOTE_COLORES = "Los colores deben ser un solo (r, g, b) o {} filas (r, g, b)"
+MSG_ERROR_LOTE_ENTEROS = "Las coordenadas y los colores deben ser números enteros"
+MSG_LOTE_CAMBIADO = "✅ {} píxeles cambiados"
+MSG_FILTRO_APLICADO = "✅ {} aplicado a {:,} píxeles"
+MSG_ERROR_FILTRO_DESCONOCIDO = "Filtro '{}' desconocido (disponibles: {})"
+MSG_ERROR_PARAMETRO_RANGO = "El parámetro '{}' debe estar entre {} y {}"
+MSG_TONOS_APLICADOS = "✅ Ajustes de tono aplicados a {:,} píxeles"
+MSG_TRANSFORMADA = "✅ Imagen transformada: {} x {} px"
+MSG_ERROR_TRANSFORMACION_SINGULAR = "La transformación no se puede invertir (aplasta la imagen)"
+MSG_ERROR_PERSPECTIVA = "La perspectiva necesita cuatro puntos de origen y cuatro de destino válidos"
+MSG_ERROR_PASO_TRANSFORMACION = "Paso de transformación no válido: {}"
+MSG_ERROR_INTERPOLACION = "Interpolación '{}' desconocida (disponibles: {})"
+MSG_ERROR_TRANSFORMACION_GRANDE = "La imagen transformada tendría {:,} píxeles (máximo {:,})"
+MSG_ERROR_PERCENTILES = "Los percentiles deben cumplir 0 <= bajo < alto <= 100"
+MSG_ERROR_LUT = "La LUT debe tener 256 valores o 3 filas de 256 valores entre 0 y 255"
 MSG_SAVED_SUCCESS = "Imagen guardada exitosamente en:\n{}"
+MSG_ERROR_CARGA = "No se pudo cargar la imagen:\n{}"
+MSG_ERROR_GUARDADO = "No se pudo guardar la imagen:\n{}"
+MSG_CARGANDO = "⏳ Cargando {}... {:.0%}"
+MSG_GUARDANDO = "⏳ Guardando {}..."
+MSG_OPERACION_EN_CURSO = "Espera a que termine la operación en curso ({})"
+MSG_MODO_GRANDE = " | 💽 Modo imagen grande (memmap en disco)"
+MSG_PROYECTO_GUARDADO = "Proyecto guardado en:\n{}"
+MSG_PROYECTO_ABIERTO = "📁 {} | Tamaño: {} x {} px | {} pasos para deshacer"
+MSG_ERROR_PROYECTO_FORMATO = "El archivo no es un proyecto del editor"
+MSG_ERROR_PROYECTO_VERSION = "El proyecto es de una versión posterior del formato ({})"
+MSG_DIARIO_ENCONTRADO = ("Hay {} operaciones sin guardar de una sesión anterior en {}.\n\n"
+                         "¿Recuperarlas?")
+MSG_DIARIO_RECUPERADO = "✅ Recuperadas {} operaciones sin guardar"
+MSG_ERROR_DIARIO = "No se pudieron recuperar los cambios:\n{}"
+MSG_ERROR_DIARIO_VACIO = "No hay diario de autoguardado para esta imagen"
+MSG_ERROR_DIARIO_BASE = "La imagen cambió en disco después de escribirse el diario"
+MSG_ERROR_DIARIO_PUNTO = "El punto de control del diario está incompleto"
+MSG_ERROR_DIARIO_REGION = "Región ({}, {}) de {} x {} fuera de la imagen"
+MSG_ERROR_DIARIO_CARPETA = "No se puede escribir el diario de autoguardado en {}"
+MSG_AUTOGUARDADO_DESACTIVADO = " | ⚠️ Sin autoguardado: {}"
+MSG_CAPA_AGREGADA = "🗂️ {} añadida ({} capas)"
+MSG_CAPA_ELIMINADA = "🗂️ {} eliminada ({} capas)"
+MSG_CAPA_ACTIVA = "🗂️ Editando {}"
+MSG_CAPA_MOVIDA = "🗂️ {} movida a la posición {}"
+MSG_CAPA_COPIA = "{} (copia)"
+MSG_CAPA_MODIFICADA = "🗂️ {}: {}, opacidad {:.0%}, modo {}"
+MSG_CAPAS_COMBINADAS = "✅ {} capas combinadas en una"
+MSG_ERROR_CAPA_INDICE = "No existe la capa {} (hay {})"
+MSG_ERROR_CAPA_MODO = "Modo de fusión '{}' desconocido (disponibles: {})"
+MSG_ERROR_CAPA_OPACIDAD = "La opacidad debe estar entre 0 y 1"
+MSG_ERROR_CAPA_FORMA = "La capa debe ser una imagen uint8 RGB o RGBA de {} x {} px"
+MSG_ERROR_CAPA_UNICA = "No se puede eliminar la única capa"
+MSG_ERROR_CAPAS_GRANDE = "Las capas no están disponibles en modo imagen grande"
+MSG_ERROR_CAPAS_TRANSFORMAR = "Combina las capas antes de transformar la imagen"
+MSG_ERROR_CAPAS_PROYECTO = "Los proyectos guardan una sola capa: combina las capas antes de guardar"
 
 # ========== SELECCIÓN MÚLTIPLE ==========
 MSG_SELECCION_INICIADA = "Arrastra para seleccionar un área"
+MSG_SELECCION_ESTADISTICAS = "Selección {}x{} | Media RGB({:.0f}, {:.0f}, {:.0f}) | Desv. ({:.1f}, {:.1f}, {:.1f})"
 MSG_SELECCION_COMPLETADA = "✅ Selección completada. Usa 'Aplicar a Selección' para cambiar color"
 MSG_NO_SELECCION = "⚠️ Selecciona una área primero"
 MSG_PIXELES_CAMBIADOS = "✅ {} píxeles cambiados a RGB({}, {}, {})"
+MSG_PIXELES_CIRCULO = "✅ {} píxeles cambiados en círculo"
+MSG_TRAZO_INICIADO = "🎨 Pintando..."
+MSG_VARITA_SELECCION = "🪄 {:,} píxeles seleccionados en una caja de {}x{}. Usa 'Aplicar a Selección' para cambiar color"
+MSG_COLOR_REEMPLAZADO = "✅ {:,} píxeles parecidos a RGB{} cambiados a RGB{}"
+MSG_REEMPLAZO_AYUDA = "Haz clic en la imagen sobre el color que quieres reemplazar"
+MSG_PALETA_EXTRAIDA = "🎨 Paleta de {} colores (el dominante ocupa el {:.0%})"
+MSG_PALETA_CUANTIZADA = "✅ {:,} píxeles llevados a una paleta de {} colores"
+MSG_COLOR_PROMEDIO = "🎨 Color promedio: RGB{}"
+MSG_ERROR_PALETA_METODO = "Método de paleta '{}' desconocido (disponibles: {})"
+MSG_ERROR_PALETA = "La paleta debe tener entre 1 y {} colores RGB (0-255)"
+MSG_RELLENO_AYUDA = "🪣 Haz clic en la imagen para rellenar la zona de color parecido"
+MSG_ERROR_MODO_TOLERANCIA = "Modo de tolerancia '{}' desconocido (disponibles: {})"
+MSG_ERROR_CONEXION = "La conexión debe ser 4 u 8"
+MSG_PINCEL_AYUDA = "🎨 Arrastra sobre la imagen para pintar con el pincel"
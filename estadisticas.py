@@ -0,0 +1,176 @@
+"""
+Módulo de estadísticas de regiones
+Tablas integrales (summed-area tables) por canal para obtener la media, la
+varianza y la desviación de cualquier rectángulo sin recorrerlo: el coste
+depende del número de teselas que toca, no de sus píxeles
+"""
+
+import numpy as np
+import config
+
+# Cuadrado de cada valor de un canal (cabe en uint32)
+_CUADRADOS = (np.arange(256, dtype=np.uint32) ** 2)
+
+
+def _rectangulo(tabla, i0, i1, j0, j1):
+    """Suma por canal de [i0, i1) x [j0, j1) con la tabla integral local de una tesela"""
+    total = tabla[i1 - 1, j1 - 1].astype(np.int64)
+    if i0:
+        total -= tabla[i0 - 1, j1 - 1]
+    if j0:
+        total -= tabla[i1 - 1, j0 - 1]
+        if i0:
+            total += tabla[i0 - 1, j0 - 1]
+    return total
+
+
+class TablaIntegral:
+    """
+    Sumas y sumas de cuadrados por canal de cada tesela de ESTADISTICAS_TESELA
+    píxeles de lado, más la tabla integral local de las teselas del borde de
+    las consultas recientes
+
+    Las teselas que una consulta cubre enteras solo aportan su total; las del
+    borde, un rectángulo de su tabla local. Dentro de una tesela las sumas
+    caben en uint32 y editar una región solo obliga a recalcular las teselas
+    que toca, no todo lo que queda debajo y a la derecha. Todo se calcula al
+    consultarlo por primera vez, así que crear la tabla no recorre la imagen;
+    en memoria quedan 24 bytes por tesela y hasta ESTADISTICAS_TESELAS_CACHE
+    tablas locales, sea cual sea el tamaño de la imagen.
+    """
+
+    def __init__(self, img_array, tesela=config.ESTADISTICAS_TESELA):
+        """
+        Args:
+            img_array (ndarray): Imagen (alto x ancho x 3, uint8); se relee al
+                recalcular las teselas sucias
+            tesela (int): Lado de las teselas (hasta 256, para no desbordar uint32)
+        """
+        self.img_array = img_array
+        self.tesela = tesela
+        self.alto, self.ancho = img_array.shape[:2]
+        filas, columnas = -(-self.alto // tesela), -(-self.ancho // tesela)
+        self.total = np.zeros((filas, columnas, 3), dtype=np.uint32)
+        self.total_cuadrados = np.zeros((filas, columnas, 3), dtype=np.uint32)
+        self.sucias = np.ones((filas, columnas), dtype=bool)
+        # Tablas locales {(fila, columna): (suma, suma de cuadrados)}, de la menos a la más reciente
+        self._locales = {}
+
+    def invalidar(self, x0, y0, x1, y1):
+        """Marca para recalcular las teselas que toca una región modificada"""
+        t = self.tesela
+        f0, c0, f1, c1 = y0 // t, x0 // t, -(-y1 // t), -(-x1 // t)
+        self.sucias[f0:f1, c0:c1] = True
+        for fila, columna in list(self._locales):
+            if f0 <= fila < f1 and c0 <= columna < c1:
+                del self._locales[fila, columna]
+
+    def _bloque(self, fila, a, b):
+        """Teselas [a, b) de una fila como (n, t, t, 3); las del borde se completan con ceros"""
+        t = self.tesela
+        bloque = self.img_array[fila * t:(fila + 1) * t, a * t:b * t]
+        if bloque.shape[:2] != (t, (b - a) * t):
+            # Tesela del borde: los ceros no suman
+            completo = np.zeros((t, (b - a) * t, 3), dtype=np.uint8)
+            completo[:bloque.shape[0], :bloque.shape[1]] = bloque
+            bloque = completo
+        return bloque.reshape(t, b - a, t, 3).transpose(1, 0, 2, 3)
+
+    def _recalcular(self, f0, c0, f1, c1):
+        """Recalcula los totales de las teselas sucias del rango [f0, f1) x [c0, c1), fila a fila"""
+        for fila in range(f0, f1):
+            sucias = np.flatnonzero(self.sucias[fila, c0:c1])
+            if len(sucias) == 0:
+                continue
+            a, b = c0 + int(sucias[0]), c0 + int(sucias[-1]) + 1
+            bloque = self._bloque(fila, a, b)
+            self.total[fila, a:b] = bloque.sum(axis=(1, 2), dtype=np.uint32)
+            self.total_cuadrados[fila, a:b] = _CUADRADOS[bloque].sum(axis=(1, 2), dtype=np.uint32)
+            self.sucias[fila, a:b] = False
+
+    def _tablas_locales(self, filas, columnas):
+        """
+        Tablas integrales locales de las teselas indicadas, reutilizando las
+        guardadas; se conservan las ESTADISTICAS_TESELAS_CACHE más recientes
+
+        Returns:
+            list: (suma, suma de cuadrados) de cada tesela, (t x t x 3, uint32)
+        """
+        tablas = []
+        for clave in zip(filas, columnas):
+            local = self._locales.pop(clave, None)
+            if local is None:
+                bloque = self._bloque(clave[0], clave[1], clave[1] + 1)[0]
+                local = tuple(np.cumsum(np.cumsum(valores, axis=0, dtype=np.uint32),
+                                        axis=1, dtype=np.uint32)
+                              for valores in (bloque, _CUADRADOS[bloque]))
+            self._locales[clave] = local
+            tablas.append(local)
+        while len(self._locales) > config.ESTADISTICAS_TESELAS_CACHE:
+            del self._locales[next(iter(self._locales))]
+        return tablas
+
+    def _sumas(self, x0, y0, x1, y1):
+        """Sumas y sumas de cuadrados exactas de un rectángulo por canal (listas de int)"""
+        t = self.tesela
+        f0, c0, f1, c1 = y0 // t, x0 // t, -(-y1 // t), -(-x1 // t)
+
+        # Teselas interiores (enteras): basta su total
+        interior = (slice(f0 + 1, f1 - 1), slice(c0 + 1, c1 - 1))
+        self._recalcular(f0 + 1, c0 + 1, f1 - 1, c1 - 1)
+        sumas = self.total[interior].sum(axis=(0, 1), dtype=np.int64)
+        cuadrados = self.total_cuadrados[interior].sum(axis=(0, 1), dtype=np.int64)
+
+        # Teselas del borde: inclusión-exclusión dentro de cada una
+        borde = np.ones((f1 - f0, c1 - c0), dtype=bool)
+        borde[1:-1, 1:-1] = False
+        filas, columnas = np.nonzero(borde)
+        filas = (filas + f0).tolist()
+        columnas = (columnas + c0).tolist()
+        for fila, columna, (suma, suma_cuadrados) in zip(
+                filas, columnas, self._tablas_locales(filas, columnas)):
+            i0, i1 = max(y0 - fila * t, 0), min(y1 - fila * t, t)
+            j0, j1 = max(x0 - columna * t, 0), min(x1 - columna * t, t)
+            sumas += _rectangulo(suma, i0, i1, j0, j1)
+            cuadrados += _rectangulo(suma_cuadrados, i0, i1, j0, j1)
+        return [int(v) for v in sumas], [int(v) for v in cuadrados]
+
+    def estadisticas(self, x0, y0, x1, y1):
+        """
+        Media, varianza y desviación típica por canal de un rectángulo
+
+        Args:
+            x0, y0, x1, y1 (int): Rectángulo (extremo final exclusivo), ya recortado
+
+        Returns:
+            dict: {'pixeles', 'media', 'varianza', 'desviacion'} con tuplas por canal
+        """
+        n = (x1 - x0) * (y1 - y0)
+        sumas, cuadrados = self._sumas(x0, y0, x1, y1)
+
+        media = tuple(s / n for s in sumas)
+        # n·Σx² - (Σx)² en enteros exactos evita la cancelación de E[x²] - E[x]²
+        varianza = tuple((n * q - s * s) / (n * n) for s, q in zip(sumas, cuadrados))
+        desviacion = tuple(v ** 0.5 for v in varianza)
+        return {'pixeles': n, 'media': media, 'varianza': varianza, 'desviacion': desviacion}
+
+
+def estadisticas_directas(area):
+    """
+    Las mismas estadísticas calculadas recorriendo el área (O(área))
+
+    Args:
+        area (ndarray): Píxeles de la región (alto x ancho x 3)
+
+    Returns:
+        dict: {'pixeles', 'media', 'varianza', 'desviacion'}
+    """
+    valores = area.reshape(-1, area.shape[2]).astype(np.float64)
+    media = valores.mean(axis=0)
+    varianza = valores.var(axis=0)
+    return {
+        'pixeles': valores.shape[0],
+        'media': tuple(media.tolist()),
+        'varianza': tuple(varianza.tolist()),
+        'desviacion': tuple(np.sqrt(varianza).tolist()),
+    }
@@ -0,0 +1,215 @@
+"""
+Módulo de filtros de convolución
+Desenfoque gaussiano y de caja, enfoque, relieve y bordes (Sobel). La imagen
+se divide en franjas con un margen solapado que se procesan en paralelo en
+un pool de hilos (NumPy libera el GIL en las operaciones sobre arrays)
+"""
+
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import config
+
+
+_ejecutor = None
+
+
+def _obtener_ejecutor():
+    """Pool de hilos compartido por todos los filtros (se crea al primer uso)"""
+    global _ejecutor
+    if _ejecutor is None:
+        _ejecutor = ThreadPoolExecutor(max_workers=config.FILTRO_HILOS or os.cpu_count() or 1)
+    return _ejecutor
+
+
+# ========== PASADAS ==========
+
+def _desplazado(bloque, eje, inicio, largo):
+    """Vista de bloque con largo elementos a partir de inicio en el eje indicado"""
+    if eje == 0:
+        return bloque[inicio:inicio + largo]
+    return bloque[:, inicio:inicio + largo]
+
+
+def _pasada(bloque, pesos, eje):
+    """
+    Correlación 1-D en modo 'válido' (el resultado pierde len(pesos) - 1 elementos)
+
+    Args:
+        bloque (ndarray): Datos uint8 o float32 (alto x ancho x canales)
+        pesos (sequence): Coeficientes del núcleo
+        eje (int): 0 para vertical, 1 para horizontal
+    """
+    largo = bloque.shape[eje] - len(pesos) + 1
+    resultado = _desplazado(bloque, eje, 0, largo) * np.float32(pesos[0])  # float32
+    temporal = np.empty_like(resultado)
+    for k in range(1, len(pesos)):
+        if pesos[k] != 0:
+            np.multiply(_desplazado(bloque, eje, k, largo), np.float32(pesos[k]), out=temporal)
+            resultado += temporal
+    return resultado
+
+
+def _suma_caja(bloque, radio, eje):
+    """
+    Suma móvil 1-D de 2·radio + 1 elementos con sumas acumuladas enteras
+    (exacta y con coste independiente del radio)
+    """
+    n = 2 * radio + 1
+    largo = bloque.shape[eje] - n + 1
+    acumulado = np.cumsum(bloque, axis=eje, dtype=np.int32)
+    suma = _desplazado(acumulado, eje, n - 1, largo).copy()
+    suma[(slice(None),) * eje + (slice(1, None),)] -= _desplazado(acumulado, eje, 0, largo - 1)
+    return suma
+
+
+def _caja_bloque(bloque, radio):
+    """Desenfoque de caja: dos sumas móviles enteras y una sola división"""
+    suma = _suma_caja(_suma_caja(bloque, radio, 0), radio, 1)
+    return suma.astype(np.float32) / np.float32((2 * radio + 1) ** 2)
+
+
+def _correlacion_2d(bloque, nucleo):
+    """Correlación 2-D en modo 'válido' con un núcleo pequeño no separable"""
+    k_alto, k_ancho = nucleo.shape
+    alto = bloque.shape[0] - k_alto + 1
+    ancho = bloque.shape[1] - k_ancho + 1
+    resultado = np.zeros((alto, ancho) + bloque.shape[2:], dtype=np.float32)
+    for i in range(k_alto):
+        for j in range(k_ancho):
+            if nucleo[i, j] != 0:
+                resultado += bloque[i:i + alto, j:j + ancho] * np.float32(nucleo[i, j])
+    return resultado
+
+
+# ========== DEFINICIÓN DE LOS FILTROS ==========
+# Cada fábrica valida los parámetros y devuelve (margen, función). La función
+# recibe un bloque uint8 con `margen` píxeles extra en cada lado y devuelve
+# el resultado (float32) sin el margen.
+
+def nucleo_gaussiano(sigma):
+    """Núcleo gaussiano 1-D normalizado de radio ceil(3·sigma)"""
+    radio = max(1, int(math.ceil(3 * sigma)))
+    x = np.arange(-radio, radio + 1, dtype=np.float64)
+    nucleo = np.exp(-(x * x) / (2 * sigma * sigma))
+    return nucleo / nucleo.sum()
+
+
+def _gaussiano(sigma=2.0):
+    sigma = float(sigma)
+    if not 0 < sigma <= config.FILTRO_SIGMA_MAX:
+        raise ValueError(config.MSG_ERROR_PARAMETRO_RANGO.format("sigma", 0, config.FILTRO_SIGMA_MAX))
+    nucleo = nucleo_gaussiano(sigma)
+    margen = len(nucleo) // 2
+    return margen, lambda b: _pasada(_pasada(b, nucleo, 0), nucleo, 1)
+
+
+def _caja(radio=2):
+    radio = int(radio)
+    if not 1 <= radio <= config.FILTRO_RADIO_MAX:
+        raise ValueError(config.MSG_ERROR_PARAMETRO_RANGO.format("radio", 1, config.FILTRO_RADIO_MAX))
+    return radio, lambda b: _caja_bloque(b, radio)
+
+
+NUCLEO_ENFOQUE = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]], dtype=np.float32)
+NUCLEO_RELIEVE = np.array([[-2, -1, 0], [-1, 1, 1], [0, 1, 2]], dtype=np.float32)
+
+
+def _enfocar():
+    return 1, lambda b: _correlacion_2d(b, NUCLEO_ENFOQUE)
+
+
+def _relieve():
+    return 1, lambda b: _correlacion_2d(b, NUCLEO_RELIEVE)
+
+
+def _sobel_bloque(bloque):
+    """Magnitud del gradiente de Sobel por canal (dos núcleos separables)"""
+    gx = _pasada(_pasada(bloque, (1, 2, 1), 0), (-1, 0, 1), 1)
+    gy = _pasada(_pasada(bloque, (-1, 0, 1), 0), (1, 2, 1), 1)
+    np.multiply(gx, gx, out=gx)
+    np.multiply(gy, gy, out=gy)
+    gx += gy
+    return np.sqrt(gx, out=gx)
+
+
+def _bordes():
+    return 1, _sobel_bloque
+
+
+# Nombre -> (fábrica, nombre para mostrar)
+FILTROS = {
+    "gaussiano": (_gaussiano, "Desenfoque gaussiano"),
+    "caja": (_caja, "Desenfoque de caja"),
+    "enfocar": (_enfocar, "Enfocar"),
+    "relieve": (_relieve, "Relieve"),
+    "bordes": (_bordes, "Bordes (Sobel)"),
+}
+
+
+# ========== MOTOR POR FRANJAS ==========
+
+def _filtrar_franja(img_array, salida, region, y0, y1, margen, funcion):
+    """
+    Filtra las filas [y0, y1) de la región y las escribe en salida
+
+    Los píxeles del margen se leen de la imagen aunque queden fuera de la
+    región; en los bordes de la imagen se replica el último píxel.
+    """
+    alto, ancho = img_array.shape[:2]
+    x_min, y_min, x_max, _ = region
+    ya, yb = max(0, y0 - margen), min(alto, y1 + margen)
+    xa, xb = max(0, x_min - margen), min(ancho, x_max + margen)
+
+    bloque = img_array[ya:yb, xa:xb]
+    relleno = ((ya - (y0 - margen), (y1 + margen) - yb),
+               (xa - (x_min - margen), (x_max + margen) - xb), (0, 0))
+    if any(antes or despues for antes, despues in relleno):
+        bloque = np.pad(bloque, relleno, mode="edge")
+
+    resultado = funcion(bloque)
+    np.rint(resultado, out=resultado)
+    np.clip(resultado, 0, 255, out=resultado)
+    salida[y0 - y_min:y1 - y_min] = resultado
+
+
+def filtrar(img_array, nombre, region=None, salida=None, **parametros):
+    """
+    Aplica un filtro a una región de la imagen sin modificarla
+
+    Args:
+        img_array (ndarray): Imagen (alto x ancho x 3, uint8)
+        nombre (str): Clave de FILTROS
+        region (tuple): (x_min, y_min, x_max, y_max) con extremo final exclusivo;
+            None para toda la imagen
+        salida (ndarray): Array donde escribir el resultado (p. ej. un memmap);
+            por defecto se crea en memoria
+        **parametros: Parámetros del filtro (sigma, radio)
+
+    Returns:
+        ndarray: Región filtrada (uint8)
+    """
+    if nombre not in FILTROS:
+        raise ValueError(config.MSG_ERROR_FILTRO_DESCONOCIDO.format(nombre, ", ".join(FILTROS)))
+    margen, funcion = FILTROS[nombre][0](**parametros)
+
+    alto, ancho = img_array.shape[:2]
+    region = region or (0, 0, ancho, alto)
+    x_min, y_min, x_max, y_max = region
+    if salida is None:
+        salida = np.empty((y_max - y_min, x_max - x_min, img_array.shape[2]), dtype=np.uint8)
+
+    # Franjas horizontales independientes: cada hilo escribe sus propias filas
+    # (con márgenes grandes se alargan para no leer más margen que franja)
+    paso = max(config.FILTRO_FILAS_FRANJA, 4 * margen)
+    franjas = [(y, min(y + paso, y_max)) for y in range(y_min, y_max, paso)]
+    if len(franjas) == 1:
+        _filtrar_franja(img_array, salida, region, *franjas[0], margen, funcion)
+    else:
+        futuros = [_obtener_ejecutor().submit(_filtrar_franja, img_array, salida, region,
+                                              y0, y1, margen, funcion)
+                   for y0, y1 in franjas]
+        for futuro in futuros:
+            futuro.result()
+    return salida
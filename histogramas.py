@@ -0,0 +1,170 @@
+"""
+Módulo de histogramas
+Histogramas por canal y de luminancia que se calculan una vez al cargar y se
+mantienen al día restando el contenido previo de los píxeles que cambia cada
+edición y sumando el nuevo. Incluye las LUT de ecualización y de estiramiento por
+percentiles que se calculan a partir de ellos
+"""
+
+import numpy as np
+import config
+
+
+def luminancia(zona):
+    """
+    Luminancia Rec. 601 con aritmética entera: (77·R + 150·G + 29·B + 128) >> 8
+
+    Args:
+        zona (ndarray): Píxeles (alto x ancho x 3, uint8)
+
+    Returns:
+        ndarray: Luminancia (alto x ancho, uint8)
+    """
+    y = zona[..., 0] * np.uint16(77)
+    y += zona[..., 1] * np.uint16(150)
+    y += zona[..., 2] * np.uint16(29)
+    y += 128
+    y >>= 8
+    return y.astype(np.uint8)
+
+
+def contar(zona):
+    """
+    Calcula los histogramas de una imagen o de un recorte, franja a franja
+
+    Args:
+        zona (ndarray): Píxeles (alto x ancho x 3, uint8), posiblemente un memmap
+
+    Returns:
+        ndarray: Conteos (4 x 256, int64): R, G, B y luminancia
+    """
+    conteos = np.zeros((4, 256), dtype=np.int64)
+    alto, ancho = zona.shape[:2]
+    if alto == 0 or ancho == 0:
+        return conteos
+
+    paso = max(1, config.HISTOGRAMA_BYTES_FRANJA // (ancho * 3))
+    for y in range(0, alto, paso):
+        _acumular(conteos, zona[y:y + paso])
+    return conteos
+
+
+def _acumular(conteos, pixeles, signo=1):
+    """Suma (o resta, con signo -1) a conteos los histogramas de unos píxeles (... x 3)"""
+    for canal in range(3):
+        conteos[canal] += signo * np.bincount(pixeles[..., canal].ravel(), minlength=256)
+    conteos[3] += signo * np.bincount(luminancia(pixeles).ravel(), minlength=256)
+
+
+class Histograma:
+    """Histogramas de la imagen actual mantenidos de forma incremental"""
+
+    def __init__(self, img_array, version=0, conteos=None):
+        """
+        Args:
+            img_array (ndarray): Imagen completa (alto x ancho x 3)
+            version (int): Versión inicial (al sustituir a otro histograma, una mayor
+                que la suya para que quien consulte note el cambio)
+            conteos (ndarray): Conteos (4 x 256) ya calculados de img_array (p. ej.
+                guardados en un proyecto); None para contarlos
+        """
+        self.conteos = contar(img_array) if conteos is None else np.array(conteos, dtype=np.int64)
+        self.version = version   # Aumenta con cada cambio (la interfaz solo redibuja si cambia)
+
+    def restar(self, zona):
+        """Descuenta los píxeles de una región antes de modificarla"""
+        self.conteos -= contar(zona)
+        self.version += 1
+
+    def sumar(self, zona):
+        """Cuenta los píxeles de una región después de modificarla"""
+        self.conteos += contar(zona)
+        self.version += 1
+
+    def cambiar(self, antes, despues):
+        """
+        Sustituye en los conteos el contenido previo de una región por el nuevo
+        en una sola pasada, franja a franja, contando solo los píxeles que cambiaron
+
+        Args:
+            antes (ndarray): Contenido de la región antes del cambio
+            despues (ndarray): Contenido de la región ya modificada (misma forma)
+        """
+        alto, ancho = despues.shape[:2]
+        if alto and ancho:
+            paso = max(1, config.HISTOGRAMA_BYTES_FRANJA // (ancho * 3))
+            for y in range(0, alto, paso):
+                previa, nueva = antes[y:y + paso], despues[y:y + paso]
+                # Canal a canal: any(axis=2) sobre un eje de 3 es mucho más lento
+                cambian = previa[..., 0] != nueva[..., 0]
+                cambian |= previa[..., 1] != nueva[..., 1]
+                cambian |= previa[..., 2] != nueva[..., 2]
+                if cambian.any():
+                    _acumular(self.conteos, previa[cambian], -1)
+                    _acumular(self.conteos, nueva[cambian])
+        self.version += 1
+
+
+# ========== OPERACIONES BASADAS EN EL HISTOGRAMA ==========
+
+def _tabla(conteos, por_canal, funcion):
+    """
+    Construye una LUT (3 x 256) aplicando funcion(histograma) -> 256 valores a
+    cada canal, o al de luminancia para los tres si por_canal es False
+    """
+    if por_canal:
+        return np.stack([funcion(conteos[canal]) for canal in range(3)])
+    return np.tile(funcion(conteos[3]), (3, 1))
+
+
+def _ecualizar_canal(histograma):
+    acumulado = np.cumsum(histograma)
+    total = acumulado[-1]
+    minimo = acumulado[np.flatnonzero(histograma)[0]] if total else 0
+    if total == minimo:
+        return np.arange(256, dtype=np.uint8)
+    valores = (acumulado - minimo) * (255.0 / (total - minimo))
+    return np.clip(np.rint(valores), 0, 255).astype(np.uint8)
+
+
+def lut_ecualizacion(conteos, por_canal=False):
+    """
+    LUT que reparte los valores para que el histograma quede lo más plano posible
+
+    Args:
+        conteos (ndarray): Histogramas (4 x 256) de la zona a ecualizar
+        por_canal (bool): Ecualizar R, G y B por separado (puede alterar los
+            colores); por defecto se usa la luminancia para los tres
+
+    Returns:
+        ndarray: LUT (3 x 256, uint8)
+    """
+    return _tabla(conteos, por_canal, _ecualizar_canal)
+
+
+def lut_percentiles(conteos, bajo, alto, por_canal=False):
+    """
+    LUT que estira linealmente el rango entre dos percentiles hasta 0-255
+
+    Args:
+        conteos (ndarray): Histogramas (4 x 256) de la zona a ajustar
+        bajo, alto (float): Percentiles (0-100) que pasan a 0 y a 255
+        por_canal (bool): Estirar cada canal con sus propios percentiles
+
+    Returns:
+        ndarray: LUT (3 x 256, uint8)
+    """
+    if not 0 <= bajo < alto <= 100:
+        raise ValueError(config.MSG_ERROR_PERCENTILES)
+
+    def estirar(histograma):
+        acumulado = np.cumsum(histograma)
+        total = acumulado[-1]
+        negro = int(np.searchsorted(acumulado, total * bajo / 100.0, side="right"))
+        blanco = int(np.searchsorted(acumulado, total * alto / 100.0, side="left"))
+        if blanco <= negro:
+            return np.arange(256, dtype=np.uint8)
+        valores = (np.arange(256) - negro) * (255.0 / (blanco - negro))
+        return np.clip(np.rint(valores), 0, 255).astype(np.uint8)
+
+    return _tabla(conteos, por_canal, estirar)
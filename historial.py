@@ -0,0 +1,324 @@
+"""
+Módulo de historial de cambios
+Guarda cada edición como un comando (operación + parámetros) y una copia
+completa de la imagen (punto de control) cuando los comandos desde la
+anterior han reescrito bastantes píxeles u ocupan bastante memoria.
+Deshacer reconstruye solo la región del comando a partir del punto de
+control más cercano, volviendo a aplicar los comandos intermedios. Los
+comandos que reemplazan la imagen entera (p. ej. una transformación que
+cambia sus dimensiones) quedan entre dos puntos de control, antes y después.
+Los puntos de control en disco (memmap) no cuentan en el presupuesto
+"""
+
+import numpy as np
+
+
+def _se_cruzan(a, b):
+    """True si dos cajas (x_min, y_min, x_max, y_max) se solapan"""
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+class HistorialComandos:
+    """Historial de deshacer/rehacer basado en comandos y puntos de control"""
+
+    def __init__(self, max_bytes, imagenes_entre_puntos, fraccion_punto):
+        """
+        Args:
+            max_bytes (int): Memoria máxima de comandos y puntos de control
+            imagenes_entre_puntos (float): Píxeles reescritos por los comandos,
+                en imágenes completas, tras los que se toma un punto de control
+            fraccion_punto (float): Fracción de max_bytes que pueden ocupar un
+                punto de control en memoria (uno mayor debe ir a disco, ver
+                cabe_en_memoria) y los comandos desde el último punto de control
+        """
+        self.max_bytes = max_bytes
+        self.imagenes_entre_puntos = imagenes_entre_puntos
+        self.fraccion_punto = fraccion_punto
+        self._comandos = []        # _comandos[i] lleva del estado _inicio + i al siguiente
+        self._puntos = {}          # estado (índice absoluto) -> (copia de la imagen, bytes)
+        self._inicio = 0           # Estado más antiguo al que se puede volver
+        self._posicion = 0         # Estado actual
+        self._bytes = 0
+        self._pixeles_imagen = 1   # Píxeles del último punto de control guardado
+        self._desde_punto = (0, 0) # (píxeles reescritos, bytes) de los comandos desde él
+
+    def __len__(self):
+        """Número de pasos que se pueden deshacer"""
+        return self._posicion - self._inicio
+
+    @property
+    def rehacibles(self):
+        """Número de pasos que se pueden rehacer"""
+        return self._inicio + len(self._comandos) - self._posicion
+
+    @property
+    def bytes_usados(self):
+        """Memoria ocupada por los comandos y los puntos de control"""
+        return self._bytes
+
+    def cabe_en_memoria(self, nbytes):
+        """
+        True si un punto de control de nbytes puede guardarse en memoria; si
+        no, quien lo capture debe dar una copia en disco (memmap)
+        """
+        return nbytes <= self.max_bytes * self.fraccion_punto
+
+    def reiniciar(self, base):
+        """
+        Vacía el historial y toma una imagen como estado inicial
+
+        Args:
+            base (ndarray): Imagen del estado inicial (no debe modificarse después).
+                Normalmente es el original que el manejador ya conserva, así que
+                no cuenta en el presupuesto
+        """
+        self._comandos = []
+        self._puntos = {0: (base, 0)}
+        self._inicio = 0
+        self._posicion = 0
+        self._bytes = 0
+        self._pixeles_imagen = max(1, base.shape[0] * base.shape[1])
+        self._desde_punto = (0, 0)
+
+    def exportar(self):
+        """
+        Estado completo del historial (p. ej. para guardarlo en un proyecto)
+
+        Returns:
+            dict: inicio, posicion, comandos (lista de Comando) y puntos
+                (estado -> imagen de solo lectura)
+        """
+        return {
+            "inicio": self._inicio,
+            "posicion": self._posicion,
+            "comandos": list(self._comandos),
+            "puntos": {indice: imagen for indice, (imagen, _) in self._puntos.items()},
+        }
+
+    def importar(self, inicio, posicion, comandos, puntos):
+        """
+        Sustituye el estado por uno exportado con exportar()
+
+        Args:
+            inicio, posicion (int): Estado más antiguo y estado actual
+            comandos (list): Comandos desde inicio
+            puntos (dict): Estado -> imagen que no se modificará (debe incluir inicio)
+        """
+        self._comandos = list(comandos)
+        self._puntos = {}
+        self._inicio = inicio
+        self._posicion = posicion
+        self._bytes = sum(comando.nbytes for comando in self._comandos)
+        for indice, imagen in sorted(puntos.items()):
+            if indice <= posicion:
+                self._pixeles_imagen = max(1, imagen.shape[0] * imagen.shape[1])
+            self._guardar_punto(indice, imagen)
+        self._desde_punto = (0, 0)
+        self._recortar()
+
+    def registrar(self, comando, capturar=None):
+        """
+        Añade un comando ya aplicado; descarta lo que hubiera para rehacer
+
+        Se toma un punto de control cuando los comandos desde el anterior han
+        reescrito imagenes_entre_puntos veces los píxeles de la imagen (acota lo
+        que hay que repetir al deshacer) u ocupan fraccion_punto del
+        presupuesto (así siempre hay un punto de control al que recortar sin
+        vaciar el historial)
+
+        Args:
+            comando (Comando): Comando que se acaba de aplicar
+            capturar (callable): Devuelve una copia de la imagen actual para un
+                punto de control, en disco si no cabe_en_memoria; None para no
+                crear puntos de control
+        """
+        self._truncar_rehacer()
+        self._comandos.append(comando)
+        self._bytes += comando.nbytes
+        self._posicion += 1
+
+        pixeles, nbytes = self._desde_punto
+        if comando.region is not None:
+            x_min, y_min, x_max, y_max = comando.region
+            pixeles += (x_max - x_min) * (y_max - y_min)
+        nbytes += comando.nbytes
+        self._desde_punto = (pixeles, nbytes)
+
+        if capturar is not None and (
+                pixeles >= self.imagenes_entre_puntos * self._pixeles_imagen or
+                nbytes >= self.max_bytes * self.fraccion_punto):
+            self._guardar_punto(self._posicion, capturar())
+
+        self._recortar()
+
+    def registrar_reemplazo(self, comando, antes, despues):
+        """
+        Añade un comando que sustituye la imagen entera; deshacerlo y rehacerlo
+        no repite nada, solo devuelve la imagen guardada
+
+        Args:
+            comando (Comando): Comando que se acaba de aplicar (su región es la
+                imagen nueva completa)
+            antes (ndarray): Imagen previa, que ya no se modificará
+            despues (ndarray): Copia de la imagen nueva que no se modificará
+        """
+        self._truncar_rehacer()
+        if self._posicion not in self._puntos:
+            self._guardar_punto(self._posicion, antes)
+        self._comandos.append(comando)
+        self._bytes += comando.nbytes
+        self._posicion += 1
+        self._guardar_punto(self._posicion, despues)
+        self._recortar()
+
+    def _truncar_rehacer(self):
+        """Descarta los comandos y puntos de control posteriores al estado actual"""
+        if not self.rehacibles:
+            return
+        for comando_descartado in self._comandos[self._posicion - self._inicio:]:
+            self._bytes -= comando_descartado.nbytes
+        del self._comandos[self._posicion - self._inicio:]
+        for indice in [i for i in self._puntos if i > self._posicion]:
+            self._bytes -= self._puntos.pop(indice)[1]
+
+    def _guardar_punto(self, indice, imagen):
+        """Guarda una imagen como punto de control (un memmap en disco no cuenta)"""
+        nbytes = 0 if isinstance(imagen, np.memmap) else imagen.nbytes
+        self._puntos[indice] = (imagen, nbytes)
+        self._bytes += nbytes
+        if indice == self._posicion:
+            self._pixeles_imagen = max(1, imagen.shape[0] * imagen.shape[1])
+            self._desde_punto = (0, 0)
+
+    def _recortar(self):
+        """
+        Descarta los pasos más antiguos hasta respetar el presupuesto: todo lo
+        anterior al siguiente punto de control (sin pasar del estado actual).
+        El punto de control de _inicio nunca se descarta: es la base de la que
+        parte deshacer
+        """
+        while self._bytes > self.max_bytes:
+            siguientes = [i for i in self._puntos if self._inicio < i <= self._posicion]
+            if not siguientes:
+                # Sin otro punto de control no se puede recortar; registrar
+                # toma uno antes de que los comandos llenen el presupuesto
+                return
+            nuevo_inicio = min(siguientes)
+            for comando in self._comandos[:nuevo_inicio - self._inicio]:
+                self._bytes -= comando.nbytes
+            del self._comandos[:nuevo_inicio - self._inicio]
+            self._bytes -= self._puntos.pop(self._inicio)[1]
+            self._inicio = nuevo_inicio
+
+    def region_ultima(self):
+        """
+        Returns:
+            tuple: (x_min, y_min, x_max, y_max) del comando que se desharía o None
+        """
+        if len(self) == 0:
+            return None
+        return self._comandos[self._posicion - 1 - self._inicio].region
+
+    def region_siguiente(self):
+        """
+        Returns:
+            tuple: (x_min, y_min, x_max, y_max) del comando que se reharía o None
+        """
+        if not self.rehacibles:
+            return None
+        return self._comandos[self._posicion - self._inicio].region
+
+    def punto_actual(self):
+        """
+        Returns:
+            ndarray: Punto de control del estado actual (igual a la imagen,
+                salvo ediciones aún sin registrar) o None si no lo hay
+        """
+        punto = self._puntos.get(self._posicion)
+        return None if punto is None else punto[0]
+
+    def ultimo_reemplaza(self):
+        """True si el comando que se desharía sustituye la imagen entera"""
+        return len(self) > 0 and self._comandos[self._posicion - 1 - self._inicio].reemplaza
+
+    def siguiente_reemplaza(self):
+        """True si el comando que se reharía sustituye la imagen entera"""
+        return self.rehacibles > 0 and self._comandos[self._posicion - self._inicio].reemplaza
+
+    def deshacer_reemplazo(self):
+        """
+        Deshace un comando que sustituyó la imagen (ver ultimo_reemplaza)
+
+        Returns:
+            ndarray: Imagen previa guardada (de solo lectura; hay que copiarla
+                antes de editar)
+        """
+        self._posicion -= 1
+        return self._puntos[self._posicion][0]
+
+    def rehacer_reemplazo(self):
+        """
+        Rehace un comando que sustituye la imagen (ver siguiente_reemplaza)
+
+        Returns:
+            ndarray: Imagen resultante guardada (de solo lectura)
+        """
+        self._posicion += 1
+        return self._puntos[self._posicion][0]
+
+    def deshacer(self, img_array):
+        """
+        Vuelve al estado anterior al último comando reconstruyendo su región
+
+        Args:
+            img_array (ndarray): Imagen sobre la que se deshace
+
+        Returns:
+            tuple: (x_min, y_min, x_max, y_max) de la región restaurada o None
+        """
+        if len(self) == 0:
+            return None
+
+        objetivo = self._posicion - 1
+        region = self._comandos[objetivo - self._inicio].region
+        x_min, y_min, x_max, y_max = region
+
+        # Partir del punto de control más cercano y repetir solo los comandos
+        # intermedios que tocan la región
+        punto = max(i for i in self._puntos if i <= objetivo)
+        parche = np.array(self._puntos[punto][0][y_min:y_max, x_min:x_max])
+        for comando in self._comandos[punto - self._inicio:objetivo - self._inicio]:
+            if _se_cruzan(comando.region, region):
+                comando.aplicar(parche, x_min, y_min)
+
+        img_array[y_min:y_max, x_min:x_max] = parche
+        self._posicion = objetivo
+        return region
+
+    def rehacer(self, img_array):
+        """
+        Vuelve a aplicar el último comando deshecho
+
+        Args:
+            img_array (ndarray): Imagen sobre la que se rehace
+
+        Returns:
+            tuple: (x_min, y_min, x_max, y_max) de la región modificada o None
+        """
+        if not self.rehacibles:
+            return None
+
+        comando = self._comandos[self._posicion - self._inicio]
+        x_min, y_min, x_max, y_max = comando.region
+        comando.aplicar(img_array[y_min:y_max, x_min:x_max], x_min, y_min)
+        self._posicion += 1
+        return comando.region
+
+    def limpiar(self):
+        """Elimina todos los comandos y puntos de control"""
+        self._comandos = []
+        self._puntos = {}
+        self._inicio = 0
+        self._posicion = 0
+        self._bytes = 0
+        self._desde_punto = (0, 0)
@@ -3,10 +3,27 @@ Módulo de manejo de imágenes
 Gestiona la carga, modificación y guardado de imágenes
 """
 
+import os
+import zlib
 import numpy as np
-from PIL import Image
+from PIL import Image, ImageFile
 from pathlib import Path
 import config
+from historial import HistorialComandos
+from comandos import Comando
+from pincel import TrazoPincel
+from capas import Capa, PilaCapas
+from imagen_grande import AlmacenTeselado, contar_pixeles, copiar_por_franjas, copia_en_disco
+from estadisticas import TablaIntegral
+import filtros
+import tonos
+import transformaciones
+import autoguardado
+import proyecto
+import paleta
+import relleno
+from instrumentacion import medir
+from histogramas import Histograma, contar, lut_ecualizacion, lut_percentiles
 
 
 class ImageHandler:
@@ -15,66 +32,1598 @@ class ImageHandler:
     def __init__(self):
         self.img_array = None          # Array de numpy con la imagen
         self.img_original = None       # Imagen original sin modificaciones
-        self.historial = []            # Historial de cambios
+        self.historial = HistorialComandos(config.MAX_HISTORIAL_BYTES,
+                                           config.HISTORIAL_IMAGENES_ENTRE_PUNTOS,
+                                           config.HISTORIAL_FRACCION_PUNTO)  # Deshacer/rehacer
+        self.trazo = None              # Trazo de pincel en curso
+        self.region_modificada = None  # (x_min, y_min, x_max, y_max) pendiente de redibujar
+        self.almacen = None            # Almacén en disco cuando la imagen es grande
+        self.estadisticas = None       # Tablas integrales (se crean en la primera consulta)
+        self.histograma = None         # Histogramas R, G, B y luminancia (siempre al día)
+        self.pixeles_tocados = 0       # Píxeles modificados acumulados (para la instrumentación)
+        self.ruta = None               # Archivo del que se cargó (o en el que se guardó) la imagen
+        self.autoguardado = None       # Diario de cambios (ver iniciar_autoguardado)
+        self.metadatos = {}            # Metadatos del proyecto abierto (p. ej. la selección)
+        self._paletas = {}             # {consulta: paleta} de obtener_paleta sobre la imagen visible
+        self.capas = None              # Pila de capas (None mientras la imagen es una sola capa)
     
-    def cargar_imagen(self, ruta):
+    @medir()
+    def cargar_imagen(self, ruta, modo_grande=None):
         """
         Carga una imagen desde la ruta especificada
         
         Args:
             ruta (str): Ruta del archivo de imagen
+            modo_grande (bool): True para trabajar sobre un memmap en disco;
+                None lo decide según config.UMBRAL_IMAGEN_GRANDE
             
         Returns:
             tuple: (bool, str) - (éxito, mensaje)
         """
         try:
-            self.img_original = Image.open(ruta).convert("RGB")
-            self.img_array = np.array(self.img_original)
-            self.historial.clear()
+            # Soltar la imagen anterior antes de reservar la nueva
+            self.cerrar()
+            self.img_array = None
+            self.img_original = None
+            
+            return self.adoptar_imagen(self.leer_imagen(ruta, modo_grande), ruta)
+            
+        except Exception as e:
+            return False, config.MSG_ERROR_CARGA.format(e)
+    
+    @staticmethod
+    @medir()
+    def leer_imagen(ruta, modo_grande=None, progreso=None):
+        """
+        Decodifica una imagen y cuenta su histograma sin tocar el estado del
+        manejador, de modo que puede ejecutarse en un hilo de fondo mientras
+        la interfaz sigue activa
+        
+        Args:
+            ruta (str): Ruta del archivo de imagen
+            modo_grande (bool): Igual que en cargar_imagen
+            progreso (callable): Recibe la fracción leída (0 a 1)
+            
+        Returns:
+            tuple: (img_original, img_array, almacen, conteos) para adoptar_imagen
+        """
+        if modo_grande is None:
+            # Los .npy solo se abren con memmap (no hay decodificador de PIL)
+            modo_grande = (Path(ruta).suffix.lower() == ".npy" or
+                           contar_pixeles(ruta) >= config.UMBRAL_IMAGEN_GRANDE)
+        
+        if modo_grande:
+            almacen = AlmacenTeselado.desde_archivo(ruta, progreso=progreso)
+            return almacen.original, almacen.trabajo, almacen, contar(almacen.original)
+        
+        # Decodificar por bloques para poder informar del avance
+        parser = ImageFile.Parser()
+        total = max(1, os.path.getsize(ruta))
+        leidos = 0
+        with open(ruta, "rb") as f:
+            while True:
+                bloque = f.read(config.LECTURA_BLOQUE_BYTES)
+                if not bloque:
+                    break
+                parser.feed(bloque)
+                leidos += len(bloque)
+                if progreso is not None:
+                    progreso(leidos / total)
+        img_original = np.array(parser.close().convert("RGB"))
+        img_original.flags.writeable = False
+        return img_original, img_original.copy(), None, contar(img_original)
+    
+    @medir()
+    def adoptar_imagen(self, leida, ruta):
+        """
+        Sustituye la imagen actual por una ya decodificada con leer_imagen (solo
+        intercambia referencias: lo costoso se hizo al leer)
+        
+        Args:
+            leida (tuple): Resultado de leer_imagen
+            ruta (str): Ruta del archivo (para el mensaje)
+            
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        self.cerrar()
+        self.img_original, self.img_array, self.almacen, conteos = leida
+        self.ruta = str(ruta)
+        self.metadatos = {}
+        self.historial.reiniciar(self.img_original)
+        self.trazo = None
+        self.region_modificada = None
+        self._reiniciar_derivados(conteos)
+        
+        alto, ancho = self.img_array.shape[:2]
+        nombre = Path(ruta).name
+        total_pixeles = ancho * alto
+        
+        mensaje = (f"📷 {nombre} | Tamaño: {ancho} x {alto} px | "
+                  f"Total píxeles: {total_pixeles:,}")
+        if self.almacen is not None:
+            mensaje += config.MSG_MODO_GRANDE
+        
+        return True, mensaje
+    
+    @medir()
+    def guardar_imagen(self, ruta):
+        """
+        Guarda la imagen modificada en la ruta especificada
+        
+        Args:
+            ruta (str): Ruta donde guardar la imagen
+            
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        if self.img_array is None:
+            return False, config.MSG_NO_IMAGE_TO_SAVE
+        
+        if self.almacen is not None:
+            self.almacen.sincronizar()
+        return self.guardar_instantanea(self.imagen_visible(), ruta)
+    
+    @medir()
+    def instantanea(self):
+        """
+        Copia inmutable de la imagen actual (la compuesta, si hay capas), para
+        codificarla en segundo plano mientras se sigue editando
+        
+        En modo imagen grande no se copia (duplicaría el archivo de trabajo): se
+        devuelve la propia copia de trabajo y no se debe editar hasta terminar.
+        
+        Returns:
+            ndarray: Imagen de solo lectura o None si no hay imagen cargada
+        """
+        if self.img_array is None:
+            return None
+        
+        if self.almacen is not None:
+            self.almacen.sincronizar()
+            return self.img_array
+        
+        copia = self.imagen_visible().copy()
+        copia.flags.writeable = False
+        return copia
+    
+    @staticmethod
+    @medir()
+    def guardar_instantanea(img_array, ruta):
+        """
+        Codifica y escribe una imagen (no usa el estado del manejador)
+        
+        Args:
+            img_array (ndarray): Imagen a guardar (p. ej. una instantanea())
+            ruta (str): Ruta donde guardar la imagen
+            
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        try:
+            img_modificada = Image.fromarray(img_array)
+            img_modificada.save(ruta)
+            
+            mensaje = config.MSG_SAVED_SUCCESS.format(ruta)
+            return True, mensaje
+            
+        except Exception as e:
+            return False, config.MSG_ERROR_GUARDADO.format(e)
+    
+    # ========== PROYECTOS ==========
+    
+    @medir()
+    def instantanea_proyecto(self, metadatos=None):
+        """
+        Reúne lo que se guarda en un proyecto sin copiar la imagen entera: el
+        original y los puntos de control del historial ya no se modifican, y
+        de la imagen actual solo se copia la caja que difiere del original
+        
+        En modo imagen grande no se copia nada: no se debe editar hasta terminar.
+        
+        Args:
+            metadatos (dict): Datos JSON adicionales (p. ej. la selección activa)
+            
+        Returns:
+            tuple: (arrays, info) para guardar_instantanea_proyecto o None si
+                no hay imagen cargada o tiene varias capas
+        """
+        if self.img_array is None or self.capas is not None:
+            return None
+        
+        if self.almacen is not None:
+            self.almacen.sincronizar()
+        
+        arrays = {"original": self.img_original}
+        forma = self.img_array.shape
+        if forma == self.img_original.shape:
+            caja = proyecto.caja_diferencias(self.img_array, self.img_original)
+        else:
+            caja = (0, 0, forma[1], forma[0])
+        if caja is not None:
+            x_min, y_min, x_max, y_max = caja
+            zona = self.img_array[y_min:y_max, x_min:x_max]
+            arrays["actual"] = zona if self.almacen is not None else zona.copy()
+        
+        estado = self.historial.exportar()
+        puntos = {str(indice): "original" if imagen is self.img_original
+                  else proyecto.codificar(imagen, arrays)
+                  for indice, imagen in estado["puntos"].items()}
+        comandos = [{"operacion": comando.operacion,
+                     "parametros": proyecto.codificar(comando.parametros, arrays),
+                     "region": comando.region}
+                    for comando in estado["comandos"]]
+        
+        info = {
+            "actual": {"forma": list(forma), "caja": caja},
+            "historial": {"inicio": estado["inicio"], "posicion": estado["posicion"],
+                          "comandos": comandos, "puntos": puntos},
+            "histograma": self.histograma.conteos.tolist(),
+            "metadatos": dict(proyecto.metadatos_basicos(self.ruta, forma), **(metadatos or {})),
+        }
+        return arrays, info
+    
+    @staticmethod
+    @medir()
+    def guardar_instantanea_proyecto(instantanea, ruta):
+        """
+        Escribe un proyecto (no usa el estado del manejador)
+        
+        Args:
+            instantanea (tuple): Resultado de instantanea_proyecto
+            ruta (str): Archivo de proyecto
+            
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        try:
+            proyecto.guardar(ruta, *instantanea)
+            return True, config.MSG_PROYECTO_GUARDADO.format(ruta)
+        except (OSError, ValueError, TypeError) as e:
+            return False, config.MSG_ERROR_GUARDADO.format(e)
+    
+    @medir()
+    def guardar_proyecto(self, ruta, metadatos=None):
+        """
+        Guarda original, imagen actual, historial y metadatos en un proyecto
+        
+        Args:
+            ruta (str): Archivo de proyecto
+            metadatos (dict): Datos JSON adicionales
+            
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        if self.img_array is None:
+            return False, config.MSG_NO_IMAGE_TO_SAVE
+        if self.capas is not None:
+            return False, config.MSG_ERROR_CAPAS_PROYECTO
+        return self.guardar_instantanea_proyecto(self.instantanea_proyecto(metadatos), ruta)
+    
+    @medir()
+    def abrir_proyecto(self, ruta, modo_grande=None):
+        """
+        Abre un proyecto proyectando sus arrays con memmap (sin decodificar ni
+        copiar): la imagen de trabajo es una proyección copy-on-write del
+        archivo, así que solo ocupan memoria las páginas que se editan
+        
+        En modo imagen grande la copia de trabajo es un archivo temporal, como
+        al cargar cualquier imagen grande.
+        
+        Args:
+            ruta (str): Archivo de proyecto (debe seguir existiendo mientras esté abierto)
+            modo_grande (bool): Igual que en cargar_imagen
+            
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        try:
+            cabecera, arrays = proyecto.abrir(ruta)
+            original = arrays["original"]
+            forma = tuple(cabecera["actual"]["forma"])
+            caja = cabecera["actual"]["caja"]
+            fuente = original if forma == original.shape else arrays["actual"]
+            
+            historial = cabecera["historial"]
+            comandos = [Comando.desde_region(c["operacion"],
+                                             proyecto.decodificar(c["parametros"], arrays),
+                                             None if c["region"] is None else tuple(c["region"]))
+                        for c in historial["comandos"]]
+            if modo_grande is None:
+                modo_grande = forma[0] * forma[1] >= config.UMBRAL_IMAGEN_GRANDE
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            return False, config.MSG_ERROR_CARGA.format(e)
+        
+        self.cerrar()
+        if modo_grande:
+            self.almacen = AlmacenTeselado(original)
+            if fuente is not original:
+                self.almacen.trabajo = self.almacen.crear_temporal(forma)
+                copiar_por_franjas(fuente, self.almacen.trabajo)
+            self.img_original, self.img_array = original, self.almacen.trabajo
+        else:
+            # El original sigue siendo un memmap: no cuenta en el presupuesto del historial
+            self.img_original = original
+            self.img_array = proyecto.mapear_copia(fuente)
+        if caja is not None and fuente is original:
+            x_min, y_min, x_max, y_max = caja
+            self.img_array[y_min:y_max, x_min:x_max] = arrays["actual"]
+        
+        puntos = {int(indice): self.img_original if valor == "original"
+                  else proyecto.decodificar(valor, arrays)
+                  for indice, valor in historial["puntos"].items()}
+        self.historial.importar(historial["inicio"], historial["posicion"], comandos, puntos)
+        self.ruta = str(ruta)
+        self.metadatos = cabecera.get("metadatos", {})
+        self.trazo = None
+        self.region_modificada = None
+        self._reiniciar_derivados(cabecera.get("histograma"))
+        
+        alto, ancho = forma[:2]
+        mensaje = config.MSG_PROYECTO_ABIERTO.format(Path(ruta).name, ancho, alto, len(self.historial))
+        if self.almacen is not None:
+            mensaje += config.MSG_MODO_GRANDE
+        return True, mensaje
+    
+    @medir()
+    def modificar_pixel(self, x, y, r, g, b):
+        """
+        Modifica el color de un píxel específico
+        
+        Args:
+            x, y (int): Coordenadas del píxel
+            r, g, b (int): Valores RGB (0-255)
+            
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        try:
+            if self.img_array is None:
+                return False, config.MSG_NO_IMAGE
+            
+            alto, ancho = self.img_array.shape[:2]
+            
+            # Validar coordenadas
+            if not (0 <= x < ancho and 0 <= y < alto):
+                mensaje = config.MSG_ERROR_OUT_OF_RANGE.format(ancho - 1, alto - 1)
+                return False, mensaje
+            
+            # Validar valores RGB
+            if not all(0 <= val <= 255 for val in [r, g, b]):
+                return False, config.MSG_ERROR_RGB_RANGE
+            
+            # Aplicar cambio y guardarlo en el historial
+            self._ejecutar(Comando("pixel", (x, y, (r, g, b)), alto, ancho))
+            
+            mensaje = config.MSG_PIXEL_CHANGED.format(x, y, r, g, b)
+            return True, mensaje
+            
+        except Exception as e:
+            return False, f"Error al modificar píxel:\n{str(e)}"
+    
+    @medir()
+    def modificar_pixeles_lote(self, xs, ys, colores):
+        """
+        Modifica muchos píxeles sueltos de una vez, como un solo paso del historial
+        
+        Args:
+            xs, ys (array-like): Coordenadas de los píxeles (misma longitud)
+            colores (array-like): Un color (r, g, b) para todos o uno por píxel (N x 3)
+            
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        try:
+            if self.img_array is None:
+                return False, config.MSG_NO_IMAGE
+            
+            xs = np.asarray(xs)
+            ys = np.asarray(ys)
+            colores = np.asarray(colores)
+            if xs.ndim != 1 or xs.shape != ys.shape:
+                return False, config.MSG_ERROR_LOTE_COORDENADAS
+            if colores.shape not in ((3,), (len(xs), 3)):
+                return False, config.MSG_ERROR_LOTE_COLORES.format(len(xs))
+            if len(xs) == 0:
+                return True, config.MSG_LOTE_CAMBIADO.format(0)
+            if not (np.issubdtype(xs.dtype, np.integer) and np.issubdtype(ys.dtype, np.integer)
+                    and np.issubdtype(colores.dtype, np.integer)):
+                return False, config.MSG_ERROR_LOTE_ENTEROS
+            
+            alto, ancho = self.img_array.shape[:2]
+            
+            # Validar coordenadas y valores RGB de todo el lote a la vez
+            if xs.min() < 0 or ys.min() < 0 or xs.max() >= ancho or ys.max() >= alto:
+                return False, config.MSG_ERROR_OUT_OF_RANGE.format(ancho - 1, alto - 1)
+            if colores.min() < 0 or colores.max() > 255:
+                return False, config.MSG_ERROR_RGB_RANGE
+            
+            # Un único paso del historial
+            self._ejecutar(Comando("lote", (xs.astype(np.int32), ys.astype(np.int32),
+                                            colores.astype(np.uint8)), alto, ancho))
+            
+            return True, config.MSG_LOTE_CAMBIADO.format(len(xs))
+            
+        except Exception as e:
+            return False, f"Error al modificar píxeles:\n{str(e)}"
+    
+    @medir()
+    def deshacer(self):
+        """
+        Deshace el último cambio
+        
+        Returns:
+            bool: True si se pudo deshacer, False si no hay historial
+        """
+        if self.img_array is not None and self.historial.ultimo_reemplaza():
+            if self.capas is not None:
+                # Cambiaría las dimensiones de una sola capa
+                return False
+            self._sustituir_imagen(self.historial.deshacer_reemplazo())
+            return True
+        if self.img_array is not None and len(self.historial) > 0:
+            antes = self._registrar_cambio_region(*self.historial.region_ultima())
+            region = self.historial.deshacer(self._lienzo)
+            self._cambio_aplicado(*region, antes=antes)
+            return True
+        return False
+    
+    @medir()
+    def rehacer(self):
+        """
+        Vuelve a aplicar el último cambio deshecho
+        
+        Returns:
+            bool: True si se pudo rehacer, False si no hay nada que rehacer
+        """
+        if self.img_array is not None and self.historial.siguiente_reemplaza():
+            if self.capas is not None:
+                return False
+            self._sustituir_imagen(self.historial.rehacer_reemplazo())
+            return True
+        if self.img_array is not None and self.historial.rehacibles > 0:
+            antes = self._registrar_cambio_region(*self.historial.region_siguiente())
+            region = self.historial.rehacer(self._lienzo)
+            self._cambio_aplicado(*region, antes=antes)
+            return True
+        return False
+    
+    def _ejecutar(self, comando):
+        """
+        Aplica un comando a la imagen, lo guarda en el historial y marca su región
+        
+        Args:
+            comando (Comando): Comando creado con las dimensiones de la imagen actual
+            
+        Returns:
+            int: Número de píxeles modificados
+        """
+        if comando.region is None:
+            return 0
+        
+        x_min, y_min, x_max, y_max = comando.region
+        antes = self._registrar_cambio_region(x_min, y_min, x_max, y_max)
+        contador = comando.aplicar(self._lienzo[y_min:y_max, x_min:x_max], x_min, y_min)
+        if comando.operacion == "parche":
+            # Un contenido que no cabe en el presupuesto del historial va a disco
+            x0, y0, contenido = comando.parametros
+            contenido = self._punto_para_historial(contenido)
+            if contenido is not comando.parametros[2]:
+                comando = Comando.desde_region("parche", (x0, y0, contenido), comando.region)
+        self.historial.registrar(comando, self._capturador())
+        self._cambio_aplicado(x_min, y_min, x_max, y_max, antes)
+        return contador
+    
+    def _capturador(self):
+        """Función que copia la imagen para los puntos de control del historial"""
+        return self._capturar_punto_control
+    
+    def _capturar_punto_control(self):
+        """
+        Copia de solo lectura de la imagen (o del lienzo de la capa) actual; en
+        disco si no cabe en el presupuesto del historial o en modo imagen grande
+        """
+        return self._punto_para_historial(self._lienzo, copiar=True)
+    
+    def _punto_para_historial(self, imagen, copiar=False):
+        """
+        Imagen lista para guardarse en el historial (punto de control o contenido
+        de un parche): la propia imagen (o una copia) si cabe en memoria; si
+        no, una copia en disco
+        
+        Args:
+            imagen (ndarray): Imagen que ya no se modificará (salvo con copiar)
+            copiar (bool): True si la imagen sigue editándose
+        """
+        if isinstance(imagen, np.memmap) and not copiar:
+            return imagen
+        if isinstance(imagen, np.memmap) or not self.historial.cabe_en_memoria(imagen.nbytes):
+            return copia_en_disco(imagen)
+        if copiar:
+            imagen = imagen.copy()
+        imagen.flags.writeable = False
+        return imagen
+    
+    def _registrar_cambio_region(self, x_min, y_min, x_max, y_max):
+        """
+        Prepara la actualización del histograma antes de modificar una región
+        (las tablas integrales solo necesitan saber qué región cambió)
+        
+        Returns:
+            ndarray: Copia del contenido previo, para pasarla a _cambio_aplicado,
+                o None si la región era demasiado grande para copiarla (entonces
+                ya se ha descontado entera del histograma)
+        """
+        if self.histograma is None:
+            return None
+        zona = self.img_array[y_min:y_max, x_min:x_max]
+        if zona.nbytes > config.HISTOGRAMA_MAX_COPIA_BYTES:
+            self.histograma.restar(zona)
+            return None
+        return zona.copy()
+    
+    def _cambio_aplicado(self, x_min, y_min, x_max, y_max, antes=None):
+        """
+        Actualiza el histograma con el contenido nuevo de una región ya modificada
+        y la marca para redibujar
+        
+        Args:
+            x_min, y_min, x_max, y_max (int): Región modificada
+            antes (ndarray): Contenido previo de la región (solo se cuentan los
+                píxeles que cambiaron) o None si ya se descontó del histograma
+        """
+        if self.histograma is not None:
+            zona = self.img_array[y_min:y_max, x_min:x_max]
+            if antes is None:
+                self.histograma.sumar(zona)
+            else:
+                self.histograma.cambiar(antes, zona)
+        if self.capas is not None:
+            self.capas.pintada(self.capas.capa_activa, (x_min, y_min, x_max, y_max))
+        self._marcar_region(x_min, y_min, x_max, y_max)
+        self._anotar_diario(x_min, y_min, x_max, y_max)
+    
+    def _anotar_diario(self, x_min, y_min, x_max, y_max):
+        """
+        Copia el contenido nuevo de una región al diario de autoguardado, si lo
+        hay; con varias capas no se anota (el diario reproduce una sola imagen)
+        """
+        if self.autoguardado is None or self.capas is not None:
+            return
+        
+        zona = self.img_array[y_min:y_max, x_min:x_max]
+        if self.almacen is not None and zona.nbytes > config.AUTOGUARDADO_BYTES_FRANJA:
+            # Una región enorme se copia a disco, no a memoria
+            copia = self.almacen.crear_temporal(zona.shape)
+            copiar_por_franjas(zona, copia)
+        else:
+            copia = zona.copy()
+        self.autoguardado.anotar_region(x_min, y_min, copia)
+        
+        # El punto de control del diario reutiliza la copia que ya guarda el
+        # historial (sin trazo a medias, la imagen es igual a ella)
+        if self.autoguardado.quiere_punto and self.trazo is None:
+            punto = self.historial.punto_actual()
+            if punto is not None:
+                self.autoguardado.punto_control(punto, cambios=0)
+    
+    def _reiniciar_derivados(self, conteos=None):
+        """
+        Reconstruye las estructuras derivadas para la imagen actual
+        
+        Args:
+            conteos (ndarray): Histogramas ya calculados de la imagen, si se conocen
+        """
+        version = 0 if self.histograma is None else self.histograma.version + 1
+        self.histograma = Histograma(self.img_array, version, conteos)
+        self._paletas = {}
+        # Las tablas integrales se vuelven a crear en la próxima consulta
+        self.estadisticas = None
+    
+    def _tabla_estadisticas(self, fuente):
+        """
+        Tablas integrales de una imagen, creándolas la primera vez o si se
+        pide otra (sin recorrerla: cada tesela se calcula al consultarla)
+        
+        Args:
+            fuente (ndarray): Imagen de _imagen_muestreo
+        
+        Returns:
+            TablaIntegral: Tablas de la imagen
+        """
+        if self.estadisticas is None or self.estadisticas.img_array is not fuente:
+            self.estadisticas = TablaIntegral(fuente)
+        return self.estadisticas
+    
+    def _imagen_muestreo(self, solo_capa=False):
+        """
+        Imagen de la que leen el cuentagotas, la varita y las estadísticas
+        
+        Args:
+            solo_capa (bool): True para leer la capa activa en lugar de lo que
+                se ve (la compuesta, si hay capas)
+        
+        Returns:
+            ndarray: Imagen (alto x ancho x 3)
+        """
+        if solo_capa:
+            return self.img_array
+        return self.imagen_visible()
+    
+    def _marcar_region(self, x_min, y_min, x_max, y_max):
+        """
+        Añade una región a la zona modificada pendiente de redibujar y marca sus
+        teselas de las tablas integrales y descarta las paletas calculadas (por
+        aquí pasa todo lo que cambia la imagen visible, también ocultar o mover capas)
+        """
+        self.pixeles_tocados += (x_max - x_min) * (y_max - y_min)
+        if self._paletas:
+            self._paletas.clear()
+        if self.estadisticas is not None:
+            self.estadisticas.invalidar(x_min, y_min, x_max, y_max)
+        if self.region_modificada is None:
+            self.region_modificada = (x_min, y_min, x_max, y_max)
+        else:
+            rx0, ry0, rx1, ry1 = self.region_modificada
+            self.region_modificada = (min(rx0, x_min), min(ry0, y_min),
+                                      max(rx1, x_max), max(ry1, y_max))
+    
+    def tomar_region_modificada(self):
+        """
+        Devuelve la región modificada desde la última consulta y la reinicia
+        
+        Returns:
+            tuple: (x_min, y_min, x_max, y_max) o None si no cambió nada
+        """
+        region = self.region_modificada
+        self.region_modificada = None
+        return region
+    
+    @medir()
+    def restaurar_original(self):
+        """
+        Restaura la imagen original (con varias capas, la capa activa tal como
+        se creó)
+        
+        Returns:
+            bool: True si se restauró, False si no hay imagen original
+        """
+        if self.capas is not None:
+            return self._restaurar_capa()
+        if self.img_original is not None:
+            self.historial.reiniciar(self.img_original)
+            if self.img_array.shape != self.img_original.shape:
+                # Tras una transformación las dimensiones ya no coinciden
+                self._sustituir_imagen(self.img_original)
+                return True
+            if self.almacen is not None:
+                # Copiar franja a franja sobre el memmap de trabajo
+                self.almacen.restaurar()
+            else:
+                self.img_array = np.array(self.img_original)
+            self.trazo = None
+            self._reiniciar_derivados()
+            alto, ancho = self.img_array.shape[:2]
+            self._marcar_region(0, 0, ancho, alto)
+            if self.autoguardado is not None:
+                self.autoguardado.punto_control(self.img_original)
+            return True
+        return False
+    
+    def _sustituir_imagen(self, imagen):
+        """
+        Pone como imagen de trabajo una copia editable de otra (de cualquier
+        tamaño) y reconstruye todo lo que dependía de la anterior
+        
+        Args:
+            imagen (ndarray): Imagen guardada (p. ej. en el historial), que no se modifica
+        """
+        if self.almacen is not None:
+            trabajo = self.almacen.crear_temporal(imagen.shape)
+            copiar_por_franjas(imagen, trabajo)
+            self.almacen.trabajo = trabajo
+            self.img_array = trabajo
+        else:
+            self.img_array = np.array(imagen)
+        self.trazo = None
+        self._reiniciar_derivados()
+        # Otras dimensiones: la zona pendiente de redibujar es la imagen nueva entera
+        alto, ancho = self.img_array.shape[:2]
+        self.region_modificada = (0, 0, ancho, alto)
+        self.pixeles_tocados += ancho * alto
+        # El diario no copia la imagen nueva: la guarda como punto de control
+        if self.autoguardado is not None:
+            self.autoguardado.punto_control(imagen)
+    
+    # ========== CAPAS ==========
+    
+    @property
+    def _lienzo(self):
+        """
+        Array que editan los comandos y el historial: el lienzo de la capa
+        activa (con alfa si es transparente) o, sin capas, la propia imagen
+        """
+        if self.capas is None:
+            return self.img_array
+        return self.capas.capa_activa.lienzo
+    
+    def imagen_visible(self):
+        """
+        Imagen que se ve y se guarda: sin capas, la propia img_array; con capas,
+        la compuesta (solo se recalculan las teselas que cambiaron)
+        
+        Returns:
+            ndarray: Imagen (alto x ancho x 3) o None si no hay imagen cargada
+        """
+        if self.capas is None:
+            return self.img_array
+        return self.capas.componer()
+    
+    def _pila(self):
+        """Pila de capas; la primera vez se crea con la imagen actual como fondo"""
+        if self.capas is None:
+            self.capas = PilaCapas(Capa(config.CAPAS_NOMBRE_FONDO, self.img_array,
+                                        self.img_original, self.historial))
+        return self.capas
+    
+    def _usar_capa_activa(self, caja=None):
+        """
+        Pone la capa activa como imagen de trabajo (con su historial) y marca
+        para redibujar la zona de la compuesta que cambió
+        
+        Args:
+            caja (tuple): (x_min, y_min, x_max, y_max) que cambió o None
+        """
+        capa = self.capas.capa_activa
+        self.img_array = capa.pixeles
+        self.img_original = capa.original
+        self.historial = capa.historial
+        self.trazo = None
+        self._reiniciar_derivados()
+        if caja is not None:
+            self._marcar_region(*caja)
+    
+    def _indice_capa(self, indice):
+        """
+        Comprueba un índice de capa (None = la activa)
+        
+        Raises:
+            ValueError: Si no hay imagen o no existe la capa
+        """
+        if self.img_array is None:
+            raise ValueError(config.MSG_NO_IMAGE)
+        total = 1 if self.capas is None else len(self.capas)
+        if indice is None:
+            return 0 if self.capas is None else self.capas.activa
+        if not 0 <= indice < total:
+            raise ValueError(config.MSG_ERROR_CAPA_INDICE.format(indice, total))
+        return indice
+    
+    def listar_capas(self):
+        """
+        Returns:
+            list: Una descripción por capa, de abajo arriba (nombre, visible,
+                opacidad, modo, transparente y activa)
+        """
+        if self.img_array is None:
+            return []
+        if self.capas is None:
+            return [{"nombre": config.CAPAS_NOMBRE_FONDO, "visible": True, "opacidad": 1.0,
+                     "modo": "normal", "transparente": False, "activa": True}]
+        return [dict(capa.descripcion(), activa=i == self.capas.activa)
+                for i, capa in enumerate(self.capas.capas)]
+    
+    @medir()
+    def agregar_capa(self, contenido=None, nombre=None):
+        """
+        Añade una capa encima de la activa y pasa a editarla
+        
+        Args:
+            contenido (ndarray): Píxeles de la capa (alto x ancho x 3, opaca, o
+                x 4 con alfa; uint8 y de las dimensiones de la imagen); None
+                para una capa transparente vacía
+            nombre (str): Nombre de la capa (por defecto "Capa N")
+            
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        if self.img_array is None:
+            return False, config.MSG_NO_IMAGE
+        if self.almacen is not None:
+            return False, config.MSG_ERROR_CAPAS_GRANDE
+        
+        alto, ancho = self.img_array.shape[:2]
+        if contenido is None:
+            # El estado inicial de una capa vacía no ocupa memoria
+            original = np.broadcast_to(np.zeros(4, dtype=np.uint8), (alto, ancho, 4))
+            lienzo = np.zeros((alto, ancho, 4), dtype=np.uint8)
+        else:
+            contenido = np.asarray(contenido)
+            if (contenido.dtype != np.uint8 or contenido.ndim != 3
+                    or contenido.shape[:2] != (alto, ancho) or contenido.shape[2] not in (3, 4)):
+                return False, config.MSG_ERROR_CAPA_FORMA.format(ancho, alto)
+            original = contenido.copy()
+            original.flags.writeable = False
+            lienzo = contenido.copy()
+        
+        pila = self._pila()
+        historial = HistorialComandos(config.MAX_HISTORIAL_BYTES,
+                                      config.HISTORIAL_IMAGENES_ENTRE_PUNTOS,
+                                      config.HISTORIAL_FRACCION_PUNTO)
+        historial.reiniciar(original)
+        capa = Capa(nombre or config.CAPAS_NOMBRE.format(len(pila)), lienzo, original, historial)
+        self._usar_capa_activa(pila.agregar(capa, pila.activa + 1))
+        return True, config.MSG_CAPA_AGREGADA.format(capa.nombre, len(pila))
+    
+    @medir()
+    def duplicar_capa(self):
+        """
+        Añade encima de la capa activa una copia de ella y pasa a editar la copia
+        
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        if self.img_array is None:
+            return False, config.MSG_NO_IMAGE
+        nombre = self.listar_capas()[self._indice_capa(None)]["nombre"]
+        return self.agregar_capa(self._lienzo, config.MSG_CAPA_COPIA.format(nombre))
+    
+    @medir()
+    def importar_capa(self, ruta):
+        """
+        Añade como capa una imagen del disco (con su transparencia, si la tiene),
+        pegada en la esquina superior izquierda y recortada a la imagen actual
+        
+        Args:
+            ruta (str): Archivo de imagen
+            
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        if self.img_array is None:
+            return False, config.MSG_NO_IMAGE
+        try:
+            with Image.open(ruta) as imagen:
+                pixeles = np.asarray(imagen.convert("RGBA"))
+        except Exception as e:
+            return False, config.MSG_ERROR_CARGA.format(e)
+        
+        alto, ancho = self.img_array.shape[:2]
+        pixeles = pixeles[:alto, :ancho]
+        if pixeles.shape[:2] == (alto, ancho) and pixeles[..., 3].min() == 255:
+            # Cubre toda la imagen sin transparencias: capa opaca
+            contenido = pixeles[..., :3]
+        else:
+            contenido = np.zeros((alto, ancho, 4), dtype=np.uint8)
+            contenido[:pixeles.shape[0], :pixeles.shape[1]] = pixeles
+        return self.agregar_capa(contenido, Path(ruta).stem)
+    
+    @medir()
+    def activar_capa(self, indice):
+        """
+        Pasa a editar otra capa (la composición no cambia)
+        
+        Args:
+            indice (int): Posición de la capa, de abajo (0) arriba
+            
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        try:
+            indice = self._indice_capa(indice)
+        except ValueError as e:
+            return False, str(e)
+        if self.capas is not None and indice != self.capas.activa:
+            self.capas.activa = indice
+            self._usar_capa_activa()
+        return True, config.MSG_CAPA_ACTIVA.format(self.listar_capas()[indice]["nombre"])
+    
+    @medir()
+    def modificar_capa(self, indice=None, visible=None, opacidad=None, modo=None):
+        """
+        Cambia la visibilidad, la opacidad o el modo de fusión de una capa;
+        solo se recomponen las teselas donde la capa tiene contenido
+        
+        Args:
+            indice (int): Posición de la capa (None = la activa)
+            visible (bool): Mostrar u ocultar la capa (None = sin cambios)
+            opacidad (float): De 0 a 1 (None = sin cambios)
+            modo (str): Modo de fusión de config.CAPAS_MODOS (None = sin cambios)
+            
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        try:
+            indice = self._indice_capa(indice)
+        except ValueError as e:
+            return False, str(e)
+        if modo is not None and modo not in config.CAPAS_MODOS:
+            return False, config.MSG_ERROR_CAPA_MODO.format(modo, ", ".join(config.CAPAS_MODOS))
+        if opacidad is not None and not 0 <= opacidad <= 1:
+            return False, config.MSG_ERROR_CAPA_OPACIDAD
+        
+        capa = self._pila().capas[indice]
+        previo = (capa.visible, capa.opacidad, capa.modo)
+        if visible is not None:
+            capa.visible = bool(visible)
+        if opacidad is not None:
+            capa.opacidad = float(opacidad)
+        if modo is not None:
+            capa.modo = modo
+        if (capa.visible, capa.opacidad, capa.modo) != previo:
+            caja = self.capas.invalidar_capa(capa)
+            if caja is not None:
+                self._marcar_region(*caja)
+        
+        estado = "visible" if capa.visible else "oculta"
+        return True, config.MSG_CAPA_MODIFICADA.format(capa.nombre, estado, capa.opacidad, capa.modo)
+    
+    @medir()
+    def mover_capa(self, indice, destino):
+        """
+        Cambia el orden de una capa
+        
+        Args:
+            indice (int): Posición actual de la capa
+            destino (int): Posición nueva, de abajo (0) arriba
+            
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        try:
+            indice = self._indice_capa(indice)
+            destino = self._indice_capa(destino)
+        except ValueError as e:
+            return False, str(e)
+        if indice != destino:
+            caja = self.capas.mover(indice, destino)
+            if caja is not None:
+                self._marcar_region(*caja)
+        return True, config.MSG_CAPA_MOVIDA.format(self.capas.capas[destino].nombre, destino)
+    
+    @medir()
+    def eliminar_capa(self, indice=None):
+        """
+        Quita una capa; si solo queda una capa opaca, visible y normal, se
+        vuelve a trabajar sin pila de capas
+        
+        Args:
+            indice (int): Posición de la capa (None = la activa)
+            
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        try:
+            indice = self._indice_capa(indice)
+        except ValueError as e:
+            return False, str(e)
+        if self.capas is None:
+            return False, config.MSG_ERROR_CAPA_UNICA
+        
+        capa, caja = self.capas.quitar(indice)
+        restantes = len(self.capas)
+        unica = self.capas.capas[0]
+        if restantes == 1 and unica.tapa and unica.visible:
+            # La compuesta sería igual a la capa: se vuelve al camino sin capas
+            self.capas = None
+            self.img_array = unica.lienzo
+            self.img_original = unica.original
+            self.historial = unica.historial
+            self.trazo = None
+            self._reiniciar_derivados()
+            if caja is not None:
+                self._marcar_region(*caja)
+        else:
+            self._usar_capa_activa(caja)
+        return True, config.MSG_CAPA_ELIMINADA.format(capa.nombre, restantes)
+    
+    @medir()
+    def combinar_capas(self):
+        """
+        Sustituye todas las capas por su imagen compuesta. Si la capa de abajo
+        es opaca, el resultado se guarda como un paso más de su historial (se
+        puede deshacer hasta el contenido que ella tenía); si no, la imagen
+        combinada empieza un historial nuevo
+        
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        if self.img_array is None:
+            return False, config.MSG_NO_IMAGE
+        if self.capas is None:
+            return True, config.MSG_CAPAS_COMBINADAS.format(1)
+        
+        total = len(self.capas)
+        compuesta = self.capas.componer().copy()
+        fondo = self.capas.capas[0]
+        self.capas = None
+        self.trazo = None
+        alto, ancho = compuesta.shape[:2]
+        if fondo.transparente:
+            compuesta.flags.writeable = False
+            self.img_original = compuesta
+            self.img_array = compuesta.copy()
+            self.historial = HistorialComandos(config.MAX_HISTORIAL_BYTES,
+                                               config.HISTORIAL_IMAGENES_ENTRE_PUNTOS,
+                                               config.HISTORIAL_FRACCION_PUNTO)
+            self.historial.reiniciar(compuesta)
+            self._reiniciar_derivados()
+            self._marcar_region(0, 0, ancho, alto)
+        else:
+            self.img_original = fondo.original
+            self.img_array = fondo.lienzo
+            self.historial = fondo.historial
+            self._reiniciar_derivados()
+            self._ejecutar(Comando("parche", (0, 0, compuesta), alto, ancho))
+        return True, config.MSG_CAPAS_COMBINADAS.format(total)
+    
+    def _restaurar_capa(self):
+        """restaurar_original con varias capas: vuelve la capa activa a como se creó"""
+        capa = self.capas.capa_activa
+        if capa.original.shape != capa.lienzo.shape:
+            # El fondo se transformó antes de crear las capas
+            return False
+        capa.lienzo[...] = capa.original
+        self.historial.reiniciar(capa.original)
+        alto, ancho = capa.lienzo.shape[:2]
+        self.capas.pintada(capa, (0, 0, ancho, alto))
+        self.trazo = None
+        self._reiniciar_derivados()
+        self._marcar_region(0, 0, ancho, alto)
+        return True
+    
+    # ========== AUTOGUARDADO ==========
+    
+    def iniciar_autoguardado(self):
+        """
+        Empieza a anotar cada cambio en un diario junto al archivo de la imagen
+        (sustituye al diario que hubiera: antes hay que ofrecer recuperarlo)
+        
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        if self.img_array is None or self.ruta is None:
+            return False, config.MSG_NO_IMAGE
+        
+        self.detener_autoguardado()
+        try:
+            self.autoguardado = autoguardado.DiarioAutoguardado(self.ruta)
+        except OSError as e:
+            return False, str(e)
+        return True, ""
+    
+    def detener_autoguardado(self, borrar=None):
+        """
+        Escribe lo pendiente del diario y deja de anotar cambios
+        
+        Args:
+            borrar (bool): True para eliminar el diario; None lo elimina solo si
+                no tiene cambios sin guardar
+        """
+        if self.autoguardado is None:
+            return
+        if borrar is None:
+            borrar = self.autoguardado.cambios == 0
+        self.autoguardado.cerrar(borrar)
+        self.autoguardado = None
+    
+    def reubicar_autoguardado(self, ruta):
+        """
+        Tras guardar la imagen en un archivo, descarta el diario anterior y
+        empieza uno nuevo junto a ese archivo
+        
+        Args:
+            ruta (str): Archivo recién guardado
+            
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        if self.autoguardado is None:
+            return False, ""
+        
+        self.detener_autoguardado(borrar=True)
+        self.ruta = str(ruta)
+        exito, mensaje = self.iniciar_autoguardado()
+        if exito and self.almacen is None:
+            # El archivo puede tener pérdidas (JPEG) o haberse editado la imagen
+            # mientras se guardaba: el diario parte de una copia exacta
+            self.autoguardado.punto_control(self.instantanea(), cambios=0)
+        return exito, mensaje
+    
+    @staticmethod
+    def diario_pendiente(ruta):
+        """
+        Args:
+            ruta (str): Archivo de imagen
+            
+        Returns:
+            int: Operaciones sin guardar que se pueden recuperar de su diario (0 si ninguna)
+        """
+        try:
+            return autoguardado.examinar(ruta)
+        except (OSError, ValueError, KeyError):
+            return 0
+    
+    @medir()
+    def recuperar_diario(self):
+        """
+        Reproduce sobre la imagen recién cargada el diario que dejó una sesión
+        anterior y empieza un diario nuevo que parte del resultado
+        
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        if self.img_array is None or self.ruta is None:
+            return False, config.MSG_NO_IMAGE
+        
+        if self.almacen is not None:
+            crear = self.almacen.crear_temporal
+        else:
+            crear = lambda forma: np.empty(forma, dtype=np.uint8)
+        try:
+            imagen, operaciones = autoguardado.reproducir(self.ruta, self.img_array, crear)
+        except (OSError, ValueError, KeyError, zlib.error) as e:
+            self.restaurar_original()
+            return False, config.MSG_ERROR_DIARIO.format(e)
+        
+        # El estado recuperado es la nueva base del historial
+        if self.almacen is not None:
+            base = self.almacen.crear_temporal(imagen.shape)
+            copiar_por_franjas(imagen, base)
+            self.almacen.trabajo = imagen
+        else:
+            base = imagen.copy()
+            base.flags.writeable = False
+        self.img_array = imagen
+        self.historial.reiniciar(base)
+        self.trazo = None
+        self._reiniciar_derivados()
+        alto, ancho = imagen.shape[:2]
+        self.region_modificada = (0, 0, ancho, alto)
+        self.pixeles_tocados += ancho * alto
+        
+        exito, mensaje = self.iniciar_autoguardado()
+        if exito:
+            self.autoguardado.punto_control(base, cambios=operaciones)
+        return True, config.MSG_DIARIO_RECUPERADO.format(operaciones)
+    
+    def cerrar(self):
+        """
+        Cierra el diario de autoguardado (lo conserva si tiene cambios sin
+        guardar), descarta las capas y libera el almacén en disco de la imagen
+        grande, si lo hay
+        """
+        self.detener_autoguardado()
+        self.capas = None
+        if self.almacen is not None:
+            self.img_array = None
+            self.img_original = None
+            self.almacen.cerrar()
+            self.almacen = None
+    
+    def obtener_imagen_actual(self):
+        """
+        Obtiene la imagen actual (la compuesta, si hay capas) como objeto PIL Image
+        
+        Returns:
+            Image: Imagen PIL o None si no hay imagen cargada
+        """
+        if self.img_array is not None:
+            return Image.fromarray(self.imagen_visible())
+        return None
+    
+    def obtener_dimensiones(self):
+        """
+        Obtiene las dimensiones de la imagen actual
+        
+        Returns:
+            tuple: (ancho, alto) o None si no hay imagen
+        """
+        if self.img_array is not None:
+            alto, ancho = self.img_array.shape[:2]
+            return ancho, alto
+        return None
+    
+    def obtener_color_pixel(self, x, y, solo_capa=False):
+        """
+        Obtiene el color RGB de un píxel específico tal como se ve
+        
+        Args:
+            x, y (int): Coordenadas del píxel
+            solo_capa (bool): True para leerlo de la capa activa y no de la
+                imagen compuesta
+            
+        Returns:
+            tuple: (r, g, b) o None si está fuera de rango
+        """
+        if self.img_array is not None:
+            alto, ancho = self.img_array.shape[:2]
+            if 0 <= x < ancho and 0 <= y < alto:
+                r, g, b = self._imagen_muestreo(solo_capa)[y, x]
+                return r, g, b
+        return None
+    
+    def _rellenar(self, operacion, parametros, r, g, b, mensaje=config.MSG_PIXELES_CAMBIADOS):
+        """
+        Valida el color y aplica un comando de relleno (ver comandos._MASCARAS)
+        
+        Args:
+            operacion (str): Nombre de la operación
+            parametros (tuple): Parámetros de la operación sin el color
+            r, g, b (int): Valores RGB (0-255)
+            mensaje (str): Mensaje de éxito (recibe el número de píxeles y el color)
+            
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        try:
+            if self.img_array is None:
+                return False, config.MSG_NO_IMAGE
+            
+            # Validar valores RGB
+            if not all(0 <= val <= 255 for val in [r, g, b]):
+                return False, config.MSG_ERROR_RGB_RANGE
+            
+            alto, ancho = self.img_array.shape[:2]
+            contador = self._ejecutar(Comando(operacion, parametros + ((r, g, b),), alto, ancho))
+            
+            return True, mensaje.format(contador, r, g, b)
+            
+        except Exception as e:
+            return False, f"Error al modificar píxeles:\n{str(e)}"
+    
+    @medir()
+    def modificar_pixeles_mascara(self, x0, y0, mascara, r, g, b):
+        """
+        Modifica los píxeles indicados por una máscara booleana
+        
+        Args:
+            x0, y0 (int): Posición de la esquina superior izquierda de la máscara
+            mascara (ndarray): Máscara booleana (alto x ancho)
+            r, g, b (int): Valores RGB (0-255)
+            
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        # El historial guarda la máscara empaquetada (1 bit por píxel)
+        mascara = np.asarray(mascara, dtype=bool)
+        return self._rellenar("mascara", (x0, y0, np.packbits(mascara), mascara.shape), r, g, b)
+    
+    def _caja_seleccion(self, region, mascara):
+        """
+        Caja de una selección (rectángulo, región de la varita o ambos) y la
+        máscara recortada a esa caja
+        
+        Args:
+            region (tuple): (x1, y1, x2, y2) con las esquinas incluidas; None para toda la imagen
+            mascara (tuple): (x_min, y_min, mascara) de seleccionar_por_color, o None
+            
+        Returns:
+            tuple: ((x_min, y_min, x_max, y_max), mascara o None), o None si la
+                selección queda fuera de la imagen
+        """
+        caja = self.normalizar_region(region)
+        if caja is None or mascara is None:
+            return None if caja is None else (caja, None)
+        
+        x_min, y_min, x_max, y_max = caja
+        mx, my, mascara = mascara
+        mascara = np.asarray(mascara, dtype=bool)
+        x_min, y_min = max(x_min, mx), max(y_min, my)
+        x_max = min(x_max, mx + mascara.shape[1])
+        y_max = min(y_max, my + mascara.shape[0])
+        if x_max <= x_min or y_max <= y_min:
+            return None
+        return (x_min, y_min, x_max, y_max), mascara[y_min - my:y_max - my, x_min - mx:x_max - mx]
+    
+    @staticmethod
+    def _empaquetar(mascara):
+        """(bits, forma) de una máscara para guardarla en un comando; (None, None) si no hay"""
+        if mascara is None:
+            return None, None
+        return np.packbits(mascara), mascara.shape
+    
+    @staticmethod
+    def _comprobar_tolerancia(tolerancia, modo):
+        """Lanza ValueError si el modo de tolerancia no existe o la tolerancia no cabe en él"""
+        if modo not in relleno.MODOS:
+            raise ValueError(config.MSG_ERROR_MODO_TOLERANCIA.format(
+                modo, ", ".join(relleno.MODOS)))
+        if not 0 <= tolerancia <= relleno.MODOS[modo]:
+            raise ValueError(config.MSG_ERROR_PARAMETRO_RANGO.format(
+                "tolerancia", 0, relleno.MODOS[modo]))
+    
+    @medir()
+    def seleccionar_por_color(self, x, y, tolerancia=config.RELLENO_TOLERANCIA, modo="canal",
+                              conexion=config.RELLENO_CONEXION, solo_capa=False):
+        """
+        Varita mágica: región conectada de píxeles de color parecido al de (x, y)
+        
+        Args:
+            x, y (int): Píxel de partida
+            tolerancia (int): Diferencia máxima de color (el máximo depende del modo, ver relleno.MODOS)
+            modo (str): "canal" (cada canal por separado), "euclidea" (distancia RGB)
+                o "perceptual" (ΔE en CIE Lab)
+            conexion (int): 4 (vecinos en cruz) u 8 (también en diagonal)
+            solo_capa (bool): True para comparar los colores de la capa activa en
+                lugar de los de la imagen compuesta
+            
+        Returns:
+            tuple: (x_min, y_min, mascara) para modificar_pixeles_mascara, o
+                None si no hay imagen o (x, y) está fuera de ella
+            
+        Raises:
+            ValueError: Si la tolerancia, el modo o la conexión no son válidos
+        """
+        self._comprobar_tolerancia(tolerancia, modo)
+        if conexion not in (4, 8):
+            raise ValueError(config.MSG_ERROR_CONEXION)
+        
+        if self.img_array is None:
+            return None
+        alto, ancho = self.img_array.shape[:2]
+        if not (0 <= x < ancho and 0 <= y < alto):
+            return None
+        
+        return relleno.inundar(self._imagen_muestreo(solo_capa), int(x), int(y),
+                               tolerancia, modo, conexion)
+    
+    @medir()
+    def rellenar_region(self, x, y, r, g, b, tolerancia=config.RELLENO_TOLERANCIA, modo="canal",
+                        conexion=config.RELLENO_CONEXION):
+        """
+        Bote de pintura: pinta la región conectada de color parecido al de (x, y)
+        en la capa activa (los colores se comparan en esa misma capa)
+        
+        Args:
+            x, y (int): Píxel de partida
+            r, g, b (int): Valores RGB (0-255)
+            tolerancia, modo, conexion: Igual que en seleccionar_por_color
+            
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        if self.img_array is None:
+            return False, config.MSG_NO_IMAGE
+        
+        try:
+            seleccion = self.seleccionar_por_color(x, y, tolerancia, modo, conexion,
+                                                   solo_capa=True)
+        except ValueError as e:
+            return False, str(e)
+        if seleccion is None:
+            alto, ancho = self.img_array.shape[:2]
+            return False, config.MSG_ERROR_OUT_OF_RANGE.format(ancho - 1, alto - 1)
+        
+        return self.modificar_pixeles_mascara(*seleccion, r, g, b)
+    
+    @medir()
+    def reemplazar_color(self, origen, destino, tolerancia=config.RELLENO_TOLERANCIA, modo="canal",
+                         region=None, mascara=None):
+        """
+        Cambia por otro color todos los píxeles parecidos a uno dado, estén o no
+        conectados, en una sola pasada y como un solo paso del historial
+        
+        Args:
+            origen (tuple): (r, g, b) que se busca (p. ej. de obtener_color_pixel)
+            destino (tuple): (r, g, b) nuevo
+            tolerancia, modo: Igual que en seleccionar_por_color
+            region (tuple): (x1, y1, x2, y2) con las esquinas incluidas; None para toda la imagen
+            mascara (tuple): (x_min, y_min, mascara) como la que devuelve
+                seleccionar_por_color, para cambiar solo sus píxeles; None para no limitar
+            
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        try:
+            if self.img_array is None:
+                return False, config.MSG_NO_IMAGE
+            
+            origen = tuple(int(v) for v in origen)
+            destino = tuple(int(v) for v in destino)
+            if len(origen) != 3 or len(destino) != 3 or not all(0 <= v <= 255 for v in origen + destino):
+                return False, config.MSG_ERROR_RGB_RANGE
+            self._comprobar_tolerancia(tolerancia, modo)
             
             alto, ancho = self.img_array.shape[:2]
-            nombre = Path(ruta).name
-            total_pixeles = ancho * alto
+            seleccion = self._caja_seleccion(region, mascara)
+            if seleccion is None:
+                return False, config.MSG_ERROR_OUT_OF_RANGE.format(ancho - 1, alto - 1)
+            caja, mascara = seleccion
             
-            mensaje = (f"📷 {nombre} | Tamaño: {ancho} x {alto} px | "
-                      f"Total píxeles: {total_pixeles:,}")
+            contador = self._ejecutar(Comando("reemplazo", caja + (origen, tolerancia, modo)
+                                              + self._empaquetar(mascara) + (destino,), alto, ancho))
             
-            return True, mensaje
+            return True, config.MSG_COLOR_REEMPLAZADO.format(contador, origen, destino)
             
+        except ValueError as e:
+            return False, str(e)
         except Exception as e:
-            return False, f"No se pudo cargar la imagen:\n{str(e)}"
+            return False, f"Error al reemplazar el color:\n{str(e)}"
     
-    def guardar_imagen(self, ruta):
+    @medir()
+    def obtener_paleta(self, colores=config.PALETA_COLORES, region=None, mascara=None,
+                       metodo="kmeans"):
         """
-        Guarda la imagen modificada en la ruta especificada
+        Colores dominantes de la imagen, de un área o de la región de la varita
+        
+        Se calculan sobre una muestra de PALETA_MUESTRAS píxeles con semilla fija
+        de lo que se ve (la compuesta, si hay capas) y se guardan hasta que esta
+        cambia: repetir la consulta sin editar entre medias no vuelve a recorrer nada.
         
         Args:
-            ruta (str): Ruta donde guardar la imagen
+            colores (int): Número máximo de colores (1-PALETA_MAX_COLORES)
+            region (tuple): (x1, y1, x2, y2) con las esquinas incluidas; None para toda la imagen
+            mascara (tuple): (x_min, y_min, mascara) de seleccionar_por_color, o None
+            metodo (str): "kmeans" o "mediana" (ver paleta.METODOS)
+            
+        Returns:
+            tuple: (colores, proporciones) - colores (K x 3, uint8) de más a menos
+                frecuente y la fracción del área que ocupa cada uno; None si no
+                hay imagen o la selección queda fuera de ella
+            
+        Raises:
+            ValueError: Si el número de colores o el método no son válidos
+        """
+        if metodo not in paleta.METODOS:
+            raise ValueError(config.MSG_ERROR_PALETA_METODO.format(metodo, ", ".join(paleta.METODOS)))
+        if not 1 <= colores <= config.PALETA_MAX_COLORES:
+            raise ValueError(config.MSG_ERROR_PARAMETRO_RANGO.format(
+                "colores", 1, config.PALETA_MAX_COLORES))
+        if self.img_array is None:
+            return None
+        seleccion = self._caja_seleccion(region, mascara)
+        if seleccion is None:
+            return None
+        caja, mascara = seleccion
+        
+        # Caché hasta el próximo cambio de la imagen visible (ver _marcar_region)
+        paletas = self._paletas
+        clave = (caja, None if mascara is None else hash(np.packbits(mascara).tobytes()),
+                 colores, metodo)
+        if clave not in paletas:
+            if len(paletas) >= config.PALETA_CACHE:
+                del paletas[next(iter(paletas))]
+            muestra = paleta.muestrear(self._imagen_muestreo(), caja, mascara)
+            paletas[clave] = paleta.extraer(muestra, colores, metodo)
+        return paletas[clave]
+    
+    @medir()
+    def cuantizar_paleta(self, colores, region=None, mascara=None):
+        """
+        Lleva cada píxel al color más cercano de una paleta (p. ej. la de obtener_paleta)
+        
+        Args:
+            colores (array-like): Paleta (K x 3) con valores RGB 0-255
+            region (tuple): (x1, y1, x2, y2) con las esquinas incluidas; None para toda la imagen
+            mascara (tuple): (x_min, y_min, mascara) de seleccionar_por_color, o None
             
         Returns:
             tuple: (bool, str) - (éxito, mensaje)
         """
         try:
             if self.img_array is None:
-                return False, config.MSG_NO_IMAGE_TO_SAVE
+                return False, config.MSG_NO_IMAGE
             
-            img_modificada = Image.fromarray(self.img_array)
-            img_modificada.save(ruta)
+            colores = np.asarray(colores)
+            if (colores.ndim != 2 or colores.shape[1] != 3
+                    or not 1 <= len(colores) <= config.PALETA_MAX_COLORES
+                    or colores.min() < 0 or colores.max() > 255):
+                return False, config.MSG_ERROR_PALETA.format(config.PALETA_MAX_COLORES)
             
-            mensaje = f"Imagen guardada exitosamente en:\n{ruta}"
-            return True, mensaje
+            alto, ancho = self.img_array.shape[:2]
+            seleccion = self._caja_seleccion(region, mascara)
+            if seleccion is None:
+                return False, config.MSG_ERROR_OUT_OF_RANGE.format(ancho - 1, alto - 1)
+            caja, mascara = seleccion
+            
+            contador = self._ejecutar(Comando("paleta", caja + (colores.astype(np.uint8),)
+                                              + self._empaquetar(mascara), alto, ancho))
+            
+            return True, config.MSG_PALETA_CUANTIZADA.format(contador, len(colores))
             
         except Exception as e:
-            return False, f"No se pudo guardar la imagen:\n{str(e)}"
+            return False, f"Error al cuantizar:\n{str(e)}"
     
-    def modificar_pixel(self, x, y, r, g, b):
+    @medir()
+    def modificar_pixeles_rectangulo(self, x1, y1, x2, y2, r, g, b):
         """
-        Modifica el color de un píxel específico
+        Modifica múltiples píxeles en un área rectangular
         
         Args:
-            x, y (int): Coordenadas del píxel
+            x1, y1, x2, y2 (int): Coordenadas del rectángulo (esquinas)
+            r, g, b (int): Valores RGB (0-255)
+            
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        # Normalizar coordenadas
+        x_min = min(x1, x2)
+        y_min = min(y1, y2)
+        return self._rellenar("rectangulo", (x_min, y_min, abs(x2 - x1) + 1, abs(y2 - y1) + 1),
+                              r, g, b)
+    
+    @medir()
+    def modificar_pixeles_rectangulo_redondeado(self, x1, y1, x2, y2, radio, r, g, b):
+        """
+        Modifica los píxeles de un rectángulo con esquinas redondeadas
+        
+        Args:
+            x1, y1, x2, y2 (int): Coordenadas del rectángulo (esquinas)
+            radio (int): Radio de las esquinas
+            r, g, b (int): Valores RGB (0-255)
+            
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        x_min = min(x1, x2)
+        y_min = min(y1, y2)
+        return self._rellenar("rectangulo_redondeado",
+                              (x_min, y_min, abs(x2 - x1) + 1, abs(y2 - y1) + 1, radio), r, g, b)
+    
+    @medir()
+    def modificar_pixeles_circulo(self, x_centro, y_centro, radio, r, g, b):
+        """
+        Modifica múltiples píxeles en un área circular
+        
+        Args:
+            x_centro, y_centro (int): Centro del círculo
+            radio (int): Radio del círculo
             r, g, b (int): Valores RGB (0-255)
             
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        # Máscara circular desde la caché, aplicada en una sola escritura
+        return self._rellenar("circulo", (x_centro - radio, y_centro - radio, radio), r, g, b,
+                              mensaje=config.MSG_PIXELES_CIRCULO)
+    
+    @medir()
+    def modificar_pixeles_elipse(self, x_centro, y_centro, radio_x, radio_y, r, g, b):
+        """
+        Modifica los píxeles de un área elíptica
+        
+        Args:
+            x_centro, y_centro (int): Centro de la elipse
+            radio_x, radio_y (int): Semiejes horizontal y vertical
+            r, g, b (int): Valores RGB (0-255)
+            
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        return self._rellenar("elipse", (x_centro - radio_x, y_centro - radio_y, radio_x, radio_y),
+                              r, g, b)
+    
+    @medir()
+    def modificar_pixeles_poligono(self, vertices, r, g, b):
+        """
+        Modifica los píxeles del interior de un polígono
+        
+        Args:
+            vertices (list): Lista de puntos (x, y) del polígono
+            r, g, b (int): Valores RGB (0-255)
+            
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        if len(vertices) < 3:
+            return False, "El polígono necesita al menos 3 vértices"
+        
+        return self._rellenar("poligono", (tuple(tuple(p) for p in vertices),), r, g, b)
+    
+    @medir()
+    def aplicar_filtro(self, nombre, region=None, **parametros):
+        """
+        Aplica un filtro de convolución (ver filtros.FILTROS) a la imagen o a un área
+        
+        El resultado se calcula aparte y se guarda en el historial como un
+        parche; en modo imagen grande ese parche vive en un archivo temporal.
+        
+        Args:
+            nombre (str): Nombre del filtro ('gaussiano', 'caja', 'enfocar', 'relieve', 'bordes')
+            region (tuple): (x1, y1, x2, y2) con las esquinas incluidas; None para toda la imagen
+            **parametros: Parámetros del filtro (sigma, radio)
+            
         Returns:
             tuple: (bool, str) - (éxito, mensaje)
         """
@@ -83,102 +1632,183 @@ class ImageHandler:
                 return False, config.MSG_NO_IMAGE
             
             alto, ancho = self.img_array.shape[:2]
+            caja = self.normalizar_region(region)
+            if caja is None:
+                return False, config.MSG_ERROR_OUT_OF_RANGE.format(ancho - 1, alto - 1)
+            x_min, y_min, x_max, y_max = caja
             
-            # Validar coordenadas
-            if not (0 <= x < ancho and 0 <= y < alto):
-                mensaje = config.MSG_ERROR_OUT_OF_RANGE.format(ancho - 1, alto - 1)
-                return False, mensaje
+            salida = None
+            if self.almacen is not None:
+                salida = self.almacen.crear_temporal((y_max - y_min, x_max - x_min, 3))
+            resultado = filtros.filtrar(self.img_array, nombre, (x_min, y_min, x_max, y_max),
+                                        salida, **parametros)
+            contador = self._ejecutar(Comando("parche", (x_min, y_min, resultado), alto, ancho))
             
-            # Validar valores RGB
-            if not all(0 <= val <= 255 for val in [r, g, b]):
-                return False, config.MSG_ERROR_RGB_RANGE
+            return True, config.MSG_FILTRO_APLICADO.format(filtros.FILTROS[nombre][1], contador)
             
-            # Guardar en historial antes de modificar
-            self.historial.append(self.img_array.copy())
-            if len(self.historial) > config.MAX_HISTORIAL:
-                self.historial.pop(0)
+        except ValueError as e:
+            return False, str(e)
+        except Exception as e:
+            return False, f"Error al aplicar el filtro:\n{str(e)}"
+    
+    @medir()
+    def aplicar_lut(self, lut, region=None):
+        """
+        Aplica una tabla de consulta (LUT) a la imagen o a un área en una sola pasada
+        
+        Args:
+            lut (array-like): 256 valores para los tres canales o 3 filas de 256 (R, G, B)
+            region (tuple): (x1, y1, x2, y2) con las esquinas incluidas; None para toda la imagen
             
-            # Aplicar cambio
-            self.img_array[y, x] = [r, g, b]
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        try:
+            if self.img_array is None:
+                return False, config.MSG_NO_IMAGE
             
-            mensaje = config.MSG_PIXEL_CHANGED.format(x, y, r, g, b)
-            return True, mensaje
+            lut = np.asarray(lut)
+            if lut.shape == (256,):
+                lut = np.tile(lut, (3, 1))
+            if lut.shape != (3, 256) or lut.min() < 0 or lut.max() > 255:
+                return False, config.MSG_ERROR_LUT
+            lut = lut.astype(np.uint8)
+            
+            alto, ancho = self.img_array.shape[:2]
+            caja = self.normalizar_region(region)
+            if caja is None:
+                return False, config.MSG_ERROR_OUT_OF_RANGE.format(ancho - 1, alto - 1)
+            
+            # Una LUT sin efecto no ocupa un paso del historial
+            contador = 0
+            if not tonos.es_identidad(lut):
+                contador = self._ejecutar(Comando("lut", caja + (lut,), alto, ancho))
+            
+            return True, config.MSG_TONOS_APLICADOS.format(contador)
             
         except Exception as e:
-            return False, f"Error al modificar píxel:\n{str(e)}"
+            return False, f"Error al aplicar la LUT:\n{str(e)}"
     
-    def deshacer(self):
+    @medir()
+    def ajustar_tonos(self, region=None, **ajustes):
         """
-        Deshace el último cambio
+        Aplica brillo, contraste, gamma, niveles y curva compuestos en una sola LUT
         
+        Args:
+            region (tuple): (x1, y1, x2, y2) con las esquinas incluidas; None para toda la imagen
+            **ajustes: Parámetros de tonos.construir_lut (brillo, contraste, gamma,
+                negro, blanco, curva)
+            
         Returns:
-            bool: True si se pudo deshacer, False si no hay historial
+            tuple: (bool, str) - (éxito, mensaje)
         """
-        if len(self.historial) > 0:
-            self.img_array = self.historial.pop()
-            return True
-        return False
+        try:
+            lut = tonos.construir_lut(**ajustes)
+        except (ValueError, TypeError) as e:
+            return False, str(e)
+        return self.aplicar_lut(lut, region)
     
-    def restaurar_original(self):
+    def obtener_histograma(self):
         """
-        Restaura la imagen original
+        Histogramas actuales, sin recorrer la imagen (se mantienen con cada edición)
         
         Returns:
-            bool: True si se restauró, False si no hay imagen original
+            tuple: (versión, conteos) - conteos es un array de solo lectura (4 x 256)
+                con R, G, B y luminancia; la versión cambia con cada edición, así
+                que quien consulta periódicamente puede saltarse el redibujado.
+                None si no hay imagen
         """
-        if self.img_original is not None:
-            self.img_array = np.array(self.img_original)
-            self.historial.clear()
-            return True
-        return False
+        if self.img_array is None or self.histograma is None:
+            return None
+        conteos = self.histograma.conteos.view()
+        conteos.flags.writeable = False
+        return self.histograma.version, conteos
     
-    def obtener_imagen_actual(self):
+    def _conteos_region(self, region):
+        """Histogramas de un área (los de la imagen completa si region es None)"""
+        if region is None:
+            return self.histograma.conteos
+        x_min, y_min, x_max, y_max = region
+        return contar(self.img_array[y_min:y_max, x_min:x_max])
+    
+    @medir()
+    def ecualizar_histograma(self, region=None, por_canal=False):
         """
-        Obtiene la imagen actual como objeto PIL Image
+        Ecualiza el histograma de la imagen o de un área
         
+        Args:
+            region (tuple): (x1, y1, x2, y2) con las esquinas incluidas; None para toda la imagen
+            por_canal (bool): Ecualizar R, G y B por separado; por defecto se usa la luminancia
+            
         Returns:
-            Image: Imagen PIL o None si no hay imagen cargada
+            tuple: (bool, str) - (éxito, mensaje)
         """
-        if self.img_array is not None:
-            return Image.fromarray(self.img_array)
-        return None
+        if self.img_array is None:
+            return False, config.MSG_NO_IMAGE
+        
+        caja = None if region is None else self.normalizar_region(region)
+        if region is not None and caja is None:
+            alto, ancho = self.img_array.shape[:2]
+            return False, config.MSG_ERROR_OUT_OF_RANGE.format(ancho - 1, alto - 1)
+        return self.aplicar_lut(lut_ecualizacion(self._conteos_region(caja), por_canal), region)
     
-    def obtener_dimensiones(self):
+    @medir()
+    def estirar_percentiles(self, bajo=1.0, alto=99.0, region=None, por_canal=False):
         """
-        Obtiene las dimensiones de la imagen actual
+        Estira el contraste para que los percentiles indicados pasen a 0 y a 255
         
+        Args:
+            bajo, alto (float): Percentiles (0-100)
+            region (tuple): (x1, y1, x2, y2) con las esquinas incluidas; None para toda la imagen
+            por_canal (bool): Usar los percentiles de cada canal (corrige dominantes de color)
+            
         Returns:
-            tuple: (ancho, alto) o None si no hay imagen
+            tuple: (bool, str) - (éxito, mensaje)
         """
-        if self.img_array is not None:
-            alto, ancho = self.img_array.shape[:2]
-            return ancho, alto
-        return None
+        if self.img_array is None:
+            return False, config.MSG_NO_IMAGE
+        
+        caja = None if region is None else self.normalizar_region(region)
+        if region is not None and caja is None:
+            alto_img, ancho_img = self.img_array.shape[:2]
+            return False, config.MSG_ERROR_OUT_OF_RANGE.format(ancho_img - 1, alto_img - 1)
+        try:
+            lut = lut_percentiles(self._conteos_region(caja), bajo, alto, por_canal)
+        except ValueError as e:
+            return False, str(e)
+        return self.aplicar_lut(lut, region)
     
-    def obtener_color_pixel(self, x, y):
+    @medir()
+    def niveles_automaticos(self, region=None):
         """
-        Obtiene el color RGB de un píxel específico
+        Estira cada canal por separado descartando un pequeño porcentaje en cada extremo
         
         Args:
-            x, y (int): Coordenadas del píxel
+            region (tuple): (x1, y1, x2, y2) con las esquinas incluidas; None para toda la imagen
             
         Returns:
-            tuple: (r, g, b) o None si está fuera de rango
+            tuple: (bool, str) - (éxito, mensaje)
         """
-        if self.img_array is not None:
-            alto, ancho = self.img_array.shape[:2]
-            if 0 <= x < ancho and 0 <= y < alto:
-                r, g, b = self.img_array[y, x]
-                return r, g, b
-        return None
+        recorte = config.AUTONIVELES_RECORTE
+        return self.estirar_percentiles(recorte, 100 - recorte, region, por_canal=True)
     
-    def modificar_pixeles_rectangulo(self, x1, y1, x2, y2, r, g, b):
+    @medir()
+    def transformar(self, matriz, interpolacion=config.TRANSFORMACION_INTERPOLACION,
+                    ajustar=True, fondo=(255, 255, 255)):
         """
-        Modifica múltiples píxeles en un área rectangular
+        Aplica una transformación geométrica (giro, escala, cizalla, volteo,
+        perspectiva...) remuestreando la imagen una sola vez
+        
+        Varias transformaciones se componen antes en una sola matriz, así que
+        encadenarlas cuesta un remuestreo y no acumula pérdidas de interpolación.
         
         Args:
-            x1, y1, x2, y2 (int): Coordenadas del rectángulo (esquinas)
-            r, g, b (int): Valores RGB (0-255)
+            matriz (array-like): Matriz 3x3 o lista de matrices en el orden en que
+                se aplican (ver transformaciones)
+            interpolacion (str): 'vecino', 'bilineal' o 'bicubica'
+            ajustar (bool): Ampliar o reducir el lienzo para que quepa la imagen
+                transformada entera; si es False se conservan las dimensiones
+            fondo (tuple): Color RGB de las zonas que quedan sin imagen
             
         Returns:
             tuple: (bool, str) - (éxito, mensaje)
@@ -186,90 +1816,213 @@ class ImageHandler:
         try:
             if self.img_array is None:
                 return False, config.MSG_NO_IMAGE
+            if self.capas is not None:
+                return False, config.MSG_ERROR_CAPAS_TRANSFORMAR
             
-            # Normalizar coordenadas
-            x_min = min(x1, x2)
-            x_max = max(x1, x2)
-            y_min = min(y1, y2)
-            y_max = max(y1, y2)
+            matriz = np.asarray(matriz, dtype=np.float64)
+            if matriz.ndim == 3:
+                matriz = transformaciones.componer(*matriz)
             
             alto, ancho = self.img_array.shape[:2]
+            if ajustar:
+                matriz, ancho, alto = transformaciones.ajustar_lienzo(matriz, ancho, alto)
+            if ancho * alto > config.TRANSFORMACION_MAX_PIXELES:
+                return False, config.MSG_ERROR_TRANSFORMACION_GRANDE.format(
+                    ancho * alto, config.TRANSFORMACION_MAX_PIXELES)
             
-            # Validar valores RGB
-            if not all(0 <= val <= 255 for val in [r, g, b]):
-                return False, config.MSG_ERROR_RGB_RANGE
+            salida = None
+            if self.almacen is not None:
+                salida = self.almacen.crear_temporal((alto, ancho, 3))
+            fondo = tuple(int(c) for c in fondo)
+            resultado = transformaciones.remuestrear(self.img_array, matriz, ancho, alto,
+                                                     interpolacion, fondo, salida)
             
-            # Guardar en historial antes de modificar
-            self.historial.append(self.img_array.copy())
-            if len(self.historial) > config.MAX_HISTORIAL:
-                self.historial.pop(0)
+            # La imagen previa deja de editarse: pasa tal cual al historial (o a
+            # disco si no cabe en su presupuesto)
+            antes = self._punto_para_historial(self.img_array)
+            resultado.flags.writeable = False
+            self.historial.registrar_reemplazo(
+                Comando("transformar", (matriz, interpolacion, fondo), alto, ancho),
+                antes, self._punto_para_historial(resultado))
+            self._sustituir_imagen(resultado)
             
-            # Aplicar cambio a todos los píxeles en el área
-            x_min = max(0, x_min)
-            x_max = min(ancho, x_max + 1)
-            y_min = max(0, y_min)
-            y_max = min(alto, y_max + 1)
+            return True, config.MSG_TRANSFORMADA.format(ancho, alto)
             
-            self.img_array[y_min:y_max, x_min:x_max] = [r, g, b]
+        except ValueError as e:
+            return False, str(e)
+        except Exception as e:
+            return False, f"Error al transformar la imagen:\n{str(e)}"
+    
+    @medir()
+    def transformar_pasos(self, pasos, **opciones):
+        """
+        Compone una lista de pasos con nombre y la aplica con transformar
+        
+        Args:
+            pasos (list): Pasos como {"rotar": 30} o {"escalar": [2, 1]} (ver
+                transformaciones.matriz_desde_pasos); se aplican en orden y
+                alrededor del centro de la imagen
+            **opciones: interpolacion, ajustar y fondo, como en transformar
             
-            total_pixeles = (x_max - x_min) * (y_max - y_min)
-            mensaje = f"✅ {total_pixeles} píxeles cambiados a RGB({r}, {g}, {b})"
-            return True, mensaje
+        Returns:
+            tuple: (bool, str) - (éxito, mensaje)
+        """
+        if self.img_array is None:
+            return False, config.MSG_NO_IMAGE
+        alto, ancho = self.img_array.shape[:2]
+        try:
+            matriz = transformaciones.matriz_desde_pasos(pasos, ancho, alto)
+        except (ValueError, TypeError, KeyError) as e:
+            return False, str(e)
+        return self.transformar(matriz, **opciones)
+    
+    def normalizar_region(self, region):
+        """
+        Convierte un rectángulo con esquinas incluidas en una caja recortada a la imagen
+        
+        Args:
+            region (tuple): (x1, y1, x2, y2) o None para toda la imagen
             
-        except Exception as e:
-            return False, f"Error al modificar píxeles:\n{str(e)}"
+        Returns:
+            tuple: (x_min, y_min, x_max, y_max) con extremo final exclusivo, o None si
+                queda fuera de la imagen
+        """
+        alto, ancho = self.img_array.shape[:2]
+        if region is None:
+            return 0, 0, ancho, alto
+        
+        x1, y1, x2, y2 = region
+        x_min = max(0, min(x1, x2))
+        x_max = min(ancho, max(x1, x2) + 1)
+        y_min = max(0, min(y1, y2))
+        y_max = min(alto, max(y1, y2) + 1)
+        if x_max <= x_min or y_max <= y_min:
+            return None
+        return x_min, y_min, x_max, y_max
     
-    def modificar_pixeles_circulo(self, x_centro, y_centro, radio, r, g, b):
+    @medir()
+    def iniciar_trazo(self, radio, r, g, b):
         """
-        Modifica múltiples píxeles en un área circular
+        Comienza un trazo de pincel
         
         Args:
-            x_centro, y_centro (int): Centro del círculo
-            radio (int): Radio del círculo
+            radio (int): Radio de la punta del pincel
             r, g, b (int): Valores RGB (0-255)
             
         Returns:
             tuple: (bool, str) - (éxito, mensaje)
         """
+        if self.img_array is None:
+            return False, config.MSG_NO_IMAGE
+        
+        if not all(0 <= val <= 255 for val in [r, g, b]):
+            return False, config.MSG_ERROR_RGB_RANGE
+        
+        # En una capa transparente el pincel pinta también el alfa
+        color = (r, g, b) if self._lienzo.shape[2] == 3 else (r, g, b, 255)
+        self.trazo = TrazoPincel(self._lienzo, radio, color)
+        return True, config.MSG_TRAZO_INICIADO
+    
+    def agregar_punto_trazo(self, x, y):
+        """
+        Añade un punto al trazo en curso (solo se acumula, no se pinta)
+        
+        Args:
+            x, y (int): Coordenadas del punto en la imagen
+        """
+        if self.trazo is not None:
+            self.trazo.agregar_punto(x, y)
+    
+    @medir()
+    def procesar_trazo(self):
+        """
+        Pinta de una vez los puntos acumulados del trazo
+        
+        Returns:
+            tuple: (x_min, y_min, x_max, y_max) de la región modificada o None
+        """
+        if self.trazo is None:
+            return None
+        
+        lote = self.trazo.procesar()
+        if lote is None:
+            return None
+        
+        region, antes = lote
+        self._cambio_aplicado(*region, antes=antes[..., :3])
+        return region
+    
+    @medir()
+    def finalizar_trazo(self):
+        """
+        Termina el trazo y lo guarda como una única entrada del historial
+        
+        Returns:
+            tuple: (x_min, y_min, x_max, y_max) de la última región pintada o None
+        """
+        if self.trazo is None:
+            return None
+        
+        region = self.procesar_trazo()
+        
+        # Ya está pintado: solo se guarda el comando con los centros de los sellos
+        alto, ancho = self._lienzo.shape[:2]
+        centros = np.array(self.trazo.centros, dtype=np.int32).reshape(-1, 2)
+        comando = Comando("trazo", (centros, self.trazo.radio, self.trazo.color), alto, ancho)
+        if comando.region is not None:
+            self.historial.registrar(comando, self._capturador())
+        
+        self.trazo = None
+        return region
+    
+    @medir()
+    def obtener_promedio_color_area(self, x1, y1, x2, y2, solo_capa=False):
+        """
+        Obtiene el color promedio de un área rectangular
+        
+        Args:
+            x1, y1, x2, y2 (int): Coordenadas del rectángulo
+            solo_capa (bool): Igual que en obtener_estadisticas_region
+            
+        Returns:
+            tuple: (r, g, b) o None si está fuera de rango
+        """
         try:
             if self.img_array is None:
-                return False, config.MSG_NO_IMAGE
-            
-            alto, ancho = self.img_array.shape[:2]
+                return None
             
-            # Validar valores RGB
-            if not all(0 <= val <= 255 for val in [r, g, b]):
-                return False, config.MSG_ERROR_RGB_RANGE
+            # Normalizar coordenadas
+            x_min = max(0, min(x1, x2))
+            x_max = min(self.img_array.shape[1], max(x1, x2) + 1)
+            y_min = max(0, min(y1, y2))
+            y_max = min(self.img_array.shape[0], max(y1, y2) + 1)
             
-            # Guardar en historial
-            self.historial.append(self.img_array.copy())
-            if len(self.historial) > config.MAX_HISTORIAL:
-                self.historial.pop(0)
+            if x_max <= x_min or y_max <= y_min:
+                return None
             
-            # Crear máscara circular
-            contador = 0
-            for y in range(max(0, y_centro - radio), min(alto, y_centro + radio + 1)):
-                for x in range(max(0, x_centro - radio), min(ancho, x_centro + radio + 1)):
-                    distancia = ((x - x_centro) ** 2 + (y - y_centro) ** 2) ** 0.5
-                    if distancia <= radio:
-                        self.img_array[y, x] = [r, g, b]
-                        contador += 1
-            
-            mensaje = f"✅ {contador} píxeles cambiados en círculo"
-            return True, mensaje
+            estadisticas = self.obtener_estadisticas_region(x_min, y_min, x_max - 1, y_max - 1,
+                                                            solo_capa)
+            return tuple(int(m) for m in estadisticas['media'])
             
-        except Exception as e:
-            return False, f"Error al modificar píxeles:\n{str(e)}"
+        except Exception:
+            return None
     
-    def obtener_promedio_color_area(self, x1, y1, x2, y2):
+    @medir()
+    def obtener_estadisticas_region(self, x1, y1, x2, y2, solo_capa=False):
         """
-        Obtiene el color promedio de un área rectangular
+        Obtiene media, varianza y desviación típica por canal de un área rectangular
+        de la imagen tal como se ve
+        
+        Con las tablas integrales el coste no depende del tamaño del área sino
+        del número de teselas que toca (la primera consulta de cada tesela, o
+        la siguiente tras editarla, sí recorre sus píxeles).
         
         Args:
-            x1, y1, x2, y2 (int): Coordenadas del rectángulo
+            x1, y1, x2, y2 (int): Coordenadas del rectángulo (esquinas incluidas)
+            solo_capa (bool): True para medir la capa activa y no la imagen compuesta
             
         Returns:
-            tuple: (r, g, b) o None si está fuera de rango
+            dict: {'pixeles', 'media', 'varianza', 'desviacion'} o None si está fuera de rango
         """
         try:
             if self.img_array is None:
@@ -284,10 +2037,8 @@ class ImageHandler:
             if x_max <= x_min or y_max <= y_min:
                 return None
             
-            area = self.img_array[y_min:y_max, x_min:x_max]
-            promedio = area.mean(axis=(0, 1)).astype(int)
-            
-            return tuple(promedio[:3])
+            tabla = self._tabla_estadisticas(self._imagen_muestreo(solo_capa))
+            return tabla.estadisticas(x_min, y_min, x_max, y_max)
             
         except Exception:
             return None
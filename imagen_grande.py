@@ -0,0 +1,184 @@
+"""
+Módulo de imágenes grandes
+Almacén de trabajo en disco (np.memmap) que se llena por franjas, para abrir
+imágenes mayores que la memoria RAM disponible
+"""
+
+import os
+import tempfile
+from pathlib import Path
+import numpy as np
+from PIL import Image
+import config
+
+
+def contar_pixeles(ruta):
+    """
+    Lee solo la cabecera del archivo para saber cuántos píxeles tiene
+
+    Args:
+        ruta (str): Ruta del archivo de imagen
+
+    Returns:
+        int: ancho * alto
+    """
+    if Path(ruta).suffix.lower() == ".npy":
+        forma = np.load(ruta, mmap_mode="r").shape
+        return forma[0] * forma[1]
+
+    anterior = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        with Image.open(ruta) as img:
+            ancho, alto = img.size
+    finally:
+        Image.MAX_IMAGE_PIXELS = anterior
+    return ancho * alto
+
+
+def filas_por_franja(ancho):
+    """Número de filas que caben en una franja de config.TESELA_BYTES"""
+    return max(1, config.TESELA_BYTES // (ancho * 3))
+
+
+def copiar_por_franjas(origen, destino, progreso=None):
+    """
+    Copia una imagen en otra franja a franja, sin cargarla entera en memoria
+
+    Args:
+        origen, destino (ndarray): Arrays (posiblemente memmap) de igual forma
+        progreso (callable): Recibe la fracción copiada (0 a 1) tras cada franja
+    """
+    alto, ancho = origen.shape[:2]
+    paso = filas_por_franja(ancho)
+    for y in range(0, alto, paso):
+        destino[y:y + paso] = origen[y:y + paso]
+        if progreso is not None:
+            progreso(min(alto, y + paso) / alto)
+
+
+def copia_en_disco(imagen):
+    """
+    Copia de solo lectura de una imagen en un archivo temporal anónimo (p. ej.
+    un punto de control del historial que no cabe en memoria); el archivo
+    desaparece en cuanto la copia deja de usarse
+
+    Args:
+        imagen (ndarray): Imagen a copiar (posiblemente memmap)
+
+    Returns:
+        np.memmap: Copia de solo lectura
+    """
+    directorio = config.DIRECTORIO_IMAGENES_GRANDES or tempfile.gettempdir()
+    with tempfile.TemporaryFile(prefix="editor_", dir=directorio) as archivo:
+        copia = np.memmap(archivo, dtype=imagen.dtype, mode="w+", shape=imagen.shape)
+    copiar_por_franjas(imagen, copia)
+    copia.flags.writeable = False
+    return copia
+
+
+class AlmacenTeselado:
+    """Original y copia de trabajo de una imagen grande, respaldados en disco"""
+
+    def __init__(self, original, directorio=None, progreso=None):
+        """
+        Args:
+            original (ndarray): Imagen original (memmap de solo lectura)
+            directorio (str): Carpeta para el archivo de trabajo (temporal por defecto)
+            progreso (callable): Recibe la fracción copiada (0 a 1)
+        """
+        self.original = original
+        self._archivos = []
+        self.trabajo = self._crear_memmap(original.shape, directorio)
+        copiar_por_franjas(self.original, self.trabajo, progreso)
+
+    def _crear_memmap(self, forma, directorio):
+        """Crea un memmap vacío en un archivo temporal"""
+        directorio = directorio or config.DIRECTORIO_IMAGENES_GRANDES or tempfile.gettempdir()
+        descriptor, ruta = tempfile.mkstemp(suffix=".raw", prefix="editor_", dir=directorio)
+        os.close(descriptor)
+        self._archivos.append(ruta)
+        return np.memmap(ruta, dtype=np.uint8, mode="w+", shape=forma)
+
+    @classmethod
+    def desde_archivo(cls, ruta, directorio=None, progreso=None):
+        """
+        Decodifica un archivo en el almacén por franjas
+
+        Los .npy se abren directamente con memmap (sin decodificar). El resto de
+        formatos los decodifica PIL una sola vez; cada franja se convierte a RGB
+        y se escribe en disco, y la imagen decodificada se libera al terminar.
+
+        Args:
+            ruta (str): Ruta del archivo de imagen
+            directorio (str): Carpeta para los archivos de trabajo
+            progreso (callable): Recibe la fracción completada (0 a 1)
+
+        Returns:
+            AlmacenTeselado: Almacén con la imagen cargada
+        """
+        if Path(ruta).suffix.lower() == ".npy":
+            original = np.load(ruta, mmap_mode="r")
+            if original.ndim != 3 or original.shape[2] != 3 or original.dtype != np.uint8:
+                raise ValueError("El archivo .npy debe contener una imagen uint8 de forma (alto, ancho, 3)")
+            return cls(original, directorio, progreso)
+
+        almacen = cls.__new__(cls)
+        almacen._archivos = []
+
+        anterior = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            with Image.open(ruta) as img:
+                ancho, alto = img.size
+                original = almacen._crear_memmap((alto, ancho, 3), directorio)
+                paso = filas_por_franja(ancho)
+                for y in range(0, alto, paso):
+                    franja = img.crop((0, y, ancho, min(alto, y + paso))).convert("RGB")
+                    original[y:y + franja.height] = np.asarray(franja)
+                    if progreso is not None:
+                        # La decodificación es la mitad del trabajo; la copia, la otra
+                        progreso(0.5 * (y + franja.height) / alto)
+        finally:
+            Image.MAX_IMAGE_PIXELS = anterior
+
+        original.flush()
+        almacen.original = np.memmap(original.filename, dtype=np.uint8, mode="r",
+                                     shape=original.shape)
+        del original
+        almacen.trabajo = almacen._crear_memmap(almacen.original.shape, directorio)
+        copiar_por_franjas(almacen.original, almacen.trabajo,
+                           None if progreso is None else lambda f: progreso(0.5 + 0.5 * f))
+        return almacen
+
+    def crear_temporal(self, forma):
+        """
+        Crea un memmap auxiliar junto a la copia de trabajo (p. ej. para el
+        resultado de un filtro); se borra al cerrar el almacén
+
+        Args:
+            forma (tuple): (alto, ancho, canales)
+
+        Returns:
+            np.memmap: Array uint8 de lectura y escritura
+        """
+        return self._crear_memmap(forma, os.path.dirname(self.trabajo.filename))
+
+    def restaurar(self):
+        """Vuelve a copiar el original sobre la copia de trabajo"""
+        copiar_por_franjas(self.original, self.trabajo)
+
+    def sincronizar(self):
+        """Escribe en disco las franjas modificadas de la copia de trabajo"""
+        self.trabajo.flush()
+
+    def cerrar(self):
+        """Libera los memmap y borra los archivos temporales"""
+        self.original = None
+        self.trabajo = None
+        for ruta in self._archivos:
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+        self._archivos = []
@@ -0,0 +1,231 @@
+"""
+Módulo de instrumentación
+Mide cada operación del manejador de imágenes y cada callback de la interfaz:
+tiempo de reloj, píxeles tocados y (opcionalmente) bytes asignados. Guarda
+las muestras recientes de cada operación para calcular percentiles y puede
+escribir cada medición en un archivo de traza JSON lines.
+
+Solo usa la biblioteca estándar, así que importarlo no retrasa el arranque.
+"""
+
+import functools
+import json
+import math
+import threading
+import time
+import tracemalloc
+from collections import deque
+import config
+
+
+class _Operacion:
+    """Métricas acumuladas de una operación"""
+
+    __slots__ = ("categoria", "llamadas", "errores", "total", "pixeles", "bytes_max", "muestras")
+
+    def __init__(self, categoria):
+        self.categoria = categoria
+        self.llamadas = 0
+        self.errores = 0
+        self.total = 0.0         # Segundos acumulados
+        self.pixeles = 0         # Píxeles tocados acumulados
+        self.bytes_max = None    # Mayor pico de memoria de una llamada (si se mide)
+        self.muestras = deque(maxlen=config.INSTRUMENTACION_MUESTRAS)
+
+
+class Registro:
+    """Registro de mediciones compartido por toda la aplicación"""
+
+    def __init__(self):
+        self.activo = config.INSTRUMENTACION_ACTIVA
+        self._operaciones = {}
+        self._lock = threading.Lock()
+        self._pila = threading.local()   # Mediciones anidadas en curso de cada hilo
+        self._traza = None
+        if config.INSTRUMENTACION_TRAZA:
+            self.abrir_traza(config.INSTRUMENTACION_TRAZA)
+        if config.INSTRUMENTACION_MEMORIA:
+            self.medir_memoria(True)
+
+    # ========== CONFIGURACIÓN ==========
+
+    def medir_memoria(self, activar=True):
+        """
+        Activa o desactiva la medición de bytes asignados con tracemalloc
+        (NumPy le informa de sus arrays; hace cada operación bastante más lenta)
+        """
+        if activar and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not activar and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def abrir_traza(self, ruta):
+        """
+        Escribe cada medición como una línea JSON al final de un archivo
+
+        Args:
+            ruta (str): Archivo de traza (se añade al final si ya existe)
+        """
+        with self._lock:
+            if self._traza is not None:
+                self._traza.close()
+            self._traza = open(ruta, "a", encoding="utf-8", buffering=1)
+
+    def cerrar_traza(self):
+        """Deja de escribir la traza y cierra el archivo"""
+        with self._lock:
+            if self._traza is not None:
+                self._traza.close()
+                self._traza = None
+
+    def reiniciar(self):
+        """Descarta todas las métricas acumuladas"""
+        with self._lock:
+            self._operaciones.clear()
+
+    # ========== MEDICIÓN ==========
+
+    def _iniciar(self):
+        """Abre una medición en el hilo actual"""
+        pila = getattr(self._pila, "mediciones", None)
+        if pila is None:
+            pila = self._pila.mediciones = []
+        memoria = None
+        if tracemalloc.is_tracing():
+            actual, pico = tracemalloc.get_traced_memory()
+            # Conservar el pico que llevaba la medición exterior antes de reiniciarlo
+            if pila and pila[-1][1] is not None:
+                pila[-1][1][1] = max(pila[-1][1][1], pico)
+            tracemalloc.reset_peak()
+            memoria = [actual, actual]
+        pila.append((time.perf_counter(), memoria))
+
+    def _terminar(self, nombre, categoria, pixeles, correcto):
+        """Cierra la medición más reciente del hilo actual y la registra"""
+        fin = time.perf_counter()
+        inicio, memoria = self._pila.mediciones.pop()
+        asignados = None
+        if memoria is not None and tracemalloc.is_tracing():
+            _, pico = tracemalloc.get_traced_memory()
+            pico = max(pico, memoria[1])
+            asignados = pico - memoria[0]
+            pila = self._pila.mediciones
+            if pila and pila[-1][1] is not None:
+                pila[-1][1][1] = max(pila[-1][1][1], pico)
+        self.registrar(nombre, categoria, fin - inicio, pixeles, asignados, correcto)
+
+    def registrar(self, nombre, categoria, segundos, pixeles=0, asignados=None, correcto=True):
+        """
+        Añade una medición hecha fuera de medir() (p. ej. una fase del arranque)
+
+        Args:
+            nombre (str): Operación
+            categoria (str): Grupo ('imagen', 'interfaz', ...)
+            segundos (float): Tiempo de reloj
+            pixeles (int): Píxeles tocados
+            asignados (int): Pico de bytes asignados o None si no se midió
+            correcto (bool): False si la operación lanzó una excepción
+        """
+        with self._lock:
+            operacion = self._operaciones.get(nombre)
+            if operacion is None:
+                operacion = self._operaciones[nombre] = _Operacion(categoria)
+            operacion.llamadas += 1
+            operacion.errores += not correcto
+            operacion.total += segundos
+            operacion.pixeles += pixeles
+            operacion.muestras.append(segundos)
+            if asignados is not None:
+                operacion.bytes_max = max(operacion.bytes_max or 0, asignados)
+
+            if self._traza is not None:
+                self._traza.write(json.dumps({
+                    "t": round(time.time(), 6), "op": nombre, "categoria": categoria,
+                    "ms": round(segundos * 1000, 3), "pixeles": pixeles,
+                    "bytes": asignados, "ok": correcto,
+                }) + "\n")
+
+    def medir(self, nombre=None, categoria="imagen"):
+        """
+        Decorador que mide cada llamada a una función o método
+
+        Los píxeles tocados se leen del atributo pixeles_tocados del objeto
+        (primer argumento), si lo tiene: la diferencia entre antes y después.
+        Cuenta como error una excepción o un resultado (False, mensaje).
+
+        Args:
+            nombre (str): Nombre de la operación (por defecto, el de la función);
+                se registra como "categoria.nombre"
+            categoria (str): Grupo para el resumen
+        """
+        def decorador(funcion):
+            etiqueta = f"{categoria}.{nombre or funcion.__name__}"
+
+            @functools.wraps(funcion)
+            def medida(*args, **kwargs):
+                if not self.activo:
+                    return funcion(*args, **kwargs)
+                objeto = args[0] if args else None
+                antes = getattr(objeto, "pixeles_tocados", 0)
+                self._iniciar()
+                correcto = False
+                try:
+                    resultado = funcion(*args, **kwargs)
+                    correcto = not (isinstance(resultado, tuple) and resultado
+                                    and resultado[0] is False)
+                    return resultado
+                finally:
+                    pixeles = getattr(objeto, "pixeles_tocados", 0) - antes
+                    self._terminar(etiqueta, categoria, pixeles, correcto)
+            return medida
+        return decorador
+
+    # ========== CONSULTA ==========
+
+    def resumen(self):
+        """
+        Métricas de cada operación medida
+
+        Returns:
+            dict: nombre -> {categoria, llamadas, errores, total_ms, media_ms, p50_ms,
+                p90_ms, p99_ms, max_ms, pixeles, bytes_max}; los percentiles y el
+                máximo son de las últimas INSTRUMENTACION_MUESTRAS llamadas
+        """
+        with self._lock:
+            copia = [(nombre, op.categoria, op.llamadas, op.errores, op.total, op.pixeles,
+                      op.bytes_max, sorted(op.muestras))
+                     for nombre, op in self._operaciones.items()]
+
+        resumen = {}
+        for nombre, categoria, llamadas, errores, total, pixeles, bytes_max, muestras in copia:
+            resumen[nombre] = {
+                "categoria": categoria,
+                "llamadas": llamadas,
+                "errores": errores,
+                "total_ms": 1000 * total,
+                "media_ms": 1000 * total / llamadas,
+                "p50_ms": 1000 * percentil(muestras, 50),
+                "p90_ms": 1000 * percentil(muestras, 90),
+                "p99_ms": 1000 * percentil(muestras, 99),
+                "max_ms": 1000 * muestras[-1],
+                "pixeles": pixeles,
+                "bytes_max": bytes_max,
+            }
+        return resumen
+
+
+def percentil(muestras, p):
+    """
+    Percentil por rango más cercano
+
+    Args:
+        muestras (list): Valores ordenados (no vacía)
+        p (float): Percentil (0-100)
+    """
+    return muestras[max(0, math.ceil(p / 100 * len(muestras)) - 1)]
+
+
+# Registro global: los módulos decoran con instrumentacion.medir(...)
+registro = Registro()
+medir = registro.medir
+resumen = registro.resumen
@@ -1,14 +1,30 @@
 """
 Módulo principal del Editor de Imágenes
 Integra todos los componentes y gestiona la lógica de la aplicación
+
+Arranque en frío: aquí solo se importan tkinter y la interfaz. NumPy, PIL y
+el manejador de imágenes se cargan en segundo plano después de mostrar la
+ventana (o al usarse por primera vez), igual que los paneles secundarios
 """
 
+import time
+_INICIO_IMPORTACION = time.perf_counter()   # Para --profile-startup
+
+import argparse
+import importlib
 import tkinter as tk
-from tkinter import filedialog, messagebox
+from tkinter import filedialog, messagebox, simpledialog
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 import config
-from image_handler import ImageHandler
+import instrumentacion
+from instrumentacion import medir
 from ui_components import (FrameControles, LabelInfo, CanvasImagen, 
-                          LabelCoordenadas, FrameEdicion, FrameSeleccionMultiple)
+                          LabelCoordenadas, FrameEdicion, FrameSeleccionMultiple,
+                          CoalescedorMovimiento, DialogoTonos, DialogoTransformacion,
+                          PanelHistograma, PanelInstrumentacion, PanelCapas)
+
+_FIN_IMPORTACION = time.perf_counter()
 
 
 class EditorImagenes:
@@ -16,10 +32,22 @@ class EditorImagenes:
     
     def __init__(self, root):
         self.root = root
+        self.tiempos_arranque = {}   # Fase -> segundos (ver --profile-startup)
+        self.instante_mostrada = None
         self._configurar_ventana()
         
-        # Inicializar manejador de imágenes
-        self.image_handler = ImageHandler()
+        # El manejador de imágenes (y con él NumPy y PIL) se crea al primer uso
+        self._image_handler = None
+        self._precarga = None
+        
+        # Carga y guardado en un hilo aparte para no congelar la ventana
+        self._ejecutor = ThreadPoolExecutor(max_workers=1)
+        self._operacion_en_curso = None   # "cargar" o "guardar"
+        self._edicion_bloqueada = False   # True mientras no se pueda tocar img_array
+        self._progreso = None             # Fracción que escribe el hilo de fondo
+        self._panel_histograma = None
+        self._panel_instrumentacion = None
+        self._panel_capas = None
         
         # Crear componentes de UI
         self._crear_interfaz()
@@ -31,20 +59,21 @@ class EditorImagenes:
         self.root.geometry(f"{config.WINDOW_WIDTH}x{config.WINDOW_HEIGHT}")
         self.root.resizable(config.WINDOW_RESIZABLE, config.WINDOW_RESIZABLE)
         
-        # Centrar ventana en pantalla
-        self.root.update_idletasks()
-        ancho_ventana = self.root.winfo_width()
-        alto_ventana = self.root.winfo_height()
+        # Centrar ventana en pantalla (el tamaño es el de config: no hace falta
+        # forzar un cálculo de geometría con update_idletasks)
         ancho_pantalla = self.root.winfo_screenwidth()
         alto_pantalla = self.root.winfo_screenheight()
         
-        x = (ancho_pantalla - ancho_ventana) // 2
-        y = (alto_pantalla - alto_ventana) // 2
+        x = (ancho_pantalla - config.WINDOW_WIDTH) // 2
+        y = (alto_pantalla - config.WINDOW_HEIGHT) // 2
         self.root.geometry(f"+{x}+{y}")
         
         # Establecer fondo
         self.root.configure(bg="#ecf0f1")
         
+        # Borrar los archivos temporales de imágenes grandes al cerrar
+        self.root.protocol("WM_DELETE_WINDOW", self.cerrar)
+        
         # Icono (si existe)
         try:
             # Puedes agregar un icono aquí
@@ -52,6 +81,24 @@ class EditorImagenes:
         except:
             pass
     
+    def cerrar(self):
+        """Libera los recursos del manejador de imágenes y cierra la ventana"""
+        if not self._operacion_permitida():
+            return
+        self._ejecutor.shutdown(wait=True)
+        if self._image_handler is not None:
+            self._image_handler.cerrar()
+        instrumentacion.registro.cerrar_traza()
+        self.root.destroy()
+    
+    @property
+    def image_handler(self):
+        """Manejador de imágenes; se crea la primera vez que se necesita"""
+        if self._image_handler is None:
+            from image_handler import ImageHandler
+            self._image_handler = ImageHandler()
+        return self._image_handler
+    
     def _configurar_estilos(self):
         """Configura estilos para la interfaz"""
         from tkinter import ttk
@@ -60,11 +107,14 @@ class EditorImagenes:
     
     def _crear_interfaz(self):
         """Crea todos los componentes de la interfaz"""
+        self._crear_menu()
+        
         # Frame superior con controles
         self.frame_controles = FrameControles(self.root, {
             'cargar': self.cargar_imagen,
             'guardar': self.guardar_imagen,
             'deshacer': self.deshacer,
+            'rehacer': self.rehacer,
             'restaurar': self.restaurar_original
         })
         
@@ -76,71 +126,243 @@ class EditorImagenes:
                                          self.click_canvas, 
                                          self.mostrar_coordenadas)
         
+        self.canvas_imagen.vincular_arrastre(self.arrastrar_canvas, self.soltar_canvas)
+        
+        # Atajos de teclado para deshacer y rehacer
+        self.root.bind("<Control-z>", lambda e: self.deshacer())
+        self.root.bind("<Control-y>", lambda e: self.rehacer())
+        
         # Label de coordenadas
         self.label_coords = LabelCoordenadas(self.root)
         
-        # Frame de edición
-        self.frame_edicion = FrameEdicion(self.root, 
-                                         self.aplicar_cambio, 
-                                         self.actualizar_preview_color)
-        
-        # Frame de selección múltiple
-        self.frame_seleccion = FrameSeleccionMultiple(self.root,
-                                                     self.aplicar_seleccion_multiple)
+        # Los paneles de edición y de selección se construyen cuando la
+        # ventana ya se ve (o antes, si algo los necesita)
+        self._frame_edicion = None
+        self._frame_seleccion = None
+        self.root.bind("<Map>", self._ventana_mostrada, add="+")
         
         # Variables para almacenar selección
         self.seleccion_activa = None  # (x1, y1, x2, y2) para rectángulo
+        self.seleccion_mascara = None  # (x_min, y_min, mascara) de la varita mágica
+        self.paleta_actual = None  # Colores (K x 3) de la última paleta extraída
         self.canvas_imagen.rect_id = None  # ID del rectángulo en canvas
-        # Agendar verificación de widgets tras inicializar la ventana
-        try:
-            self.root.after(200, self._diagnostico_widgets)
-        except Exception:
-            pass
-
-
-    def _diagnostico_widgets(self):
-        """Imprime en consola información básica sobre widgets relevantes.
-        Útil para diagnosticar por qué botones no se muestran en tiempo de ejecución.
-        """
-        try:
-            # Contar botones en frame_seleccion
-            botones = []
-            for w in self.frame_seleccion.frame.winfo_children():
-                for child in w.winfo_children():
-                    if child.__class__.__name__ == 'Button':
-                        botones.append(child)
-
-            print('DEBUG: botones en FrameSeleccionMultiple =', len(botones))
-            for i, b in enumerate(botones):
-                try:
-                    txt = b.cget('text')
-                except Exception:
-                    txt = '<no-text>'
-                print(f"DEBUG: boton[{i}] mapped={b.winfo_ismapped()} text={repr(txt)}")
-        except Exception as e:
-            print('DEBUG: error diagnostico widgets:', e)
+        self.seleccion_inicio = None
+        self._trazo_pendiente = None  # after() del próximo lote del pincel
+        # El arrastre de la selección se agrupa por fotograma (el pincel necesita todos los puntos)
+        self._arrastre_seleccion = CoalescedorMovimiento(self.root, self.extender_seleccion_rectangulo)
+        
+        # Panel oculto con las métricas de la instrumentación
+        self.root.bind("<Control-E>", lambda e: self.mostrar_instrumentacion())
+    
+    def _ventana_mostrada(self, event):
+        """Primera vez que se muestra la ventana: completa la interfaz y precarga módulos"""
+        if event.widget is not self.root:
+            return
+        self.root.unbind("<Map>")
+        self.instante_mostrada = time.perf_counter()
+        self.root.after_idle(self._completar_arranque)
+    
+    def _completar_arranque(self):
+        """Construye los paneles secundarios y empieza a importar NumPy y PIL en segundo plano"""
+        self._construir_paneles()
+        if config.PRECARGAR_MODULOS and self._precarga is None:
+            self._precarga = self._ejecutor.submit(self._precargar_modulos)
+    
+    @medir(categoria="arranque")
+    def _precargar_modulos(self):
+        """Importa el manejador de imágenes (NumPy, PIL, filtros...) en el hilo de fondo"""
+        inicio = time.perf_counter()
+        for modulo in ("image_handler", "PIL.ImageTk", "vista"):
+            importlib.import_module(modulo)
+        self.tiempos_arranque["precarga_modulos"] = time.perf_counter() - inicio
+    
+    @medir(categoria="arranque")
+    def _construir_paneles(self):
+        """Crea los paneles de edición y de selección si aún no existen"""
+        if self._frame_edicion is not None:
+            return
+        inicio = time.perf_counter()
+        self._frame_edicion = FrameEdicion(self.root,
+                                           self.aplicar_cambio,
+                                           self.actualizar_preview_color)
+        self._frame_seleccion = FrameSeleccionMultiple(self.root,
+                                                       self.aplicar_seleccion_multiple,
+                                                       self.reemplazar_color,
+                                                       self.color_promedio_seleccion,
+                                                       self.extraer_paleta,
+                                                       self.cuantizar_paleta)
+        self.tiempos_arranque["paneles_secundarios"] = time.perf_counter() - inicio
+    
+    @property
+    def frame_edicion(self):
+        """Panel de edición de píxel (se construye al primer uso)"""
+        self._construir_paneles()
+        return self._frame_edicion
+    
+    @property
+    def frame_seleccion(self):
+        """Panel de selección múltiple (se construye al primer uso)"""
+        self._construir_paneles()
+        return self._frame_seleccion
+    
+    def _crear_menu(self):
+        """Crea la barra de menú con los archivos, los filtros, los ajustes, las transformaciones, las capas y las vistas"""
+        barra = tk.Menu(self.root)
+        menu_archivo = tk.Menu(barra, tearoff=0)
+        menu_archivo.add_command(label="Abrir imagen o proyecto...", command=self.cargar_imagen)
+        menu_archivo.add_command(label="Guardar imagen...", command=self.guardar_imagen)
+        menu_archivo.add_command(label="Guardar proyecto...", command=self.guardar_proyecto)
+        barra.add_cascade(label="Archivo", menu=menu_archivo)
+        
+        # Las entradas de filtros se leen de filtros.FILTROS al abrir el menú
+        # por primera vez (importarlo carga NumPy)
+        menu_filtros = tk.Menu(barra, tearoff=0)
+        menu_filtros.configure(postcommand=lambda: self._llenar_menu_filtros(menu_filtros))
+        barra.add_cascade(label="Filtros", menu=menu_filtros)
+        
+        menu_ajustes = tk.Menu(barra, tearoff=0)
+        menu_ajustes.add_command(label="Tonos (brillo, contraste, gamma, niveles)...",
+                                 command=self.abrir_ajustes_tonos)
+        menu_ajustes.add_separator()
+        menu_ajustes.add_command(label="Ecualizar histograma",
+                                 command=lambda: self._aplicar_ajuste(
+                                     self.image_handler.ecualizar_histograma))
+        menu_ajustes.add_command(label="Niveles automáticos",
+                                 command=lambda: self._aplicar_ajuste(
+                                     self.image_handler.niveles_automaticos))
+        menu_ajustes.add_command(label="Estirar percentiles...", command=self.estirar_percentiles)
+        barra.add_cascade(label="Ajustes", menu=menu_ajustes)
+        
+        menu_transformar = tk.Menu(barra, tearoff=0)
+        for etiqueta, pasos in (("Girar 90° a la izquierda", [{"rotar": 90}]),
+                                ("Girar 90° a la derecha", [{"rotar": -90}]),
+                                ("Girar 180°", [{"rotar": 180}]),
+                                ("Voltear horizontal", [{"voltear": "horizontal"}]),
+                                ("Voltear vertical", [{"voltear": "vertical"}])):
+            menu_transformar.add_command(label=etiqueta,
+                                         command=lambda p=pasos: self._aplicar_transformacion(p))
+        menu_transformar.add_separator()
+        menu_transformar.add_command(label="Transformar (giro, escala, inclinación)...",
+                                     command=self.abrir_transformacion)
+        barra.add_cascade(label="Transformar", menu=menu_transformar)
+        
+        menu_capas = tk.Menu(barra, tearoff=0)
+        menu_capas.add_command(label="Panel de capas...", command=self.mostrar_capas)
+        menu_capas.add_separator()
+        menu_capas.add_command(label="Nueva capa", command=self.nueva_capa)
+        menu_capas.add_command(label="Duplicar capa", command=self.duplicar_capa)
+        menu_capas.add_command(label="Importar imagen como capa...", command=self.importar_capa)
+        menu_capas.add_command(label="Combinar capas", command=self.combinar_capas)
+        barra.add_cascade(label="Capas", menu=menu_capas)
+        
+        menu_ver = tk.Menu(barra, tearoff=0)
+        menu_ver.add_command(label="Histograma", command=self.mostrar_histograma)
+        barra.add_cascade(label="Ver", menu=menu_ver)
+        self.root.config(menu=barra)
+    
+    def _llenar_menu_filtros(self, menu):
+        """Añade una entrada por filtro la primera vez que se abre el menú"""
+        if menu.index(tk.END) is not None:
+            return
+        import filtros
+        for nombre, (_, etiqueta) in filtros.FILTROS.items():
+            menu.add_command(label=etiqueta, command=lambda n=nombre: self.aplicar_filtro(n))
     
     # ========== MÉTODOS DE CARGA Y GUARDADO ==========
     
     def cargar_imagen(self):
-        """Carga una imagen desde el disco"""
+        """Carga una imagen desde el disco en segundo plano"""
+        if not self._operacion_permitida():
+            return
+        
         ruta = filedialog.askopenfilename(
             title="Seleccionar imagen",
             filetypes=config.IMAGE_FORMATS
         )
         
-        if ruta:
-            exito, mensaje = self.image_handler.cargar_imagen(ruta)
-            
+        if ruta and Path(ruta).suffix.lower() == config.PROYECTO_EXTENSION:
+            # Un proyecto se proyecta con memmap: abrirlo no necesita el hilo de fondo
+            self._abrir_proyecto(ruta)
+        elif ruta:
+            nombre = Path(ruta).name
+            self._edicion_bloqueada = True
+            futuro = self._ejecutor.submit(self.image_handler.leer_imagen, ruta,
+                                           progreso=self._anotar_progreso)
+            self._vigilar_operacion("cargar", futuro,
+                                    lambda f: config.MSG_CARGANDO.format(nombre, f or 0),
+                                    lambda futuro: self._terminar_carga(futuro, ruta))
+    
+    @medir(categoria="interfaz")
+    def _terminar_carga(self, futuro, ruta):
+        """Adopta la imagen decodificada por el hilo de fondo y la muestra"""
+        try:
+            exito, mensaje = self.image_handler.adoptar_imagen(futuro.result(), ruta)
+        except Exception as e:
+            exito, mensaje = False, config.MSG_ERROR_CARGA.format(e)
+        
+        if exito:
+            mensaje = self._ofrecer_recuperacion(ruta, mensaje)
+            self.label_info.actualizar(mensaje)
+            self.canvas_imagen.mostrar_imagen(self.image_handler.img_array)
+            self._actualizar_panel_capas()
+        else:
+            messagebox.showerror("Error", mensaje)
+    
+    @medir(categoria="interfaz")
+    def _abrir_proyecto(self, ruta):
+        """Abre un proyecto, lo muestra y restaura la selección que tenía"""
+        exito, mensaje = self.image_handler.abrir_proyecto(ruta)
+        if not exito:
+            messagebox.showerror("Error", mensaje)
+            return
+        
+        self.seleccion_activa = None
+        self.seleccion_mascara = None
+        mensaje = self._ofrecer_recuperacion(ruta, mensaje)
+        self.label_info.actualizar(mensaje)
+        self.canvas_imagen.mostrar_imagen(self.image_handler.img_array)
+        self._actualizar_panel_capas()
+        seleccion = self.image_handler.metadatos.get("seleccion")
+        if seleccion:
+            self._mostrar_seleccion(tuple(seleccion))
+    
+    def _mostrar_seleccion(self, seleccion):
+        """Activa una selección (en coordenadas de la imagen) y dibuja su rectángulo"""
+        self.seleccion_activa = seleccion
+        self.canvas_imagen.mostrar_seleccion(seleccion)
+    
+    def _ofrecer_recuperacion(self, ruta, mensaje):
+        """
+        Si una sesión anterior dejó cambios sin guardar en el diario de la
+        imagen, ofrece reproducirlos; después empieza el autoguardado
+        
+        Returns:
+            str: Mensaje de carga con el resultado añadido
+        """
+        if not config.AUTOGUARDADO_ACTIVO:
+            return mensaje
+        
+        operaciones = self.image_handler.diario_pendiente(ruta)
+        if operaciones and messagebox.askyesno(
+                "Recuperar cambios",
+                config.MSG_DIARIO_ENCONTRADO.format(operaciones, Path(ruta).name)):
+            exito, resultado = self.image_handler.recuperar_diario()
             if exito:
-                self.label_info.actualizar(mensaje)
-                imagen = self.image_handler.obtener_imagen_actual()
-                self.canvas_imagen.mostrar_imagen(imagen)
+                mensaje += f" | {resultado}"
             else:
-                messagebox.showerror("Error", mensaje)
+                messagebox.showerror("Error", resultado)
+        
+        if self.image_handler.autoguardado is None:
+            exito, error = self.image_handler.iniciar_autoguardado()
+            if not exito:
+                mensaje += config.MSG_AUTOGUARDADO_DESACTIVADO.format(error)
+        return mensaje
     
     def guardar_imagen(self):
-        """Guarda la imagen modificada"""
+        """Guarda la imagen modificada en segundo plano"""
+        if not self._operacion_permitida():
+            return
+        
         if self.image_handler.img_array is None:
             messagebox.showwarning("Advertencia", config.MSG_NO_IMAGE_TO_SAVE)
             return
@@ -151,17 +373,124 @@ class EditorImagenes:
         )
         
         if ruta:
-            exito, mensaje = self.image_handler.guardar_imagen(ruta)
+            nombre = Path(ruta).name
+            # Se codifica una copia: se puede seguir editando mientras se guarda
+            # (en modo imagen grande no hay copia y la edición queda bloqueada)
+            instantanea = self.image_handler.instantanea()
+            self._edicion_bloqueada = instantanea is self.image_handler.img_array
+            futuro = self._ejecutor.submit(self.image_handler.guardar_instantanea, instantanea, ruta)
+            self._vigilar_operacion("guardar", futuro,
+                                    lambda f: config.MSG_GUARDANDO.format(nombre),
+                                    lambda futuro: self._terminar_guardado(futuro, ruta))
+    
+    def guardar_proyecto(self):
+        """Guarda original, imagen, historial y selección en un proyecto, en segundo plano"""
+        if not self._operacion_permitida():
+            return
+        
+        if self.image_handler.img_array is None:
+            messagebox.showwarning("Advertencia", config.MSG_NO_IMAGE_TO_SAVE)
+            return
+        if self.image_handler.capas is not None:
+            messagebox.showwarning("Advertencia", config.MSG_ERROR_CAPAS_PROYECTO)
+            return
+        
+        ruta = filedialog.asksaveasfilename(
+            defaultextension=config.PROYECTO_EXTENSION,
+            filetypes=config.PROYECTO_FORMATS
+        )
+        
+        if ruta:
+            nombre = Path(ruta).name
+            seleccion = None if self.seleccion_activa is None else list(self.seleccion_activa)
+            instantanea = self.image_handler.instantanea_proyecto({"seleccion": seleccion})
+            # En modo imagen grande la imagen actual no se copia: edición bloqueada
+            self._edicion_bloqueada = self.image_handler.almacen is not None
+            futuro = self._ejecutor.submit(self.image_handler.guardar_instantanea_proyecto,
+                                           instantanea, ruta)
+            self._vigilar_operacion("guardar", futuro,
+                                    lambda f: config.MSG_GUARDANDO.format(nombre),
+                                    lambda futuro: self._terminar_guardado(futuro, ruta))
+    
+    @medir(categoria="interfaz")
+    def _terminar_guardado(self, futuro, ruta):
+        """Informa del resultado del guardado y lleva el diario junto al archivo guardado"""
+        try:
+            exito, mensaje = futuro.result()
+        except Exception as e:
+            exito, mensaje = False, config.MSG_ERROR_GUARDADO.format(e)
+        
+        if exito:
+            self.image_handler.reubicar_autoguardado(ruta)
+            messagebox.showinfo("💾 Guardado", mensaje)
+        else:
+            messagebox.showerror("Error", mensaje)
+    
+    def _anotar_progreso(self, fraccion):
+        """Llamado desde el hilo de fondo: solo guarda el valor (Tk no es seguro entre hilos)"""
+        self._progreso = fraccion
+    
+    def _vigilar_operacion(self, nombre, futuro, texto, al_terminar):
+        """
+        Muestra el progreso de una operación en segundo plano hasta que termina
+        
+        Args:
+            nombre (str): "cargar" o "guardar" (para bloquear operaciones en conflicto)
+            futuro (Future): Tarea enviada al ejecutor
+            texto (callable): Recibe la fracción (o None) y devuelve el texto a mostrar
+            al_terminar (callable): Recibe el futuro ya terminado (en el hilo de Tk)
+        """
+        self._operacion_en_curso = nombre
+        self._progreso = None
+        
+        def comprobar():
+            if not futuro.done():
+                self.label_info.mostrar_progreso(texto(self._progreso), self._progreso)
+                self.root.after(config.PROGRESO_INTERVALO_MS, comprobar)
+                return
             
-            if exito:
-                messagebox.showinfo("💾 Guardado", mensaje)
-            else:
-                messagebox.showerror("Error", mensaje)
+            self.label_info.ocultar_progreso()
+            self._operacion_en_curso = None
+            self._edicion_bloqueada = False
+            al_terminar(futuro)
+        
+        comprobar()
+    
+    def _operacion_permitida(self, edicion=False):
+        """
+        Comprueba que no haya una carga o un guardado en conflicto en curso
+        
+        Args:
+            edicion (bool): True si la operación modifica la imagen actual
+            
+        Returns:
+            bool: True si se puede continuar
+        """
+        if self._operacion_en_curso is None:
+            return True
+        if edicion and not self._edicion_bloqueada:
+            return True
+        
+        messagebox.showwarning("Advertencia",
+                               config.MSG_OPERACION_EN_CURSO.format(self._operacion_en_curso))
+        return False
     
     # ========== MÉTODOS DE EDICIÓN ==========
     
+    def _refrescar_canvas(self):
+        """
+        Redibuja en el canvas solo la región que cambió desde el último refresco
+        (con capas, de la imagen compuesta, que recompone solo las teselas sucias)
+        """
+        region = self.image_handler.tomar_region_modificada()
+        self.canvas_imagen.actualizar_region(self.image_handler.imagen_visible(), region)
+    
+    @medir(categoria="interfaz")
     def aplicar_cambio(self):
         """Aplica el cambio de color al píxel especificado"""
+        if not self._operacion_permitida(edicion=True):
+            return
+        
         try:
             valores = self.frame_edicion.obtener_valores()
             x = int(valores['x'])
@@ -173,8 +502,7 @@ class EditorImagenes:
             exito, mensaje = self.image_handler.modificar_pixel(x, y, r, g, b)
             
             if exito:
-                imagen = self.image_handler.obtener_imagen_actual()
-                self.canvas_imagen.mostrar_imagen(imagen)
+                self._refrescar_canvas()
                 messagebox.showinfo("✓ Éxito", mensaje)
             else:
                 messagebox.showerror("Error de validación", mensaje)
@@ -184,29 +512,301 @@ class EditorImagenes:
         except Exception as e:
             messagebox.showerror("Error", f"Error inesperado:\n{str(e)}")
     
+    @medir(categoria="interfaz")
     def deshacer(self):
         """Deshace el último cambio"""
+        if not self._operacion_permitida(edicion=True):
+            return
+        
         if self.image_handler.deshacer():
-            imagen = self.image_handler.obtener_imagen_actual()
-            self.canvas_imagen.mostrar_imagen(imagen)
+            self._refrescar_canvas()
         else:
             messagebox.showinfo("Info", config.MSG_NO_UNDO)
     
+    @medir(categoria="interfaz")
+    def rehacer(self):
+        """Rehace el último cambio deshecho"""
+        if not self._operacion_permitida(edicion=True):
+            return
+        
+        if self.image_handler.rehacer():
+            self._refrescar_canvas()
+        else:
+            messagebox.showinfo("Info", config.MSG_NO_REDO)
+    
+    @medir(categoria="interfaz")
     def restaurar_original(self):
         """Restaura la imagen original"""
+        if not self._operacion_permitida(edicion=True):
+            return
+        
         if self.image_handler.restaurar_original():
-            imagen = self.image_handler.obtener_imagen_actual()
-            self.canvas_imagen.mostrar_imagen(imagen)
+            self._refrescar_canvas()
             messagebox.showinfo("Restaurado", config.MSG_RESTORED)
         else:
             messagebox.showwarning("Advertencia", config.MSG_NO_IMAGE_WARNING)
     
+    @medir(categoria="interfaz")
+    def aplicar_filtro(self, nombre):
+        """
+        Aplica un filtro a la selección activa o, si no hay, a toda la imagen
+        
+        Args:
+            nombre (str): Clave de filtros.FILTROS
+        """
+        if not self._operacion_permitida(edicion=True):
+            return
+        
+        if self.image_handler.img_array is None:
+            messagebox.showwarning("Advertencia", config.MSG_NO_IMAGE_WARNING)
+            return
+        
+        import filtros
+        
+        # Pedir el parámetro de los filtros que lo tienen
+        etiqueta = filtros.FILTROS[nombre][1]
+        parametros = {}
+        if nombre == "gaussiano":
+            sigma = simpledialog.askfloat(etiqueta, "Sigma:", initialvalue=2.0, minvalue=0.1,
+                                          maxvalue=config.FILTRO_SIGMA_MAX, parent=self.root)
+            if sigma is None:
+                return
+            parametros["sigma"] = sigma
+        elif nombre == "caja":
+            radio = simpledialog.askinteger(etiqueta, "Radio:", initialvalue=2, minvalue=1,
+                                            maxvalue=config.FILTRO_RADIO_MAX, parent=self.root)
+            if radio is None:
+                return
+            parametros["radio"] = radio
+        
+        self.root.config(cursor="watch")
+        self.root.update_idletasks()
+        try:
+            exito, mensaje = self.image_handler.aplicar_filtro(nombre, self.seleccion_activa,
+                                                              **parametros)
+        finally:
+            self.root.config(cursor="")
+        
+        if exito:
+            self._refrescar_canvas()
+            messagebox.showinfo("✓ Éxito", mensaje)
+        else:
+            messagebox.showerror("Error", mensaje)
+    
+    def abrir_ajustes_tonos(self):
+        """Abre la ventana de tonos; la vista previa solo toca la imagen de pantalla"""
+        if not self._operacion_permitida(edicion=True):
+            return
+        
+        if self.image_handler.img_array is None:
+            messagebox.showwarning("Advertencia", config.MSG_NO_IMAGE_WARNING)
+            return
+        
+        # Región de la vista previa (la selección activa o toda la imagen)
+        region = None
+        if self.seleccion_activa is not None:
+            region = self.image_handler.normalizar_region(self.seleccion_activa)
+        
+        import tonos
+        
+        def previsualizar(ajustes):
+            try:
+                lut = tonos.construir_lut(**ajustes)
+            except ValueError:
+                return
+            self.canvas_imagen.previsualizar_lut(lut, region)
+        
+        DialogoTonos(self.root, previsualizar, self._aplicar_ajustes_tonos,
+                     self.canvas_imagen.cancelar_previsualizacion)
+    
+    def _aplicar_ajustes_tonos(self, ajustes):
+        """Aplica los ajustes aceptados a resolución completa"""
+        self.canvas_imagen.cancelar_previsualizacion()
+        self._aplicar_ajuste(self.image_handler.ajustar_tonos, **ajustes)
+    
+    def estirar_percentiles(self):
+        """Pide el porcentaje a descartar en cada extremo y estira el contraste"""
+        recorte = simpledialog.askfloat("Estirar percentiles",
+                                        "Porcentaje a descartar en cada extremo:",
+                                        initialvalue=1.0, minvalue=0.0, maxvalue=49.0,
+                                        parent=self.root)
+        if recorte is not None:
+            self._aplicar_ajuste(self.image_handler.estirar_percentiles, recorte, 100 - recorte)
+    
+    @medir(categoria="interfaz")
+    def _aplicar_ajuste(self, metodo, *args, **kwargs):
+        """
+        Ejecuta un ajuste de ImageHandler sobre la selección activa (o toda la imagen)
+        
+        Args:
+            metodo: Método que acepta region= y devuelve (éxito, mensaje)
+        """
+        if not self._operacion_permitida(edicion=True):
+            return
+        
+        if self.image_handler.img_array is None:
+            messagebox.showwarning("Advertencia", config.MSG_NO_IMAGE_WARNING)
+            return
+        
+        exito, mensaje = metodo(*args, region=self.seleccion_activa, **kwargs)
+        
+        if exito:
+            self._refrescar_canvas()
+            messagebox.showinfo("✓ Éxito", mensaje)
+        else:
+            messagebox.showerror("Error", mensaje)
+    
+    def abrir_transformacion(self):
+        """Abre la ventana de transformación; todos los pasos se aplican en un remuestreo"""
+        if not self._operacion_permitida(edicion=True):
+            return
+        
+        if self.image_handler.img_array is None:
+            messagebox.showwarning("Advertencia", config.MSG_NO_IMAGE_WARNING)
+            return
+        
+        DialogoTransformacion(self.root, self._aplicar_transformacion)
+    
+    @medir(categoria="interfaz")
+    def _aplicar_transformacion(self, pasos, opciones=None):
+        """
+        Transforma la imagen entera (las dimensiones pueden cambiar)
+        
+        Args:
+            pasos (list): Pasos para ImageHandler.transformar_pasos
+            opciones (dict): interpolacion y ajustar
+        """
+        if not self._operacion_permitida(edicion=True):
+            return
+        
+        if self.image_handler.img_array is None:
+            messagebox.showwarning("Advertencia", config.MSG_NO_IMAGE_WARNING)
+            return
+        
+        self.root.config(cursor="watch")
+        self.root.update_idletasks()
+        try:
+            exito, mensaje = self.image_handler.transformar_pasos(pasos, **(opciones or {}))
+        finally:
+            self.root.config(cursor="")
+        
+        if exito:
+            # La selección se refería a la geometría anterior
+            self._limpiar_seleccion_visual()
+            self._refrescar_canvas()
+            self.label_info.actualizar(mensaje)
+        else:
+            messagebox.showerror("Error", mensaje)
+    
+    def mostrar_instrumentacion(self):
+        """Abre (o trae al frente) el panel de métricas de la instrumentación"""
+        if (self._panel_instrumentacion is not None and
+                self._panel_instrumentacion.ventana.winfo_exists()):
+            self._panel_instrumentacion.ventana.lift()
+            return
+        self._panel_instrumentacion = PanelInstrumentacion(self.root)
+    
+    def mostrar_histograma(self):
+        """Abre (o trae al frente) la ventana del histograma en vivo"""
+        if self._panel_histograma is not None and self._panel_histograma.ventana.winfo_exists():
+            self._panel_histograma.ventana.lift()
+            return
+        self._panel_histograma = PanelHistograma(self.root, self.image_handler.obtener_histograma)
+    
+    # ========== CAPAS ==========
+    
+    def mostrar_capas(self):
+        """Abre (o trae al frente) el panel de capas"""
+        if self._panel_capas is not None and self._panel_capas.ventana.winfo_exists():
+            self._panel_capas.ventana.lift()
+            return
+        if self.image_handler.img_array is None:
+            messagebox.showwarning("Advertencia", config.MSG_NO_IMAGE_WARNING)
+            return
+        self._panel_capas = PanelCapas(self.root, {
+            'listar': self.image_handler.listar_capas,
+            'activar': lambda indice: self._operar_capas(self.image_handler.activar_capa, indice),
+            'modificar': lambda indice, visible, opacidad, modo: self._operar_capas(
+                self.image_handler.modificar_capa, indice, visible, opacidad, modo),
+            'mover': lambda indice, destino: self._operar_capas(
+                self.image_handler.mover_capa, indice, destino),
+            'nueva': self.nueva_capa,
+            'duplicar': self.duplicar_capa,
+            'importar': self.importar_capa,
+            'eliminar': lambda indice: self._operar_capas(self.image_handler.eliminar_capa, indice),
+            'combinar': self.combinar_capas,
+        })
+    
+    def _actualizar_panel_capas(self):
+        """Vuelve a leer las capas en el panel, si está abierto"""
+        if self._panel_capas is not None and self._panel_capas.ventana.winfo_exists():
+            self._panel_capas.actualizar()
+    
+    @medir(categoria="interfaz")
+    def _operar_capas(self, metodo, *args):
+        """
+        Ejecuta una operación de capas del manejador y redibuja lo que cambió
+        de la imagen compuesta
+        
+        Args:
+            metodo (callable): Método del manejador que devuelve (éxito, mensaje)
+            *args: Argumentos del método
+        """
+        if not self._operacion_permitida(edicion=True):
+            return
+        if self.image_handler.img_array is None:
+            messagebox.showwarning("Advertencia", config.MSG_NO_IMAGE_WARNING)
+            return
+        
+        exito, mensaje = metodo(*args)
+        if exito:
+            self._refrescar_canvas()
+            self.label_info.actualizar(mensaje)
+        else:
+            messagebox.showerror("Error", mensaje)
+        self._actualizar_panel_capas()
+    
+    def nueva_capa(self):
+        """Añade una capa transparente encima de la activa"""
+        self._operar_capas(self.image_handler.agregar_capa)
+    
+    def duplicar_capa(self):
+        """Añade una copia de la capa activa"""
+        self._operar_capas(self.image_handler.duplicar_capa)
+    
+    def importar_capa(self):
+        """Añade como capa una imagen del disco (con su transparencia)"""
+        if self.image_handler.img_array is None:
+            messagebox.showwarning("Advertencia", config.MSG_NO_IMAGE_WARNING)
+            return
+        ruta = filedialog.askopenfilename(title="Importar imagen como capa",
+                                          filetypes=config.IMAGE_FORMATS)
+        if ruta:
+            self._operar_capas(self.image_handler.importar_capa, ruta)
+    
+    def combinar_capas(self):
+        """Sustituye todas las capas por la imagen compuesta"""
+        self._operar_capas(self.image_handler.combinar_capas)
+    
     # ========== MÉTODOS DE INTERACCIÓN ==========
     
+    @medir(categoria="interfaz")
     def click_canvas(self, event):
         """Captura las coordenadas al hacer clic en el canvas"""
         if self.image_handler.img_array is None:
             return
+        if not self._operacion_permitida(edicion=True):
+            return
+        
+        modo = self.frame_seleccion.obtener_configuracion()['modo']
+        if modo == 'pincel':
+            self.iniciar_trazo_pincel(event)
+            return
+        if modo in ('relleno', 'varita'):
+            self.seleccionar_por_color(event, rellenar=(modo == 'relleno'))
+            return
+        
+        self.iniciar_seleccion_rectangulo(event)
         
         x_img, y_img = self.canvas_imagen.canvas_a_coordenadas_imagen(
             event.x, event.y
@@ -228,6 +828,7 @@ class EditorImagenes:
                 self.frame_edicion.establecer_valores(x_img, y_img, r, g, b)
                 self.actualizar_preview_color()
     
+    @medir(categoria="interfaz")
     def mostrar_coordenadas(self, event):
         """Muestra las coordenadas en tiempo real al mover el mouse"""
         if self.image_handler.img_array is None:
@@ -240,29 +841,48 @@ class EditorImagenes:
         if x_img is None or y_img is None:
             return
         
-        dimensiones = self.image_handler.obtener_dimensiones()
-        if dimensiones is None:
-            return
+        # El color es el que se ve (la compuesta, si hay capas)
+        color = self.image_handler.obtener_color_pixel(x_img, y_img)
         
-        ancho, alto = dimensiones
-        
-        if 0 <= x_img < ancho and 0 <= y_img < alto:
-            color = self.image_handler.obtener_color_pixel(x_img, y_img)
-            if color:
-                r, g, b = color
-                texto = f"Posición: X={x_img}, Y={y_img} | Color: RGB({r}, {g}, {b})"
-                self.label_coords.actualizar(texto)
+        if color is not None:
+            r, g, b = color
+            texto = f"Posición: X={x_img}, Y={y_img} | Color: RGB({r}, {g}, {b})"
+            self.label_coords.actualizar(texto)
         else:
             self.label_coords.actualizar("Posición: fuera de imagen")
     
+    @medir(categoria="interfaz")
+    def arrastrar_canvas(self, event):
+        """Mueve el pincel o extiende la selección mientras se arrastra"""
+        if self.image_handler.trazo is not None:
+            self.extender_trazo_pincel(event)
+        else:
+            self._arrastre_seleccion(event)
+    
+    @medir(categoria="interfaz")
+    def soltar_canvas(self, event):
+        """Termina el trazo del pincel o la selección al soltar el botón"""
+        self._arrastre_seleccion.vaciar()
+        if self.image_handler.trazo is not None:
+            self.finalizar_trazo_pincel(event)
+        elif self.canvas_imagen.rect_id is not None:
+            self.finalizar_seleccion_rectangulo(event)
+        else:
+            self.seleccion_inicio = None
+    
+    @medir(categoria="interfaz")
     def actualizar_preview_color(self):
         """Actualiza el preview del color RGB ingresado"""
         self.frame_edicion.actualizar_preview_color()
     
     # ========== MÉTODOS DE SELECCIÓN MÚLTIPLE ==========
     
+    @medir(categoria="interfaz")
     def aplicar_seleccion_multiple(self):
         """Aplica el color a la selección múltiple"""
+        if not self._operacion_permitida(edicion=True):
+            return
+        
         if self.seleccion_activa is None:
             messagebox.showwarning("Advertencia", "⚠️ Selecciona una área primero")
             return
@@ -273,7 +893,10 @@ class EditorImagenes:
         r, g, b = config_sel['r'], config_sel['g'], config_sel['b']
         
         try:
-            if config_sel['modo'] == 'rectangulo':
+            if self.seleccion_mascara is not None:
+                # Región de la varita mágica: solo sus píxeles, no toda la caja
+                exito, mensaje = self.image_handler.modificar_pixeles_mascara(*self.seleccion_mascara, r, g, b)
+            elif config_sel['modo'] == 'rectangulo':
                 exito, mensaje = self.image_handler.modificar_pixeles_rectangulo(x1, y1, x2, y2, r, g, b)
             elif config_sel['modo'] == 'circulo':
                 # Para círculo: usar el punto como centro
@@ -281,13 +904,18 @@ class EditorImagenes:
                 x_centro = (x1 + x2) // 2
                 y_centro = (y1 + y2) // 2
                 exito, mensaje = self.image_handler.modificar_pixeles_circulo(x_centro, y_centro, radio, r, g, b)
+            elif config_sel['modo'] == 'pincel':
+                messagebox.showinfo("Pincel", config.MSG_PINCEL_AYUDA)
+                return
+            elif config_sel['modo'] == 'relleno':
+                messagebox.showinfo("Relleno", config.MSG_RELLENO_AYUDA)
+                return
             else:
                 exito = False
                 mensaje = "Modo no soportado"
             
             if exito:
-                imagen = self.image_handler.obtener_imagen_actual()
-                self.canvas_imagen.mostrar_imagen(imagen)
+                self._refrescar_canvas()
                 messagebox.showinfo("✓ Éxito", mensaje)
                 self._limpiar_seleccion_visual()
             else:
@@ -296,6 +924,209 @@ class EditorImagenes:
         except Exception as e:
             messagebox.showerror("Error", f"Error al aplicar selección:\n{str(e)}")
     
+    # ========== RELLENO Y VARITA MÁGICA ==========
+    
+    @medir(categoria="interfaz")
+    def seleccionar_por_color(self, event, rellenar=False):
+        """
+        Hace crecer una región de color parecido desde el píxel pulsado
+        
+        Args:
+            event: Clic en el canvas
+            rellenar (bool): True para pintarla ya con el color de la selección
+                múltiple (bote de pintura); False para dejarla seleccionada (varita)
+        """
+        x_img, y_img = self.canvas_imagen.canvas_a_coordenadas_imagen(event.x, event.y)
+        if x_img is None or y_img is None:
+            return
+        
+        config_sel = self.frame_seleccion.obtener_configuracion()
+        tolerancia, modo = config_sel['tolerancia'], config_sel['tolerancia_modo']
+        
+        if rellenar:
+            exito, mensaje = self.image_handler.rellenar_region(
+                x_img, y_img, config_sel['r'], config_sel['g'], config_sel['b'],
+                tolerancia, modo)
+            if exito:
+                self._refrescar_canvas()
+                self.label_info.actualizar(mensaje)
+            else:
+                messagebox.showerror("Error", mensaje)
+            return
+        
+        try:
+            seleccion = self.image_handler.seleccionar_por_color(x_img, y_img, tolerancia, modo)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        if seleccion is None:
+            return
+        
+        self._limpiar_seleccion_visual()
+        x_min, y_min, mascara = seleccion
+        alto, ancho = mascara.shape
+        self._mostrar_seleccion((x_min, y_min, x_min + ancho - 1, y_min + alto - 1))
+        self.seleccion_mascara = seleccion
+        self.label_info.actualizar(config.MSG_VARITA_SELECCION.format(
+            int(mascara.sum()), ancho, alto))
+    
+    @medir(categoria="interfaz")
+    def reemplazar_color(self):
+        """
+        Cambia el color del último píxel pulsado (el del panel de edición) por
+        el de la selección múltiple, en toda la imagen o dentro de la selección
+        """
+        if not self._operacion_permitida(edicion=True):
+            return
+        
+        valores = self.frame_edicion.obtener_valores()
+        try:
+            # El reemplazo cambia la capa activa: el color de origen se lee de ella
+            origen = self.image_handler.obtener_color_pixel(int(valores['x']), int(valores['y']),
+                                                            solo_capa=True)
+        except ValueError:
+            origen = None
+        if origen is None:
+            messagebox.showwarning("Advertencia", config.MSG_REEMPLAZO_AYUDA)
+            return
+        
+        config_sel = self.frame_seleccion.obtener_configuracion()
+        destino = (config_sel['r'], config_sel['g'], config_sel['b'])
+        exito, mensaje = self.image_handler.reemplazar_color(
+            origen, destino, config_sel['tolerancia'], config_sel['tolerancia_modo'],
+            region=self.seleccion_activa, mascara=self.seleccion_mascara)
+        
+        if exito:
+            self._refrescar_canvas()
+            self.label_info.actualizar(mensaje)
+        else:
+            messagebox.showerror("Error", mensaje)
+    
+    # ========== PALETA ==========
+    
+    @medir(categoria="interfaz")
+    def color_promedio_seleccion(self):
+        """
+        Color promedio de la selección (o de toda la imagen), para el botón
+        "Color Promedio" de la selección múltiple
+        
+        Returns:
+            tuple: (r, g, b) o None
+        """
+        if self.image_handler.img_array is None:
+            messagebox.showwarning("Advertencia", config.MSG_NO_IMAGE_WARNING)
+            return None
+        if not self._operacion_permitida(edicion=True):
+            return None
+        
+        if self.seleccion_mascara is not None:
+            # Solo los píxeles de la varita: una paleta de un color es su media (muestreada)
+            resultado = self.image_handler.obtener_paleta(1, self.seleccion_activa,
+                                                          self.seleccion_mascara)
+            color = None if resultado is None else tuple(resultado[0][0].tolist())
+        else:
+            ancho, alto = self.image_handler.obtener_dimensiones()
+            region = self.seleccion_activa or (0, 0, ancho - 1, alto - 1)
+            color = self.image_handler.obtener_promedio_color_area(*region)
+        
+        if color is not None:
+            self.label_info.actualizar(config.MSG_COLOR_PROMEDIO.format(color))
+        return color
+    
+    @medir(categoria="interfaz")
+    def extraer_paleta(self):
+        """Extrae los colores dominantes de la selección (o de toda la imagen) y los muestra"""
+        if self.image_handler.img_array is None:
+            messagebox.showwarning("Advertencia", config.MSG_NO_IMAGE_WARNING)
+            return
+        if not self._operacion_permitida(edicion=True):
+            return
+        
+        config_sel = self.frame_seleccion.obtener_configuracion()
+        try:
+            resultado = self.image_handler.obtener_paleta(
+                config_sel['colores'], self.seleccion_activa, self.seleccion_mascara,
+                config_sel['metodo_paleta'])
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        if resultado is None:
+            return
+        
+        colores, proporciones = resultado
+        self.paleta_actual = colores
+        self.frame_seleccion.mostrar_paleta(colores.tolist(), proporciones.tolist())
+        self.label_info.actualizar(config.MSG_PALETA_EXTRAIDA.format(len(colores), proporciones[0]))
+    
+    @medir(categoria="interfaz")
+    def cuantizar_paleta(self):
+        """Lleva la selección (o toda la imagen) a la última paleta extraída"""
+        if not self._operacion_permitida(edicion=True):
+            return
+        if self.paleta_actual is None:
+            self.extraer_paleta()
+            if self.paleta_actual is None:
+                return
+        
+        exito, mensaje = self.image_handler.cuantizar_paleta(
+            self.paleta_actual, self.seleccion_activa, self.seleccion_mascara)
+        if exito:
+            self._refrescar_canvas()
+            self.label_info.actualizar(mensaje)
+        else:
+            messagebox.showerror("Error", mensaje)
+    
+    # ========== MÉTODOS DEL PINCEL ==========
+    
+    @medir(categoria="interfaz")
+    def iniciar_trazo_pincel(self, event):
+        """Comienza un trazo de pincel en el punto pulsado"""
+        config_sel = self.frame_seleccion.obtener_configuracion()
+        exito, mensaje = self.image_handler.iniciar_trazo(
+            config_sel['tamaño'], config_sel['r'], config_sel['g'], config_sel['b'])
+        
+        if not exito:
+            messagebox.showerror("Error", mensaje)
+            return
+        
+        self.label_info.actualizar(mensaje)
+        self.extender_trazo_pincel(event)
+    
+    @medir(categoria="interfaz")
+    def extender_trazo_pincel(self, event):
+        """Acumula el punto y agenda el próximo lote de sellos (uno por fotograma)"""
+        x_img, y_img = self.canvas_imagen.canvas_a_coordenadas_imagen(event.x, event.y)
+        if x_img is None or y_img is None:
+            return
+        
+        self.image_handler.agregar_punto_trazo(x_img, y_img)
+        if self._trazo_pendiente is None:
+            self._trazo_pendiente = self.root.after(config.PINCEL_INTERVALO_MS,
+                                                    self._procesar_trazo_pincel)
+    
+    @medir(categoria="interfaz")
+    def _procesar_trazo_pincel(self):
+        """Pinta los puntos acumulados y refresca solo la región afectada"""
+        self._trazo_pendiente = None
+        self.image_handler.procesar_trazo()
+        self._refrescar_canvas()
+    
+    @medir(categoria="interfaz")
+    def finalizar_trazo_pincel(self, event):
+        """Termina el trazo y lo guarda como un solo paso del historial"""
+        if self._trazo_pendiente is not None:
+            self.root.after_cancel(self._trazo_pendiente)
+            self._trazo_pendiente = None
+        
+        self.extender_trazo_pincel(event)
+        if self._trazo_pendiente is not None:
+            self.root.after_cancel(self._trazo_pendiente)
+            self._trazo_pendiente = None
+        
+        self.image_handler.finalizar_trazo()
+        self._refrescar_canvas()
+    
+    @medir(categoria="interfaz")
     def iniciar_seleccion_rectangulo(self, event):
         """Inicia la selección rectangular"""
         if self.image_handler.img_array is None:
@@ -303,23 +1134,37 @@ class EditorImagenes:
         
         self.seleccion_inicio = (event.x, event.y)
     
+    @medir(categoria="interfaz")
     def extender_seleccion_rectangulo(self, event):
         """Extiende la selección rectangular mientras se arrastra"""
         if not hasattr(self, 'seleccion_inicio') or self.seleccion_inicio is None:
             return
         
-        # Dibujar rectángulo provisional en el canvas
-        if self.canvas_imagen.rect_id is not None:
-            self.canvas_imagen.canvas.delete(self.canvas_imagen.rect_id)
-        
         x1, y1 = self.seleccion_inicio
         x2, y2 = event.x, event.y
         
-        # Dibujar rectángulo en el canvas
-        self.canvas_imagen.rect_id = self.canvas_imagen.canvas.create_rectangle(
-            x1, y1, x2, y2, outline="#3498db", width=2, dash=(4, 4)
-        )
-    
+        # Mover el rectángulo provisional (se crea una sola vez y se reutiliza);
+        # hasta soltar no tiene coordenadas de imagen que seguir al hacer zoom
+        self.canvas_imagen.seleccion = None
+        if self.canvas_imagen.rect_id is not None:
+            self.canvas_imagen.canvas.coords(self.canvas_imagen.rect_id, x1, y1, x2, y2)
+        else:
+            self.canvas_imagen.rect_id = self.canvas_imagen.canvas.create_rectangle(
+                x1, y1, x2, y2, outline="#3498db", width=2, dash=(4, 4)
+            )
+
+        # Estadísticas en vivo del área seleccionada (tiempo constante con tablas integrales)
+        x1_img, y1_img = self.canvas_imagen.canvas_a_coordenadas_imagen(x1, y1)
+        x2_img, y2_img = self.canvas_imagen.canvas_a_coordenadas_imagen(x2, y2)
+        if x1_img is None or x2_img is None:
+            return
+        estadisticas = self.image_handler.obtener_estadisticas_region(x1_img, y1_img, x2_img, y2_img)
+        if estadisticas is not None:
+            self.label_coords.actualizar(config.MSG_SELECCION_ESTADISTICAS.format(
+                abs(x2_img - x1_img) + 1, abs(y2_img - y1_img) + 1,
+                *estadisticas['media'], *estadisticas['desviacion']))
+
+    @medir(categoria="interfaz")
     def finalizar_seleccion_rectangulo(self, event):
         """Finaliza la selección rectangular"""
         if not hasattr(self, 'seleccion_inicio') or self.seleccion_inicio is None:
@@ -334,6 +1179,8 @@ class EditorImagenes:
         
         if x1_img is not None and y1_img is not None and x2_img is not None and y2_img is not None:
             self.seleccion_activa = (x1_img, y1_img, x2_img, y2_img)
+            self.seleccion_mascara = None
+            self.canvas_imagen.mostrar_seleccion(self.seleccion_activa)
             
             # Mostrar información de la selección
             ancho = abs(x2_img - x1_img)
@@ -348,16 +1195,63 @@ class EditorImagenes:
     
     def _limpiar_seleccion_visual(self):
         """Limpia la visualización de la selección"""
-        if self.canvas_imagen.rect_id is not None:
-            self.canvas_imagen.canvas.delete(self.canvas_imagen.rect_id)
-            self.canvas_imagen.rect_id = None
+        self.canvas_imagen.mostrar_seleccion(None)
         self.seleccion_activa = None
+        self.seleccion_mascara = None
+
+
+def _informe_arranque(tiempos):
+    """Imprime las fases del arranque en milisegundos"""
+    print("Arranque del editor:")
+    for fase, segundos in tiempos.items():
+        print(f"  {fase:<28} {segundos * 1000:9.1f} ms")
 
 
-def main():
+def main(argv=None):
     """Función principal para iniciar la aplicación"""
+    parser = argparse.ArgumentParser(description=config.WINDOW_TITLE)
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Medir importaciones y construcción de la interfaz, "
+                             "imprimir los tiempos y salir")
+    parser.add_argument("--trace", metavar="ARCHIVO",
+                        help="Escribir cada operación medida en un archivo JSON lines")
+    parser.add_argument("--medir-memoria", action="store_true",
+                        help="Medir también los bytes asignados (tracemalloc, más lento)")
+    args = parser.parse_args(argv)
+    if args.trace:
+        instrumentacion.registro.abrir_traza(args.trace)
+    if args.medir_memoria:
+        instrumentacion.registro.medir_memoria(True)
+    
+    inicio = time.perf_counter()
     root = tk.Tk()
+    creada = time.perf_counter()
     app = EditorImagenes(root)
+    construida = time.perf_counter()
+    
+    if args.profile_startup:
+        def terminar():
+            # Esperar a que la interfaz esté completa y termine la precarga
+            precarga = app._precarga
+            if ("paneles_secundarios" not in app.tiempos_arranque or
+                    (config.PRECARGAR_MODULOS and (precarga is None or not precarga.done()))):
+                root.after(10, terminar)
+                return
+            if precarga is not None:
+                precarga.result()
+            tiempos = {
+                "importar_interfaz": _FIN_IMPORTACION - _INICIO_IMPORTACION,
+                "crear_tk": creada - inicio,
+                "construir_editor": construida - creada,
+                "hasta_ventana_visible": app.instante_mostrada - inicio,
+                **app.tiempos_arranque,
+                "total": time.perf_counter() - _INICIO_IMPORTACION,
+            }
+            _informe_arranque(tiempos)
+            app.cerrar()
+        
+        root.after_idle(terminar)
+    
     root.mainloop()
 
 
@@ -0,0 +1,179 @@
+"""
+Módulo de máscaras de formas
+Construye máscaras booleanas de NumPy (círculo, elipse, rectángulo,
+rectángulo redondeado y polígono) y las aplica en una sola escritura indexada
+"""
+
+from functools import lru_cache
+import numpy as np
+import config
+
+
+def _solo_lectura(mascara):
+    """Marca la máscara como inmutable para poder compartirla desde la caché"""
+    mascara.setflags(write=False)
+    return mascara
+
+
+@lru_cache(maxsize=config.MAX_MASCARAS_CACHE)
+def mascara_circulo(radio):
+    """
+    Máscara de un círculo centrado en (radio, radio)
+
+    Args:
+        radio (int): Radio del círculo en píxeles
+
+    Returns:
+        ndarray: Máscara booleana de (2 * radio + 1) x (2 * radio + 1)
+    """
+    radio = max(0, int(radio))
+    y, x = np.ogrid[-radio:radio + 1, -radio:radio + 1]
+    return _solo_lectura(x * x + y * y <= radio * radio)
+
+
+@lru_cache(maxsize=config.MAX_MASCARAS_CACHE)
+def mascara_elipse(radio_x, radio_y):
+    """
+    Máscara de una elipse centrada en (radio_x, radio_y)
+
+    Args:
+        radio_x, radio_y (int): Semiejes horizontal y vertical
+
+    Returns:
+        ndarray: Máscara booleana de (2 * radio_y + 1) x (2 * radio_x + 1)
+    """
+    radio_x = max(0, int(radio_x))
+    radio_y = max(0, int(radio_y))
+    y, x = np.ogrid[-radio_y:radio_y + 1, -radio_x:radio_x + 1]
+    # Forma sin divisiones: x²·ry² + y²·rx² <= rx²·ry² (válida también con semiejes 0)
+    rx2 = radio_x * radio_x
+    ry2 = radio_y * radio_y
+    return _solo_lectura(x * x * ry2 + y * y * rx2 <= rx2 * ry2)
+
+
+@lru_cache(maxsize=config.MAX_MASCARAS_CACHE)
+def mascara_rectangulo(ancho, alto):
+    """
+    Máscara de un rectángulo completo
+
+    Args:
+        ancho, alto (int): Dimensiones del rectángulo
+
+    Returns:
+        ndarray: Máscara booleana de alto x ancho (vista sin memoria propia)
+    """
+    return np.broadcast_to(True, (max(0, int(alto)), max(0, int(ancho))))
+
+
+@lru_cache(maxsize=config.MAX_MASCARAS_CACHE)
+def mascara_rectangulo_redondeado(ancho, alto, radio):
+    """
+    Máscara de un rectángulo con las esquinas redondeadas
+
+    Args:
+        ancho, alto (int): Dimensiones del rectángulo
+        radio (int): Radio de las esquinas
+
+    Returns:
+        ndarray: Máscara booleana de alto x ancho
+    """
+    ancho = max(0, int(ancho))
+    alto = max(0, int(alto))
+    radio = max(0, min(int(radio), ancho // 2, alto // 2))
+    if radio == 0:
+        return mascara_rectangulo(ancho, alto)
+
+    y, x = np.ogrid[0:alto, 0:ancho]
+    # Distancia de cada píxel al rectángulo interior (el que queda al quitar el radio)
+    dx = np.maximum(0, np.maximum(radio - x, x - (ancho - 1 - radio)))
+    dy = np.maximum(0, np.maximum(radio - y, y - (alto - 1 - radio)))
+    return _solo_lectura(dx * dx + dy * dy <= radio * radio)
+
+
+@lru_cache(maxsize=config.MAX_MASCARAS_CACHE)
+def mascara_poligono(vertices, caja=None):
+    """
+    Máscara de un polígono (regla par-impar sobre el centro de cada píxel)
+
+    Args:
+        vertices (tuple): Tupla de puntos (x, y) en coordenadas de imagen
+        caja (tuple): (x_min, y_min, x_max, y_max) a la que limitar la máscara
+            (normalmente la imagen); None para la caja entera del polígono
+
+    Returns:
+        tuple: (x_min, y_min, mascara) - esquina de la máscara y máscara booleana
+            (vacía si el polígono no toca la caja)
+    """
+    puntos = np.asarray(vertices, dtype=np.float64).reshape(-1, 2)
+    x_min, y_min = np.floor(puntos.min(axis=0)).astype(int)
+    x_max, y_max = np.ceil(puntos.max(axis=0)).astype(int)
+
+    # Rasterizar solo la intersección con la caja (los límites de la máscara son inclusivos)
+    if caja is not None:
+        x_min, y_min = max(x_min, caja[0]), max(y_min, caja[1])
+        x_max, y_max = min(x_max, caja[2] - 1), min(y_max, caja[3] - 1)
+        if x_max < x_min or y_max < y_min:
+            return int(x_min), int(y_min), _solo_lectura(np.zeros((0, 0), dtype=bool))
+
+    y, x = np.ogrid[y_min:y_max + 1, x_min:x_max + 1]
+    dentro = np.zeros((y_max - y_min + 1, x_max - x_min + 1), dtype=bool)
+
+    # Cada arista que cruza la horizontal del píxel por su derecha invierte el estado
+    for (xa, ya), (xb, yb) in zip(puntos, np.roll(puntos, -1, axis=0)):
+        if ya == yb:
+            continue
+        cruza = (ya > y) != (yb > y)
+        x_corte = xa + (y - ya) * (xb - xa) / (yb - ya)
+        dentro ^= cruza & (x < x_corte)
+
+    return int(x_min), int(y_min), _solo_lectura(dentro)
+
+
+def recortar_mascara(alto, ancho, x0, y0, mascara):
+    """
+    Recorta una máscara colocada en (x0, y0) a los límites de la imagen
+
+    Args:
+        alto, ancho (int): Dimensiones de la imagen
+        x0, y0 (int): Posición de la esquina superior izquierda de la máscara
+        mascara (ndarray): Máscara booleana
+
+    Returns:
+        tuple: (x_min, y_min, x_max, y_max, submascara) o None si no hay intersección
+    """
+    m_alto, m_ancho = mascara.shape
+    x_min = max(0, x0)
+    y_min = max(0, y0)
+    x_max = min(ancho, x0 + m_ancho)
+    y_max = min(alto, y0 + m_alto)
+
+    if x_max <= x_min or y_max <= y_min:
+        return None
+
+    sub = mascara[y_min - y0:y_max - y0, x_min - x0:x_max - x0]
+    return x_min, y_min, x_max, y_max, sub
+
+
+def rellenar_mascara(img_array, x_min, y_min, mascara, color):
+    """
+    Pinta con un color los píxeles activos de una máscara ya recortada
+
+    Args:
+        img_array (ndarray): Imagen a modificar
+        x_min, y_min (int): Posición de la máscara dentro de la imagen
+        mascara (ndarray): Máscara booleana (dentro de los límites)
+        color (tuple): (r, g, b)
+
+    Returns:
+        int: Número de píxeles modificados
+    """
+    m_alto, m_ancho = mascara.shape
+    region = img_array[y_min:y_min + m_alto, x_min:x_min + m_ancho]
+    if mascara.size and mascara.strides == (0, 0):
+        # Máscara uniforme (p. ej. de mascara_rectangulo): sin escritura indexada
+        if not mascara.flat[0]:
+            return 0
+        region[...] = color
+        return m_alto * m_ancho
+    region[mascara] = color
+    return int(mascara.sum())
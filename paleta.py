@@ -0,0 +1,221 @@
+"""
+Módulo de paletas
+Colores dominantes de una imagen, un área o una máscara. Se trabaja sobre una
+muestra aleatoria de píxeles con semilla fija (el mismo resultado cada vez
+para la misma imagen), así que extraer la paleta cuesta casi lo mismo con 1
+que con 50 megapíxeles. Dos métodos vectorizados: k-means (Lloyd con
+inicialización k-means++) y corte por la mediana. Cuantizar lleva cada píxel
+al color más cercano de la paleta, franja a franja: una rejilla de 64³ celdas
+da directamente el color de los píxeles cuya celda entera tiene el mismo más
+cercano, y solo el resto se compara con toda la paleta
+"""
+
+import numpy as np
+import config
+
+METODOS = config.PALETA_METODOS
+
+# Bits por canal de la rejilla que acelera cuantizar (celdas de 4 de lado)
+_BITS_CELDA = 6
+
+
+def muestrear(img_array, caja, mascara=None, muestras=config.PALETA_MUESTRAS,
+              semilla=config.PALETA_SEMILLA):
+    """
+    Muestra aleatoria (reproducible) de los píxeles de un área
+
+    Args:
+        img_array (ndarray): Imagen (alto x ancho x 3), posiblemente un memmap
+        caja (tuple): (x_min, y_min, x_max, y_max) con extremo final exclusivo
+        mascara (ndarray): Máscara booleana del tamaño de la caja, o None
+        muestras (int): Número máximo de píxeles (si hay menos se toman todos)
+        semilla (int): Semilla del generador aleatorio
+
+    Returns:
+        ndarray: Colores muestreados (N x 3, uint8)
+    """
+    x_min, y_min, x_max, y_max = caja
+    ancho = x_max - x_min
+    # Posiciones candidatas (índices planos dentro de la caja); None = todas
+    indices = None if mascara is None else np.flatnonzero(mascara)
+    total = ancho * (y_max - y_min) if indices is None else len(indices)
+
+    if total <= muestras:
+        elegidos = np.arange(total)
+    else:
+        # Con reemplazo: no hace falta una permutación del tamaño del área
+        elegidos = np.random.default_rng(semilla).integers(0, total, muestras)
+        # En orden, para leer un memmap de forma secuencial
+        elegidos.sort()
+    if indices is not None:
+        elegidos = indices[elegidos]
+    ys, xs = np.divmod(elegidos, ancho)
+    return np.asarray(img_array[ys + y_min, xs + x_min])
+
+
+def _mas_cercano(pixeles, centros):
+    """Índice del centro más cercano a cada píxel (N x 3 float32, K x 3 float32)"""
+    # |p - c|² = |p|² - 2 p·c + |c|²; |p|² no cambia el mínimo
+    distancias = pixeles @ (-2 * centros.T)
+    distancias += np.einsum("ij,ij->i", centros, centros)
+    return distancias.argmin(axis=1)
+
+
+def _tabla_celdas(centros):
+    """
+    Centro más cercano de cada celda de la rejilla RGB, si es el mismo para
+    todos los colores de la celda; -1 si la celda queda cerca de una frontera
+
+    Args:
+        centros (ndarray): Paleta (K x 3)
+
+    Returns:
+        ndarray: Índice por celda (int16), numeradas r·64² + g·64 + b
+    """
+    lado = 256 >> _BITS_CELDA
+    marcas = np.arange(1 << _BITS_CELDA) * lado + (lado - 1) / 2
+    celdas = np.stack(np.meshgrid(marcas, marcas, marcas, indexing="ij"), axis=-1).reshape(-1, 3)
+    centros = np.asarray(centros, dtype=np.float64)
+    distancias = celdas @ (-2 * centros.T)
+    distancias += np.einsum("ij,ij->i", centros, centros)
+    distancias += np.einsum("ij,ij->i", celdas, celdas)[:, None]
+    np.sqrt(np.maximum(distancias, 0, out=distancias), out=distancias)
+    tabla = distancias.argmin(axis=1).astype(np.int16)
+    if len(centros) > 1:
+        # Ningún color de la celda está a más de media diagonal de su centro: si el
+        # segundo centro está bastante más lejos que el primero, no puede adelantarlo
+        dos = np.partition(distancias, 1, axis=1)
+        tabla[dos[:, 1] - dos[:, 0] <= np.sqrt(3) * (lado - 1)] = -1
+    return tabla
+
+
+def kmeans(pixeles, k, iteraciones=config.PALETA_ITERACIONES, semilla=config.PALETA_SEMILLA):
+    """
+    Agrupa colores con k-means (inicialización k-means++)
+
+    Args:
+        pixeles (ndarray): Colores (N x 3)
+        k (int): Número de grupos
+        iteraciones (int): Máximo de iteraciones de Lloyd
+        semilla (int): Semilla del generador aleatorio
+
+    Returns:
+        tuple: (centros, conteos) con centros (k' x 3, float32) y el número de
+            muestras de cada grupo; k' < k si hay menos colores distintos
+    """
+    pixeles = np.asarray(pixeles, dtype=np.float32)
+    rng = np.random.default_rng(semilla)
+    k = min(k, len(np.unique(pixeles, axis=0)))
+
+    # k-means++: cada centro nuevo, con probabilidad proporcional a la distancia al más cercano
+    centros = np.empty((k, 3), dtype=np.float32)
+    centros[0] = pixeles[rng.integers(len(pixeles))]
+    distancia = ((pixeles - centros[0]) ** 2).sum(axis=1)
+    for i in range(1, k):
+        centros[i] = pixeles[rng.choice(len(pixeles), p=distancia / distancia.sum())]
+        np.minimum(distancia, ((pixeles - centros[i]) ** 2).sum(axis=1), out=distancia)
+
+    grupos = None
+    for _ in range(iteraciones):
+        nuevos = _mas_cercano(pixeles, centros)
+        if grupos is not None and np.array_equal(nuevos, grupos):
+            break
+        grupos = nuevos
+        conteos = np.bincount(grupos, minlength=k)
+        sumas = np.stack([np.bincount(grupos, pixeles[:, canal], minlength=k) for canal in range(3)],
+                         axis=1)
+        ocupados = conteos > 0
+        centros[ocupados] = sumas[ocupados] / conteos[ocupados, None]
+
+    conteos = np.bincount(grupos, minlength=k)
+    return centros[conteos > 0], conteos[conteos > 0]
+
+
+def mediana(pixeles, k):
+    """
+    Agrupa colores por corte de la mediana: parte una y otra vez la caja de
+    mayor rango por la mediana de su canal más ancho
+
+    Args:
+        pixeles (ndarray): Colores (N x 3)
+        k (int): Número de grupos
+
+    Returns:
+        tuple: (centros, conteos) como en kmeans
+    """
+    cajas = [np.asarray(pixeles)]
+    while len(cajas) < k:
+        rangos = [np.ptp(caja, axis=0) if len(caja) > 1 else np.zeros(3) for caja in cajas]
+        mayor = int(np.argmax([rango.max() for rango in rangos]))
+        if rangos[mayor].max() == 0:
+            break
+        caja = cajas.pop(mayor)
+        canal = int(np.argmax(rangos[mayor]))
+        orden = np.argsort(caja[:, canal], kind="stable")
+        mitad = len(caja) // 2
+        cajas += [caja[orden[:mitad]], caja[orden[mitad:]]]
+
+    centros = np.array([caja.mean(axis=0) for caja in cajas], dtype=np.float32)
+    return centros, np.array([len(caja) for caja in cajas])
+
+
+def extraer(pixeles, k, metodo="kmeans"):
+    """
+    Paleta de colores dominantes de una muestra
+
+    Args:
+        pixeles (ndarray): Colores (N x 3, uint8)
+        k (int): Número máximo de colores
+        metodo (str): "kmeans" o "mediana"
+
+    Returns:
+        tuple: (colores, proporciones) con colores (k' x 3, uint8) de más a
+            menos frecuente y la fracción de la muestra que representa cada uno
+    """
+    if len(pixeles) == 0:
+        return np.empty((0, 3), dtype=np.uint8), np.empty(0)
+    centros, conteos = kmeans(pixeles, k) if metodo == "kmeans" else mediana(pixeles, k)
+    orden = np.argsort(-conteos, kind="stable")
+    colores = np.clip(np.rint(centros[orden]), 0, 255).astype(np.uint8)
+    return colores, conteos[orden] / conteos.sum()
+
+
+def cuantizar(destino, paleta, mascara=None):
+    """
+    Lleva cada píxel al color más cercano (distancia RGB) de la paleta, en su
+    sitio y franja a franja (los temporales no pasan de PALETA_BYTES_FRANJA)
+
+    Args:
+        destino (ndarray): Imagen o recorte (alto x ancho x 3, uint8)
+        paleta (ndarray): Colores (K x 3, uint8)
+        mascara (ndarray): Máscara booleana del tamaño de destino, o None
+
+    Returns:
+        int: Número de píxeles que cambiaron de color
+    """
+    alto, ancho = destino.shape[:2]
+    paleta = np.asarray(paleta, dtype=np.uint8)
+    centros = paleta.astype(np.float32)
+    tabla = _tabla_celdas(centros)
+    desplazamiento = 8 - _BITS_CELDA
+    # En el peor caso todos los píxeles van por la comparación completa: float32
+    # (12 bytes), distancias (4 por color) e índices (8), más la celda, el
+    # índice y el color resultante (9)
+    paso = max(1, config.PALETA_BYTES_FRANJA // (ancho * (29 + 4 * len(centros))))
+    contador = 0
+    for y in range(0, alto, paso):
+        franja = destino[y:y + paso]
+        celda = (franja[..., 0] >> desplazamiento).astype(np.uint32) << (2 * _BITS_CELDA)
+        celda |= (franja[..., 1] >> desplazamiento).astype(np.uint32) << _BITS_CELDA
+        celda |= franja[..., 2] >> desplazamiento
+        indices = tabla[celda]
+        dudosos = indices < 0
+        if dudosos.any():
+            indices[dudosos] = _mas_cercano(franja[dudosos].astype(np.float32), centros)
+        nuevos = np.take(paleta, indices, axis=0)
+        cambia = np.any(nuevos != franja, axis=2)
+        if mascara is not None:
+            cambia &= mascara[y:y + paso]
+        np.copyto(franja, nuevos, where=cambia[..., None])
+        contador += int(np.count_nonzero(cambia))
+    return contador
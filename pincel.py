@@ -0,0 +1,109 @@
+"""
+Módulo del pincel
+Acumula los puntos de un trazo, interpola el recorrido y estampa la punta
+del pincel por lotes (una escritura por fotograma en lugar de una por evento)
+"""
+
+import math
+import numpy as np
+import config
+import mascaras
+
+
+class TrazoPincel:
+    """Trazo de pincel en curso sobre una imagen"""
+
+    def __init__(self, img_array, radio, color):
+        """
+        Args:
+            img_array (ndarray): Imagen (o lienzo RGBA de una capa) sobre la que se pinta
+            radio (int): Radio de la punta del pincel
+            color (tuple): (r, g, b), o (r, g, b, a) sobre un lienzo RGBA
+        """
+        self.img_array = img_array
+        self.radio = max(0, int(radio))
+        self.color = color
+        self.mascara = mascaras.mascara_circulo(self.radio)
+        self.espaciado = max(1.0, self.radio * config.PINCEL_ESPACIADO)
+
+        self.puntos = []               # Puntos crudos pendientes de procesar
+        self.ultimo_sello = None       # Centro del último sello aplicado
+        self.region = None             # (x_min, y_min, x_max, y_max) de todo el trazo
+        self.centros = []              # Centros de todos los sellos aplicados (para el historial)
+
+    def agregar_punto(self, x, y):
+        """Añade un punto del recorrido al búfer (no toca la imagen)"""
+        self.puntos.append((x, y))
+
+    def _interpolar(self):
+        """
+        Convierte los puntos pendientes en centros de sello equiespaciados
+
+        Returns:
+            list: Centros (x, y) donde estampar la punta
+        """
+        centros = []
+        for x, y in self.puntos:
+            if self.ultimo_sello is None:
+                self.ultimo_sello = (x, y)
+                centros.append((x, y))
+                continue
+
+            x0, y0 = self.ultimo_sello
+            distancia = math.hypot(x - x0, y - y0)
+            pasos = int(distancia // self.espaciado)
+            if pasos == 0:
+                continue
+
+            t = np.arange(1, pasos + 1) * (self.espaciado / distancia)
+            xs = np.rint(x0 + (x - x0) * t).astype(int)
+            ys = np.rint(y0 + (y - y0) * t).astype(int)
+            centros.extend(zip(xs.tolist(), ys.tolist()))
+            self.ultimo_sello = (x0 + (x - x0) * t[-1], y0 + (y - y0) * t[-1])
+
+        self.puntos.clear()
+        return centros
+
+    def procesar(self):
+        """
+        Estampa de una vez todos los sellos pendientes
+
+        Returns:
+            tuple: ((x_min, y_min, x_max, y_max), contenido previo de esa región)
+                o None si no se modificó nada
+        """
+        centros = self._interpolar()
+        if not centros:
+            return None
+
+        alto, ancho = self.img_array.shape[:2]
+        r = self.radio
+        xs = np.array([c[0] for c in centros])
+        ys = np.array([c[1] for c in centros])
+        x_min = max(0, int(xs.min()) - r)
+        y_min = max(0, int(ys.min()) - r)
+        x_max = min(ancho, int(xs.max()) + r + 1)
+        y_max = min(alto, int(ys.max()) + r + 1)
+        if x_max <= x_min or y_max <= y_min:
+            return None
+
+        # Unir todos los sellos del lote en una sola máscara
+        lote = np.zeros((y_max - y_min, x_max - x_min), dtype=bool)
+        for cx, cy in centros:
+            recorte = mascaras.recortar_mascara(alto, ancho, cx - r, cy - r, self.mascara)
+            if recorte is None:
+                continue
+            sx0, sy0, sx1, sy1, sub = recorte
+            lote[sy0 - y_min:sy1 - y_min, sx0 - x_min:sx1 - x_min] |= sub
+
+        self.centros.extend(centros)
+        antes = self.img_array[y_min:y_max, x_min:x_max].copy()
+        mascaras.rellenar_mascara(self.img_array, x_min, y_min, lote, self.color)
+
+        region = (x_min, y_min, x_max, y_max)
+        if self.region is None:
+            self.region = region
+        else:
+            self.region = (min(self.region[0], x_min), min(self.region[1], y_min),
+                           max(self.region[2], x_max), max(self.region[3], y_max))
+        return region, antes
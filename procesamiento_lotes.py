@@ -0,0 +1,314 @@
+"""
+Procesamiento por lotes sin interfaz gráfica
+Aplica un guion de edición (JSON o YAML) a muchas imágenes usando un pool de procesos
+
+Uso:
+    python procesamiento_lotes.py guion.json "fotos/*.png" -o salida
+    python procesamiento_lotes.py guion.yaml carpeta_entrada -o salida -j 8
+
+Formato del guion (lista de operaciones o {"operaciones": [...]}):
+    [
+        {"op": "pixel", "x": 10, "y": 20, "color": [255, 0, 0]},
+        {"op": "rectangulo", "x1": 0, "y1": 0, "x2": 99, "y2": 49, "color": [0, 0, 0]},
+        {"op": "circulo", "x": 200, "y": 150, "radio": 40, "color": [255, 255, 255]},
+        {"op": "rellenar", "x": 5, "y": 5, "tolerancia": 20, "color": [0, 0, 255]},
+        {"op": "reemplazar_color", "origen": [255, 255, 255], "destino": [0, 0, 0], "tolerancia": 10, "modo": "perceptual"},
+        {"op": "cuantizar", "colores": [[0, 0, 0], [255, 255, 255], [200, 30, 30]]},
+        {"op": "pixeles", "xs": [1, 2, 3], "ys": [5, 5, 5], "colores": [0, 255, 0]},
+        {"op": "filtro", "nombre": "gaussiano", "sigma": 1.5, "region": [0, 0, 99, 49]},
+        {"op": "tonos", "brillo": 10, "contraste": 1.2, "curva": [[0, 0], [128, 140], [255, 255]]},
+        {"op": "niveles_automaticos"},
+        {"op": "transformar", "pasos": [{"rotar": 15}, {"escalar": 0.5}], "interpolacion": "bicubica"}
+    ]
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+from image_handler import ImageHandler
+
+
+# Operación del guion -> (método de ImageHandler, parámetros posicionales, usa color)
+# Las claves del guion que no son posicionales se pasan como argumentos con nombre.
+OPERACIONES = {
+    "pixel": ("modificar_pixel", ("x", "y"), True),
+    "rectangulo": ("modificar_pixeles_rectangulo", ("x1", "y1", "x2", "y2"), True),
+    "rectangulo_redondeado": ("modificar_pixeles_rectangulo_redondeado",
+                              ("x1", "y1", "x2", "y2", "radio"), True),
+    "circulo": ("modificar_pixeles_circulo", ("x", "y", "radio"), True),
+    "elipse": ("modificar_pixeles_elipse", ("x", "y", "radio_x", "radio_y"), True),
+    "poligono": ("modificar_pixeles_poligono", ("vertices",), True),
+    "rellenar": ("rellenar_region", ("x", "y"), True),
+    "reemplazar_color": ("reemplazar_color", ("origen", "destino"), False),
+    "cuantizar": ("cuantizar_paleta", ("colores",), False),
+    "pixeles": ("modificar_pixeles_lote", ("xs", "ys", "colores"), False),
+    "filtro": ("aplicar_filtro", ("nombre",), False),
+    "tonos": ("ajustar_tonos", (), False),
+    "ecualizar": ("ecualizar_histograma", (), False),
+    "niveles_automaticos": ("niveles_automaticos", (), False),
+    "percentiles": ("estirar_percentiles", ("bajo", "alto"), False),
+    "transformar": ("transformar_pasos", ("pasos",), False),
+}
+
+EXTENSIONES_IMAGEN = {".png", ".jpg", ".jpeg", ".bmp", ".gif", ".tif", ".tiff", ".webp"}
+
+
+def cargar_guion(ruta):
+    """
+    Lee y valida un guion de edición
+
+    Args:
+        ruta (str): Archivo .json, .yaml o .yml
+
+    Returns:
+        list: Operaciones (diccionarios con la clave "op")
+
+    Raises:
+        OSError: Si no se puede leer el archivo
+        ValueError: Si el guion no es JSON/YAML válido o alguna operación no lo es
+    """
+    with open(ruta, encoding="utf-8") as f:
+        if Path(ruta).suffix.lower() in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("Para leer guiones YAML hace falta instalar PyYAML")
+            try:
+                guion = yaml.safe_load(f)
+            except yaml.YAMLError as e:
+                raise ValueError(f"YAML no válido: {e}") from e
+        else:
+            guion = json.load(f)
+
+    operaciones = guion.get("operaciones") if isinstance(guion, dict) else guion
+    if not isinstance(operaciones, list):
+        raise ValueError("El guion debe ser una lista de operaciones")
+
+    for i, operacion in enumerate(operaciones):
+        nombre = operacion.get("op") if isinstance(operacion, dict) else None
+        if nombre not in OPERACIONES:
+            raise ValueError(f"Operación {i}: '{nombre}' no es válida "
+                             f"(disponibles: {', '.join(sorted(OPERACIONES))})")
+        _, posicionales, usa_color = OPERACIONES[nombre]
+        faltan = [p for p in posicionales if p not in operacion]
+        if usa_color and "color" not in operacion:
+            faltan.append("color")
+        if faltan:
+            raise ValueError(f"Operación {i} ({nombre}): faltan {', '.join(faltan)}")
+    return operaciones
+
+
+def aplicar_operacion(handler, operacion):
+    """
+    Ejecuta una operación del guion sobre un ImageHandler
+
+    Returns:
+        tuple: (bool, str) - (éxito, mensaje)
+    """
+    metodo, posicionales, usa_color = OPERACIONES[operacion["op"]]
+    args = [operacion[p] for p in posicionales]
+    if usa_color:
+        args.extend(operacion["color"])
+    kwargs = {k: v for k, v in operacion.items()
+              if k not in posicionales and k not in ("op", "color")}
+    return getattr(handler, metodo)(*args, **kwargs)
+
+
+def procesar_imagen(ruta_entrada, ruta_salida, operaciones):
+    """
+    Carga una imagen, le aplica el guion y la guarda (se ejecuta en un proceso hijo)
+
+    Returns:
+        tuple: (ruta_entrada, éxito, mensaje)
+    """
+    handler = ImageHandler()
+    try:
+        exito, mensaje = handler.cargar_imagen(ruta_entrada)
+        if not exito:
+            return ruta_entrada, False, mensaje
+
+        for i, operacion in enumerate(operaciones):
+            exito, mensaje = aplicar_operacion(handler, operacion)
+            if not exito:
+                return ruta_entrada, False, f"Operación {i} ({operacion['op']}): {mensaje}"
+
+        exito, mensaje = handler.guardar_imagen(ruta_salida)
+        return ruta_entrada, exito, ruta_salida if exito else mensaje
+    finally:
+        handler.cerrar()
+
+
+def _base_de_patron(patron):
+    """Parte fija de un patrón glob (la carpeta anterior al primer comodín)"""
+    partes = Path(patron).parts
+    fijas = []
+    for parte in partes[:-1]:
+        if glob.has_magic(parte):
+            break
+        fijas.append(parte)
+    return Path(*fijas) if fijas else Path()
+
+
+def buscar_imagenes(entradas):
+    """
+    Expande carpetas y patrones glob a una lista ordenada de archivos de imagen
+
+    Args:
+        entradas (list): Carpetas, archivos o patrones glob
+
+    Yields:
+        tuple: (ruta, relativa) de cada imagen (sin repetir); relativa es la
+            ruta desde la carpeta de la entrada o desde la parte fija del
+            patrón (p. ej. "a/x.png" para "fotos/**/*.png"), que se reproduce
+            en la salida
+    """
+    vistas = set()
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            base = Path(entrada)
+            candidatas = sorted(str(p) for p in base.iterdir()
+                                if p.suffix.lower() in EXTENSIONES_IMAGEN)
+        else:
+            base = _base_de_patron(entrada)
+            candidatas = sorted(glob.glob(entrada, recursive=True))
+        for ruta in candidatas:
+            if os.path.isfile(ruta) and ruta not in vistas:
+                vistas.add(ruta)
+                yield ruta, str(Path(ruta).relative_to(base))
+
+
+def ruta_de_salida(ruta_entrada, directorio_salida, extension=None, relativa=None):
+    """
+    Ruta de salida con el mismo nombre (y opcionalmente otra extensión)
+
+    Args:
+        ruta_entrada (str): Imagen de entrada
+        directorio_salida (str): Carpeta de salida
+        extension (str): Extensión de salida (por defecto, la de entrada)
+        relativa (str): Ruta relativa de la entrada que se reproduce dentro de
+            la carpeta de salida (por defecto, solo el nombre)
+    """
+    relativa = Path(relativa or Path(ruta_entrada).name)
+    return str(Path(directorio_salida) / relativa.with_suffix(extension or relativa.suffix))
+
+
+def _sin_repetir(salida, usadas):
+    """
+    Añade _2, _3... al nombre si otra imagen del lote ya escribe en esa ruta
+
+    Args:
+        salida (str): Ruta de salida propuesta
+        usadas (set): Rutas de salida ya asignadas (se añade la elegida)
+    """
+    ruta = Path(salida)
+    clave = os.path.normcase(os.path.abspath(ruta))
+    n = 1
+    while clave in usadas:
+        n += 1
+        ruta = Path(salida).with_stem(f"{Path(salida).stem}_{n}")
+        clave = os.path.normcase(os.path.abspath(ruta))
+    usadas.add(clave)
+    return str(ruta)
+
+
+def procesar_lote(operaciones, rutas, directorio_salida, procesos=None,
+                  max_en_vuelo=None, extension=None, informar=print):
+    """
+    Procesa las imágenes en paralelo con un número acotado de imágenes en curso
+
+    Args:
+        operaciones (list): Guion ya validado
+        rutas (iterable): Rutas de las imágenes de entrada, o pares (ruta,
+            relativa) como los de buscar_imagenes para reproducir las carpetas;
+            si dos entradas acaban en la misma salida, la segunda se renombra
+        directorio_salida (str): Carpeta donde se escriben los resultados
+        procesos (int): Procesos del pool (por defecto, uno por núcleo)
+        max_en_vuelo (int): Imágenes enviadas al pool a la vez (por defecto 2 por proceso)
+        extension (str): Extensión de salida (por defecto, la de entrada)
+        informar (callable): Recibe una línea de texto por cada imagen terminada
+
+    Returns:
+        tuple: (correctas, fallidas)
+    """
+    os.makedirs(directorio_salida, exist_ok=True)
+    procesos = procesos or os.cpu_count() or 1
+    max_en_vuelo = max_en_vuelo or 2 * procesos
+    correctas = fallidas = 0
+    entrada_de = {}   # futuro -> ruta de entrada (para informar si el proceso falla)
+    usadas = set()    # Rutas de salida ya asignadas (para no sobrescribir)
+
+    def recoger(terminadas):
+        nonlocal correctas, fallidas
+        for futuro in terminadas:
+            try:
+                ruta, exito, mensaje = futuro.result()
+            except Exception as e:
+                ruta, exito, mensaje = entrada_de[futuro], False, str(e)
+            del entrada_de[futuro]
+            if exito:
+                correctas += 1
+                informar(f"✅ {ruta} -> {mensaje}")
+            else:
+                fallidas += 1
+                informar(f"❌ {ruta}: {mensaje}")
+
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        en_vuelo = set()
+        for ruta in rutas:
+            ruta, relativa = (ruta, None) if isinstance(ruta, str) else ruta
+            # No leer más entradas hasta que haya hueco: memoria acotada
+            if len(en_vuelo) >= max_en_vuelo:
+                terminadas, en_vuelo = wait(en_vuelo, return_when=FIRST_COMPLETED)
+                recoger(terminadas)
+            salida = _sin_repetir(ruta_de_salida(ruta, directorio_salida, extension, relativa),
+                                  usadas)
+            os.makedirs(os.path.dirname(salida), exist_ok=True)
+            futuro = pool.submit(procesar_imagen, ruta, salida, operaciones)
+            entrada_de[futuro] = ruta
+            en_vuelo.add(futuro)
+
+        while en_vuelo:
+            terminadas, en_vuelo = wait(en_vuelo, return_when=FIRST_COMPLETED)
+            recoger(terminadas)
+
+    return correctas, fallidas
+
+
+def main(argv=None):
+    """Punto de entrada de la línea de comandos"""
+    parser = argparse.ArgumentParser(
+        description="Aplica un guion de edición a muchas imágenes sin abrir la interfaz")
+    parser.add_argument("guion", help="Guion de edición (.json, .yaml o .yml)")
+    parser.add_argument("entradas", nargs="+", help="Carpetas, archivos o patrones glob")
+    parser.add_argument("-o", "--salida", required=True, help="Carpeta de salida")
+    parser.add_argument("-j", "--procesos", type=int, default=None,
+                        help="Procesos en paralelo (por defecto, uno por núcleo)")
+    parser.add_argument("--max-en-vuelo", type=int, default=None,
+                        help="Imágenes en proceso a la vez (por defecto, 2 por proceso)")
+    parser.add_argument("--formato", default=None,
+                        help="Extensión de salida, p. ej. .png (por defecto, la de entrada)")
+    args = parser.parse_args(argv)
+
+    try:
+        operaciones = cargar_guion(args.guion)
+    except (OSError, ValueError) as e:
+        print(f"Error en el guion: {e}", file=sys.stderr)
+        return 2
+
+    extension = args.formato
+    if extension and not extension.startswith("."):
+        extension = "." + extension
+
+    correctas, fallidas = procesar_lote(operaciones, buscar_imagenes(args.entradas),
+                                        args.salida, args.procesos,
+                                        args.max_en_vuelo, extension)
+    print(f"Terminado: {correctas} correctas, {fallidas} con errores")
+    return 1 if fallidas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
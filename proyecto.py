@@ -0,0 +1,187 @@
+"""
+Módulo de proyectos
+Formato nativo del editor: original, imagen actual (o solo la región que
+cambió respecto al original), historial de deshacer y metadatos en un único
+archivo sin comprimir. Tras una cabecera JSON, cada array empieza en un
+múltiplo de PROYECTO_ALINEACION bytes, así que al abrir se proyecta con
+memmap en lugar de decodificarse: abrir cuesta lo mismo con 1 MB que con
+1 GB y cada página se lee del disco la primera vez que se toca.
+
+Estructura del archivo:
+    MAGIA (8 bytes) | longitud de la cabecera (uint64) | cabecera JSON |
+    relleno | array 0 | relleno | array 1 | ...
+"""
+
+import json
+import os
+import struct
+import time
+import numpy as np
+import config
+from imagen_grande import filas_por_franja
+
+MAGIA = b"EDPROY\x00\x01"
+_LONGITUD = struct.Struct("<Q")
+VERSION = 1
+
+
+def _alinear(posicion):
+    """Primer múltiplo de PROYECTO_ALINEACION desde posicion"""
+    alineacion = config.PROYECTO_ALINEACION
+    return (posicion + alineacion - 1) // alineacion * alineacion
+
+
+def caja_diferencias(a, b):
+    """
+    Caja de los píxeles en que difieren dos imágenes de igual forma, franja a
+    franja (sin temporales del tamaño de la imagen)
+
+    Returns:
+        tuple: (x_min, y_min, x_max, y_max) o None si son iguales
+    """
+    alto, ancho = a.shape[:2]
+    filas = np.zeros(alto, dtype=bool)
+    columnas = np.zeros(ancho, dtype=bool)
+    paso = filas_por_franja(ancho)
+    for y in range(0, alto, paso):
+        distinto = np.any(a[y:y + paso] != b[y:y + paso], axis=2)
+        filas[y:y + paso] = distinto.any(axis=1)
+        columnas |= distinto.any(axis=0)
+    if not filas.any():
+        return None
+    ys, xs = np.flatnonzero(filas), np.flatnonzero(columnas)
+    return int(xs[0]), int(ys[0]), int(xs[-1]) + 1, int(ys[-1]) + 1
+
+
+# ========== CODIFICACIÓN DE PARÁMETROS ==========
+
+def codificar(valor, arrays):
+    """
+    Convierte un valor (p. ej. los parámetros de un comando) en JSON; los
+    arrays se añaden a arrays y se sustituyen por una referencia
+
+    Args:
+        valor: ndarray, tupla, lista, escalar de NumPy o valor JSON
+        arrays (dict): nombre -> ndarray (se amplía)
+    """
+    if isinstance(valor, np.ndarray):
+        nombre = f"a{len(arrays)}"
+        arrays[nombre] = valor
+        return {"array": nombre}
+    if isinstance(valor, tuple):
+        return {"tupla": [codificar(v, arrays) for v in valor]}
+    if isinstance(valor, list):
+        return [codificar(v, arrays) for v in valor]
+    if isinstance(valor, np.generic):
+        return valor.item()
+    return valor
+
+
+def decodificar(valor, arrays):
+    """Inversa de codificar: arrays es nombre -> array ya abierto"""
+    if isinstance(valor, dict):
+        if "array" in valor:
+            return arrays[valor["array"]]
+        return tuple(decodificar(v, arrays) for v in valor["tupla"])
+    if isinstance(valor, list):
+        return [decodificar(v, arrays) for v in valor]
+    return valor
+
+
+# ========== ESCRITURA Y LECTURA ==========
+
+def guardar(ruta, arrays, info):
+    """
+    Escribe un proyecto (en un temporal que luego sustituye al archivo)
+
+    Args:
+        ruta (str): Archivo de destino
+        arrays (dict): nombre -> ndarray (posiblemente memmap; se copia por franjas)
+        info (dict): Datos JSON de la cabecera (historial, metadatos...)
+    """
+    indice, desplazamiento = {}, 0
+    for nombre, array in arrays.items():
+        indice[nombre] = {"dtype": array.dtype.str, "forma": list(array.shape),
+                          "posicion": desplazamiento}
+        desplazamiento = _alinear(desplazamiento + array.nbytes)
+
+    cabecera = json.dumps(dict(info, version=VERSION, arrays=indice)).encode()
+    inicio_datos = _alinear(len(MAGIA) + _LONGITUD.size + len(cabecera))
+
+    temporal = ruta + ".tmp"
+    with open(temporal, "wb") as f:
+        f.write(MAGIA + _LONGITUD.pack(len(cabecera)) + cabecera)
+        for nombre, array in arrays.items():
+            f.seek(inicio_datos + indice[nombre]["posicion"])
+            if array.ndim == 0 or array.size == 0:
+                f.write(np.ascontiguousarray(array).tobytes())
+                continue
+            paso = max(1, config.TESELA_BYTES // max(1, array[0].nbytes))
+            for y in range(0, array.shape[0], paso):
+                f.write(np.ascontiguousarray(array[y:y + paso]).data)
+        # El último array puede no llegar al final de su bloque: fijar el tamaño
+        f.truncate(inicio_datos + desplazamiento)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+
+
+def abrir(ruta):
+    """
+    Lee la cabecera de un proyecto y proyecta sus arrays en memoria (solo lectura)
+
+    Args:
+        ruta (str): Archivo de proyecto
+
+    Returns:
+        tuple: (cabecera, arrays) con arrays nombre -> np.memmap de solo lectura
+
+    Raises:
+        ValueError: Si el archivo no es un proyecto o es de una versión posterior
+    """
+    with open(ruta, "rb") as f:
+        if f.read(len(MAGIA)) != MAGIA:
+            raise ValueError(config.MSG_ERROR_PROYECTO_FORMATO)
+        longitud, = _LONGITUD.unpack(f.read(_LONGITUD.size))
+        cabecera = json.loads(f.read(longitud))
+    if cabecera.get("version", 0) > VERSION:
+        raise ValueError(config.MSG_ERROR_PROYECTO_VERSION.format(cabecera.get("version")))
+
+    inicio_datos = _alinear(len(MAGIA) + _LONGITUD.size + longitud)
+    arrays = {}
+    for nombre, datos in cabecera["arrays"].items():
+        dtype, forma = np.dtype(datos["dtype"]), tuple(datos["forma"])
+        if 0 in forma or not forma:
+            # memmap no admite arrays vacíos ni escalares
+            arrays[nombre] = np.fromfile(ruta, dtype=dtype, count=int(np.prod(forma)),
+                                         offset=inicio_datos + datos["posicion"]).reshape(forma)
+            continue
+        arrays[nombre] = np.memmap(ruta, dtype=dtype, mode="r", shape=forma,
+                                   offset=inicio_datos + datos["posicion"])
+    return cabecera, arrays
+
+
+def mapear_copia(array):
+    """
+    Proyección copy-on-write de un array abierto con abrir(): se puede editar
+    y solo las páginas modificadas pasan a ocupar memoria (el archivo no cambia)
+
+    Args:
+        array (np.memmap): Array de solo lectura devuelto por abrir()
+
+    Returns:
+        ndarray: Array editable (ndarray normal, no memmap, para que cuente en
+            los presupuestos de memoria al copiarlo)
+    """
+    return np.asarray(np.memmap(array.filename, dtype=array.dtype, mode="c",
+                                shape=array.shape, offset=array.offset))
+
+
+def metadatos_basicos(ruta_origen, forma):
+    """Metadatos que se guardan con todo proyecto"""
+    return {
+        "creado": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "origen": ruta_origen,
+        "ancho": forma[1],
+        "alto": forma[0],
+    }
@@ -0,0 +1,246 @@
+"""
+Módulo de relleno por inundación
+Región conectada de píxeles parecidos a uno dado (bote de pintura y varita
+mágica) sin recorrer píxel a píxel en Python: la comparación de colores es
+vectorizada por franjas, cada fila se reduce a tramos de píxeles parecidos y
+la búsqueda avanza por niveles sobre los tramos, buscando de una vez con
+np.searchsorted los tramos de las filas vecinas que se solapan con los del
+frente actual. La misma comparación sirve para reemplazar un color en toda
+la imagen (sin exigir que los píxeles estén conectados)
+"""
+
+import numpy as np
+import config
+
+# Modo de tolerancia -> valor máximo admitido
+MODOS = {
+    "canal": 255,        # Cada canal difiere como mucho la tolerancia
+    "euclidea": 442,     # Distancia euclídea RGB (√(3·255²) ≈ 441,7)
+    "perceptual": 259,   # Diferencia ΔE76 en CIE Lab (máxima entre sRGB ≈ 258,7, azul-verde)
+}
+
+# Bytes de temporales por píxel de cada modo (para dimensionar las franjas)
+_BYTES_PIXEL = {"canal": 12, "euclidea": 12, "perceptual": 34}
+
+# sRGB (D65) -> XYZ, con cada fila ya dividida por el blanco de referencia
+_RGB_A_XYZ = (np.array([[0.4124, 0.3576, 0.1805],
+                        [0.2126, 0.7152, 0.0722],
+                        [0.0193, 0.1192, 0.9505]])
+              / np.array([[0.95047], [1.0], [1.08883]])).T.astype(np.float32)
+
+# Valor 0-255 -> intensidad lineal (deshace la curva gamma de sRGB)
+_LINEAL = np.arange(256) / 255.0
+_LINEAL = np.where(_LINEAL <= 0.04045, _LINEAL / 12.92,
+                   ((_LINEAL + 0.055) / 1.055) ** 2.4).astype(np.float32)
+
+
+def filas_por_franja(ancho, modo):
+    """Filas que se comparan de una vez sin pasar de RELLENO_BYTES_FRANJA"""
+    return max(1, config.RELLENO_BYTES_FRANJA // (ancho * _BYTES_PIXEL[modo]))
+
+
+def _f_lab(xyz):
+    """Función no lineal de CIE Lab, en el sitio"""
+    bajo = xyz <= (6 / 29) ** 3
+    lineal = xyz[bajo] / (3 * (6 / 29) ** 2) + 4 / 29
+    np.cbrt(xyz, out=xyz)
+    xyz[bajo] = lineal
+    return xyz
+
+
+def a_lab(bloque):
+    """
+    Convierte colores sRGB a CIE Lab
+
+    Args:
+        bloque (ndarray): (..., 3) uint8
+
+    Returns:
+        ndarray: (..., 3) float32 con L, a, b
+    """
+    f = _f_lab(_LINEAL[bloque] @ _RGB_A_XYZ)
+    lab = np.empty_like(f)
+    lab[..., 0] = 116 * f[..., 1] - 16
+    lab[..., 1] = 500 * (f[..., 0] - f[..., 1])
+    lab[..., 2] = 200 * (f[..., 1] - f[..., 2])
+    return lab
+
+
+def parecidos(bloque, color, tolerancia, modo="canal", out=None):
+    """
+    Píxeles de un bloque cuyo color está dentro de la tolerancia
+
+    Args:
+        bloque (ndarray): Píxeles (alto x ancho x 3, uint8); conviene que sea
+            una franja (ver filas_por_franja)
+        color (tuple): (r, g, b) de referencia
+        tolerancia (int): Diferencia máxima (ver MODOS)
+        modo (str): "canal", "euclidea" o "perceptual"
+        out (ndarray): Máscara booleana donde escribir (opcional)
+
+    Returns:
+        ndarray: Máscara booleana (alto x ancho)
+    """
+    if modo == "perceptual":
+        diferencia = a_lab(bloque)
+        diferencia -= a_lab(np.asarray(color, dtype=np.uint8))
+        cuadrado = np.einsum("ijk,ijk->ij", diferencia, diferencia)
+        return np.less_equal(cuadrado, np.float32(tolerancia) ** 2, out=out)
+
+    diferencia = bloque.astype(np.int16)
+    diferencia -= np.asarray(color, dtype=np.int16)
+    if modo == "canal":
+        np.abs(diferencia, out=diferencia)
+        return np.all(diferencia <= tolerancia, axis=2, out=out)
+    cuadrado = np.einsum("ijk,ijk->ij", diferencia, diferencia, dtype=np.int32)
+    return np.less_equal(cuadrado, tolerancia * tolerancia, out=out)
+
+
+def mascara_parecidos(img_array, color, tolerancia, modo="canal"):
+    """
+    Píxeles cuyo color está dentro de la tolerancia, franja a franja
+
+    Args:
+        img_array (ndarray): Imagen (alto x ancho x 3, uint8), posiblemente un memmap
+        color (tuple): (r, g, b) de referencia
+        tolerancia (int): Diferencia máxima (ver MODOS)
+        modo (str): "canal", "euclidea" o "perceptual"
+
+    Returns:
+        ndarray: Máscara booleana (alto x ancho)
+    """
+    alto, ancho = img_array.shape[:2]
+    dentro = np.empty((alto, ancho), dtype=bool)
+    paso = filas_por_franja(ancho, modo)
+    for y in range(0, alto, paso):
+        parecidos(img_array[y:y + paso], color, tolerancia, modo, out=dentro[y:y + paso])
+    return dentro
+
+
+def reemplazar_color(destino, origen, tolerancia, modo, color, mascara=None):
+    """
+    Pinta en su sitio los píxeles parecidos a un color, estén donde estén,
+    franja a franja (los temporales no pasan de RELLENO_BYTES_FRANJA)
+
+    Args:
+        destino (ndarray): Imagen o recorte (alto x ancho x 3, uint8)
+        origen (tuple): (r, g, b) que se busca
+        tolerancia (int): Diferencia máxima (ver MODOS)
+        modo (str): "canal", "euclidea" o "perceptual"
+        color (tuple): (r, g, b) nuevo
+        mascara (ndarray): Máscara booleana del tamaño de destino que limita
+            los píxeles candidatos, o None
+
+    Returns:
+        int: Número de píxeles pintados
+    """
+    alto, ancho = destino.shape[:2]
+    color = np.asarray(color, dtype=np.uint8)
+    contador = 0
+    paso = filas_por_franja(ancho, modo)
+    for y in range(0, alto, paso):
+        franja = destino[y:y + paso]
+        dentro = parecidos(franja, origen, tolerancia, modo)
+        if mascara is not None:
+            dentro &= mascara[y:y + paso]
+        franja[dentro] = color
+        contador += int(np.count_nonzero(dentro))
+    return contador
+
+
+def _tramos(dentro):
+    """
+    Tramos horizontales de píxeles activos, en orden de fila y columna
+
+    Returns:
+        tuple: (fila, inicio, fin) arrays int64 con fin exclusivo
+    """
+    alto, ancho = dentro.shape
+    borde = np.zeros((alto, 1), dtype=np.int8)
+    cambios = np.diff(np.hstack((borde, dentro.view(np.int8), borde)), axis=1)
+    filas, inicios = np.nonzero(cambios == 1)
+    _, fines = np.nonzero(cambios == -1)
+    return filas.astype(np.int64), inicios.astype(np.int64), fines.astype(np.int64)
+
+
+def region_conectada(dentro, x, y, conexion=4):
+    """
+    Región conectada de la máscara que contiene (x, y)
+
+    Args:
+        dentro (ndarray): Máscara booleana de píxeles admitidos
+        x, y (int): Semilla (debe estar dentro de la máscara)
+        conexion (int): 4 (solo vecinos en cruz) u 8 (también en diagonal)
+
+    Returns:
+        tuple: (x_min, y_min, mascara) con la máscara recortada a la región
+    """
+    alto, ancho = dentro.shape
+    filas, inicios, fines = _tramos(dentro)
+
+    # Claves ordenadas (fila, columna) en un solo entero para buscar en todas las filas a la vez
+    clave = ancho + 2
+    claves_inicio = filas * clave + inicios
+    claves_fin = filas * clave + fines
+    holgura = 1 if conexion == 8 else 0
+
+    semilla = np.searchsorted(claves_inicio, y * clave + x, side="right") - 1
+    visitado = np.zeros(len(filas), dtype=bool)
+    turno = np.empty(len(filas), dtype=np.int64)
+    visitado[semilla] = True
+    frente = np.array([semilla])
+
+    while len(frente):
+        vecinos = []
+        for desplazamiento in (-1, 1):
+            fila = filas[frente] + desplazamiento
+            valida = (fila >= 0) & (fila < alto)
+            base = fila[valida] * clave
+            # Tramos de la fila vecina que se solapan con [inicio - holgura, fin + holgura)
+            desde = np.searchsorted(claves_fin, base + inicios[frente][valida] - holgura, side="right")
+            hasta = np.searchsorted(claves_inicio, base + fines[frente][valida] + holgura, side="left")
+            cuantos = np.maximum(hasta - desde, 0)
+            if cuantos.sum() == 0:
+                continue
+            # Expandir cada rango [desde, hasta) en índices sueltos
+            salto = np.repeat(desde - np.cumsum(cuantos) + cuantos, cuantos)
+            vecinos.append(salto + np.arange(cuantos.sum()))
+        if not vecinos:
+            break
+        nuevos = np.concatenate(vecinos)
+        nuevos = nuevos[~visitado[nuevos]]
+        # Quitar repetidos sin ordenar: de cada índice sobrevive su última aparición
+        orden = np.arange(len(nuevos))
+        turno[nuevos] = orden
+        frente = nuevos[turno[nuevos] == orden]
+        visitado[frente] = True
+
+    filas, inicios, fines = filas[visitado], inicios[visitado], fines[visitado]
+    x_min, y_min = int(inicios.min()), int(filas.min())
+    x_max, y_max = int(fines.max()), int(filas.max()) + 1
+
+    # Marcar +1 al empezar cada tramo y -1 al acabar; la suma acumulada da la máscara
+    marcas = np.zeros((y_max - y_min, x_max - x_min + 1), dtype=np.int8)
+    marcas[filas - y_min, inicios - x_min] = 1
+    marcas[filas - y_min, fines - x_min] = -1
+    mascara = np.cumsum(marcas, axis=1, dtype=np.int8)[:, :-1].astype(bool)
+    return x_min, y_min, mascara
+
+
+def inundar(img_array, x, y, tolerancia, modo="canal", conexion=4):
+    """
+    Región conectada de píxeles parecidos al de (x, y)
+
+    Args:
+        img_array (ndarray): Imagen (alto x ancho x 3)
+        x, y (int): Píxel de partida
+        tolerancia (int): Diferencia máxima de color (ver MODOS)
+        modo (str): "canal", "euclidea" o "perceptual"
+        conexion (int): 4 u 8
+
+    Returns:
+        tuple: (x_min, y_min, mascara) de la región
+    """
+    color = img_array[y, x].tolist()
+    dentro = mascara_parecidos(img_array, color, tolerancia, modo)
+    return region_conectada(dentro, x, y, conexion)
@@ -0,0 +1,47 @@
+"""
+Pruebas del historial con imágenes mayores que su presupuesto de memoria
+(ejecutar con: python -m pytest test_historial.py)
+"""
+
+import numpy as np
+from PIL import Image
+from image_handler import ImageHandler
+
+
+def _handler(tmp_path, max_bytes):
+    """Manejador con una imagen aleatoria de 600 x 400 (720 KB) y un historial de max_bytes"""
+    imagen = np.random.default_rng(0).integers(0, 256, (400, 600, 3), dtype=np.uint8)
+    ruta = tmp_path / "grande.png"
+    Image.fromarray(imagen).save(ruta)
+    handler = ImageHandler()
+    exito, mensaje = handler.cargar_imagen(str(ruta))
+    assert exito, mensaje
+    handler.historial.max_bytes = max_bytes
+    return handler
+
+
+def test_deshacer_no_se_vacia_con_imagen_mayor_que_el_presupuesto(tmp_path):
+    handler = _handler(tmp_path, 256 * 1024)
+    for i in range(100):
+        handler.modificar_pixel(i, i, 255, 0, 0)
+        assert len(handler.historial) == i + 1
+    assert handler.historial.bytes_usados <= handler.historial.max_bytes
+
+    for i in reversed(range(100)):
+        assert handler.deshacer()
+        assert tuple(handler.img_array[i, i]) == tuple(handler.img_original[i, i])
+    assert np.array_equal(handler.img_array, handler.img_original)
+
+
+def test_presupuesto_acotado_con_ediciones_grandes(tmp_path):
+    handler = _handler(tmp_path, 256 * 1024)
+    for i in range(20):
+        exito, mensaje = handler.aplicar_filtro("gaussiano", sigma=1.0)
+        assert exito, mensaje
+        assert handler.historial.bytes_usados <= handler.historial.max_bytes
+        assert len(handler.historial) > 0
+
+    esperada = handler.img_array.copy()
+    assert handler.deshacer()
+    assert handler.rehacer()
+    assert np.array_equal(handler.img_array, esperada)
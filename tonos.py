@@ -0,0 +1,117 @@
+"""
+Módulo de ajustes de tono
+Brillo, contraste, gamma, niveles y curvas como tablas de consulta (LUT) de
+256 entradas por canal. Los ajustes se componen en una sola tabla, así que
+la imagen se recorre una única vez por muchos que se combinen
+"""
+
+import numpy as np
+import config
+
+
+def lut_identidad():
+    """LUT (3 x 256, uint8) que deja la imagen igual"""
+    return np.tile(np.arange(256, dtype=np.uint8), (3, 1))
+
+
+def es_identidad(lut):
+    """True si la LUT no cambia ningún valor"""
+    return np.array_equal(lut, lut_identidad())
+
+
+def _validar(nombre, valor, minimo, maximo):
+    """Lanza ValueError si un parámetro está fuera de rango"""
+    if not minimo <= valor <= maximo:
+        raise ValueError(config.MSG_ERROR_PARAMETRO_RANGO.format(nombre, minimo, maximo))
+
+
+def construir_lut(brillo=0, contraste=1.0, gamma=1.0, negro=0, blanco=255, curva=None):
+    """
+    Compone todos los ajustes en una LUT
+
+    Se aplican en orden niveles, brillo, contraste, gamma y curva. Los valores
+    intermedios se mantienen reales (recortados a 0-255 tras cada ajuste, como
+    si se aplicaran uno detrás de otro) y se redondean una sola vez al final.
+
+    Args:
+        brillo (float): Desplazamiento de -255 a 255
+        contraste (float): Factor alrededor del gris medio (1 = sin cambio)
+        gamma (float): Corrección gamma (>1 aclara los medios tonos)
+        negro, blanco (int): Niveles de entrada que pasan a 0 y a 255
+        curva (list): Puntos (entrada, salida) de una curva por tramos lineales
+
+    Returns:
+        ndarray: LUT (3 x 256, uint8), igual para los tres canales
+    """
+    _validar("brillo", brillo, -255, 255)
+    _validar("contraste", contraste, 0, config.TONO_CONTRASTE_MAX)
+    _validar("gamma", gamma, config.TONO_GAMMA_MIN, config.TONO_GAMMA_MAX)
+    _validar("negro", negro, 0, 254)
+    _validar("blanco", blanco, negro + 1, 255)
+
+    v = np.arange(256, dtype=np.float64)
+    if (negro, blanco) != (0, 255):
+        v = np.clip((v - negro) * (255.0 / (blanco - negro)), 0, 255)
+    if brillo:
+        v = np.clip(v + brillo, 0, 255)
+    if contraste != 1.0:
+        v = np.clip((v - 127.5) * contraste + 127.5, 0, 255)
+    if gamma != 1.0:
+        v = 255.0 * (v / 255.0) ** (1.0 / gamma)
+    if curva:
+        puntos = sorted((float(x), float(y)) for x, y in curva)
+        for x, y in puntos:
+            _validar("curva", x, 0, 255)
+            _validar("curva", y, 0, 255)
+        v = np.interp(v, [p[0] for p in puntos], [p[1] for p in puntos])
+
+    return np.tile(np.rint(v).astype(np.uint8), (3, 1))
+
+
+def componer_luts(*luts):
+    """
+    Combina varias LUT en una que equivale a aplicarlas en orden
+
+    Returns:
+        ndarray: LUT (3 x 256, uint8)
+    """
+    resultado = lut_identidad()
+    for lut in luts:
+        resultado = np.take_along_axis(lut, resultado.astype(np.intp), axis=1)
+    return resultado
+
+
+def aplicar_lut(img_array, lut, salida=None):
+    """
+    Aplica una LUT con np.take, franja a franja
+
+    Los índices se convierten a enteros de máquina dentro de cada franja, así
+    que el temporal cabe en caché en lugar de ocupar 8 bytes por valor de toda
+    la imagen. Si los tres canales comparten tabla basta un np.take por franja.
+
+    Args:
+        img_array (ndarray): Imagen o recorte (alto x ancho x 3, uint8)
+        lut (ndarray): LUT (3 x 256, uint8)
+        salida (ndarray): Destino de igual forma (puede ser img_array); por
+            defecto se crea uno nuevo
+
+    Returns:
+        ndarray: salida
+    """
+    if salida is None:
+        salida = np.empty_like(img_array)
+    alto, ancho = img_array.shape[:2]
+    if alto == 0 or ancho == 0:
+        return salida
+
+    compartida = bool((lut == lut[0]).all())
+    paso = max(1, config.TONO_BYTES_FRANJA // (ancho * 3 * np.dtype(np.intp).itemsize))
+    for y in range(0, alto, paso):
+        origen = img_array[y:y + paso]
+        destino = salida[y:y + paso]
+        if compartida:
+            np.take(lut[0], origen, out=destino, mode="clip")
+        else:
+            for canal in range(3):
+                np.take(lut[canal], origen[..., canal], out=destino[..., canal], mode="clip")
+    return salida
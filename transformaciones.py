@@ -0,0 +1,319 @@
+"""
+Módulo de transformaciones geométricas
+Rotación, escala, cizalla, volteos, traslación y perspectiva como matrices
+homogéneas 3x3. Las transformaciones se encadenan multiplicando matrices y
+la imagen se remuestrea una sola vez, por franjas de filas, con mapeo inverso
+(cada píxel de salida busca su origen), así que encadenar varias no acumula
+pérdidas de interpolación
+
+Coordenadas continuas: el píxel (fila i, columna j) ocupa [j, j + 1) x [i, i + 1)
+y su centro es (j + 0.5, i + 0.5); una imagen de ancho x alto cubre [0, ancho] x [0, alto].
+"""
+
+import math
+import numpy as np
+import config
+
+
+INTERPOLACIONES = ("vecino", "bilineal", "bicubica")
+
+
+# ========== MATRICES ==========
+
+def identidad():
+    """Matriz que no transforma nada"""
+    return np.eye(3)
+
+
+def traslacion(tx, ty):
+    """Desplaza (tx, ty) píxeles"""
+    return np.array([[1.0, 0.0, tx], [0.0, 1.0, ty], [0.0, 0.0, 1.0]])
+
+
+def _alrededor(matriz, centro):
+    """Aplica una matriz tomando centro como origen"""
+    cx, cy = centro
+    return traslacion(cx, cy) @ matriz @ traslacion(-cx, -cy)
+
+
+def escala(sx, sy=None, centro=(0.0, 0.0)):
+    """Escala sx en horizontal y sy (por defecto sx) en vertical"""
+    sy = sx if sy is None else sy
+    if sx == 0 or sy == 0:
+        raise ValueError(config.MSG_ERROR_TRANSFORMACION_SINGULAR)
+    return _alrededor(np.diag([float(sx), float(sy), 1.0]), centro)
+
+
+def rotacion(grados, centro=(0.0, 0.0)):
+    """Gira grados en sentido antihorario (tal como se ve en pantalla, con y hacia abajo)"""
+    radianes = math.radians(grados)
+    c, s = math.cos(radianes), math.sin(radianes)
+    # Los múltiplos de 90° quedan exactos (sin restos de coma flotante)
+    c, s = round(c, 15), round(s, 15)
+    return _alrededor(np.array([[c, s, 0.0], [-s, c, 0.0], [0.0, 0.0, 1.0]]), centro)
+
+
+def cizalla(kx, ky=0.0, centro=(0.0, 0.0)):
+    """Inclina: x += kx·y, y += ky·x"""
+    if kx * ky == 1:
+        raise ValueError(config.MSG_ERROR_TRANSFORMACION_SINGULAR)
+    return _alrededor(np.array([[1.0, kx, 0.0], [ky, 1.0, 0.0], [0.0, 0.0, 1.0]]), centro)
+
+
+def volteo_horizontal(ancho):
+    """Espejo izquierda-derecha de una imagen de ese ancho"""
+    return np.array([[-1.0, 0.0, ancho], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]])
+
+
+def volteo_vertical(alto):
+    """Espejo arriba-abajo de una imagen de ese alto"""
+    return np.array([[1.0, 0.0, 0.0], [0.0, -1.0, alto], [0.0, 0.0, 1.0]])
+
+
+def perspectiva(origen, destino):
+    """
+    Homografía que lleva cuatro puntos a otros cuatro
+
+    Args:
+        origen, destino (list): Cuatro puntos (x, y) cada uno
+
+    Returns:
+        ndarray: Matriz 3x3 con el elemento [2, 2] igual a 1
+    """
+    origen = np.asarray(origen, dtype=np.float64)
+    destino = np.asarray(destino, dtype=np.float64)
+    if origen.shape != (4, 2) or destino.shape != (4, 2):
+        raise ValueError(config.MSG_ERROR_PERSPECTIVA)
+
+    # Dos ecuaciones lineales por pareja de puntos, ocho incógnitas
+    sistema = np.zeros((8, 8))
+    terminos = np.zeros(8)
+    for i, ((x, y), (u, v)) in enumerate(zip(origen, destino)):
+        sistema[2 * i] = [x, y, 1, 0, 0, 0, -u * x, -u * y]
+        sistema[2 * i + 1] = [0, 0, 0, x, y, 1, -v * x, -v * y]
+        terminos[2 * i] = u
+        terminos[2 * i + 1] = v
+    try:
+        h = np.linalg.solve(sistema, terminos)
+    except np.linalg.LinAlgError:
+        raise ValueError(config.MSG_ERROR_PERSPECTIVA)
+    return np.append(h, 1.0).reshape(3, 3)
+
+
+def componer(*matrices):
+    """
+    Une varias transformaciones en una sola matriz
+
+    Args:
+        *matrices: Matrices 3x3 en el orden en que se aplican
+
+    Returns:
+        ndarray: Producto equivalente (la última por la izquierda)
+    """
+    resultado = identidad()
+    for matriz in matrices:
+        resultado = np.asarray(matriz, dtype=np.float64) @ resultado
+    return resultado
+
+
+def matriz_desde_pasos(pasos, ancho, alto):
+    """
+    Construye una matriz a partir de una lista de pasos con nombre, tomando
+    el centro de la imagen como origen de giros, escalas y cizallas
+
+    Args:
+        pasos (list): Diccionarios de una clave, p. ej. {"rotar": 30},
+            {"escalar": [1.5, 1.5]}, {"cizalla": [0.2, 0]}, {"voltear": "horizontal"},
+            {"trasladar": [10, 0]} o {"perspectiva": {"origen": [...], "destino": [...]}}
+        ancho, alto (int): Dimensiones de la imagen
+
+    Returns:
+        ndarray: Matriz 3x3 compuesta
+    """
+    centro = (ancho / 2.0, alto / 2.0)
+    matrices = []
+    for paso in pasos:
+        if len(paso) != 1:
+            raise ValueError(config.MSG_ERROR_PASO_TRANSFORMACION.format(paso))
+        (nombre, valor), = paso.items()
+        if nombre == "rotar":
+            matrices.append(rotacion(valor, centro))
+        elif nombre == "escalar":
+            sx, sy = valor if isinstance(valor, (list, tuple)) else (valor, valor)
+            matrices.append(escala(sx, sy, centro))
+        elif nombre == "cizalla":
+            kx, ky = valor if isinstance(valor, (list, tuple)) else (valor, 0.0)
+            matrices.append(cizalla(kx, ky, centro))
+        elif nombre == "voltear" and valor == "horizontal":
+            matrices.append(volteo_horizontal(ancho))
+        elif nombre == "voltear" and valor == "vertical":
+            matrices.append(volteo_vertical(alto))
+        elif nombre == "trasladar":
+            matrices.append(traslacion(*valor))
+        elif nombre == "perspectiva":
+            matrices.append(perspectiva(valor["origen"], valor["destino"]))
+        else:
+            raise ValueError(config.MSG_ERROR_PASO_TRANSFORMACION.format(paso))
+    return componer(*matrices)
+
+
+def ajustar_lienzo(matriz, ancho, alto):
+    """
+    Desplaza una transformación para que la imagen transformada empiece en
+    (0, 0) y calcula el tamaño que la contiene entera
+
+    Returns:
+        tuple: (matriz desplazada, ancho, alto)
+    """
+    if abs(np.linalg.det(matriz)) < 1e-12:
+        raise ValueError(config.MSG_ERROR_TRANSFORMACION_SINGULAR)
+    esquinas = np.array([[0, 0, 1], [ancho, 0, 1], [0, alto, 1], [ancho, alto, 1]], dtype=np.float64)
+    destino = esquinas @ np.asarray(matriz, dtype=np.float64).T
+    if (destino[:, 2] <= 0).any():
+        # Alguna esquina cruza el horizonte de la perspectiva
+        raise ValueError(config.MSG_ERROR_PERSPECTIVA)
+    xs = destino[:, 0] / destino[:, 2]
+    ys = destino[:, 1] / destino[:, 2]
+
+    # Tolerancia para que 90° o un volteo no ganen una fila por redondeo
+    x_min, y_min = math.floor(xs.min() + 1e-6), math.floor(ys.min() + 1e-6)
+    x_max, y_max = math.ceil(xs.max() - 1e-6), math.ceil(ys.max() - 1e-6)
+    return traslacion(-x_min, -y_min) @ matriz, max(1, x_max - x_min), max(1, y_max - y_min)
+
+
+# ========== REMUESTREO ==========
+
+def _es_permutacion(inversa):
+    """
+    True si cada píxel de salida cae justo en el centro de un píxel de origen
+    (volteos, giros de 90° y traslaciones enteras): basta copiar, sin interpolar
+    """
+    lineal = inversa[:2, :2]
+    if inversa[2, 0] != 0 or inversa[2, 1] != 0 or inversa[2, 2] != 1:
+        return False
+    if not np.array_equal(lineal, np.rint(lineal)) or abs(np.linalg.det(lineal)) != 1:
+        return False
+    if np.abs(lineal).sum() != 2:
+        return False
+    # Origen del primer centro en coordenadas de índice
+    origen = inversa @ np.array([0.5, 0.5, 1.0]) - np.array([0.5, 0.5, 0.0])
+    return np.allclose(origen[:2], np.rint(origen[:2]), atol=1e-9)
+
+
+def _pesos_bicubicos(t):
+    """Pesos de Keys (a = -0.5) para los cuatro vecinos -1, 0, 1, 2 de la posición fraccionaria t"""
+    a = -0.5
+    pesos = []
+    for d in (t + 1, t, 1 - t, 2 - t):
+        d = np.abs(d)
+        cerca = ((a + 2) * d - (a + 3)) * d * d + 1
+        lejos = ((a * d - 5 * a) * d + 8 * a) * d - 4 * a
+        pesos.append(np.where(d <= 1, cerca, lejos).astype(np.float32))
+    return pesos
+
+
+def _muestrear(plano, ancho, alto, u, v, interpolacion):
+    """
+    Lee la imagen en posiciones reales (coordenadas de índice)
+
+    Args:
+        plano (ndarray): Imagen aplanada ((alto · ancho) x 3, uint8)
+        ancho, alto (int): Dimensiones de la imagen de origen
+        u, v (ndarray): Columnas y filas de origen (float64)
+        interpolacion (str): Uno de INTERPOLACIONES
+
+    Returns:
+        ndarray: Valores float32 o uint8 (... x 3)
+    """
+    if interpolacion == "vecino":
+        xs = np.clip(np.floor(u + 0.5).astype(np.intp), 0, ancho - 1)
+        ys = np.clip(np.floor(v + 0.5).astype(np.intp), 0, alto - 1)
+        return np.take(plano, ys * ancho + xs, axis=0)
+
+    x0 = np.floor(u)
+    y0 = np.floor(v)
+    fx = (u - x0).astype(np.float32)[..., None]
+    fy = (v - y0).astype(np.float32)[..., None]
+    x0 = x0.astype(np.intp)
+    y0 = y0.astype(np.intp)
+
+    if interpolacion == "bilineal":
+        desplazamientos = (0, 1)
+        pesos_x = [1 - fx, fx]
+        pesos_y = [1 - fy, fy]
+    else:
+        desplazamientos = (-1, 0, 1, 2)
+        pesos_x = _pesos_bicubicos(fx)
+        pesos_y = _pesos_bicubicos(fy)
+
+    columnas = [np.clip(x0 + d, 0, ancho - 1) for d in desplazamientos]
+    resultado = None
+    for dy, peso_y in zip(desplazamientos, pesos_y):
+        fila = np.clip(y0 + dy, 0, alto - 1) * ancho
+        linea = None
+        for columna, peso_x in zip(columnas, pesos_x):
+            termino = np.take(plano, fila + columna, axis=0) * peso_x
+            linea = termino if linea is None else linea + termino
+        linea *= peso_y
+        resultado = linea if resultado is None else resultado + linea
+    return resultado
+
+
+def remuestrear(img_array, matriz, ancho, alto, interpolacion="bilineal",
+                fondo=(255, 255, 255), salida=None):
+    """
+    Genera la imagen transformada con una sola pasada de mapeo inverso
+
+    Args:
+        img_array (ndarray): Imagen de origen (alto x ancho x 3, uint8)
+        matriz (ndarray): Transformación 3x3 de origen a destino
+        ancho, alto (int): Dimensiones de la salida
+        interpolacion (str): 'vecino', 'bilineal' o 'bicubica'
+        fondo (tuple): Color RGB de las zonas sin origen
+        salida (ndarray): Destino (alto x ancho x 3), p. ej. un memmap; por defecto
+            se crea en memoria
+
+    Returns:
+        ndarray: Imagen transformada (uint8)
+    """
+    if interpolacion not in INTERPOLACIONES:
+        raise ValueError(config.MSG_ERROR_INTERPOLACION.format(interpolacion, ", ".join(INTERPOLACIONES)))
+    try:
+        inversa = np.linalg.inv(np.asarray(matriz, dtype=np.float64))
+    except np.linalg.LinAlgError:
+        raise ValueError(config.MSG_ERROR_TRANSFORMACION_SINGULAR)
+    if _es_permutacion(inversa):
+        interpolacion = "vecino"
+
+    alto_origen, ancho_origen = img_array.shape[:2]
+    plano = img_array.reshape(-1, 3)
+    if salida is None:
+        salida = np.empty((alto, ancho, 3), dtype=np.uint8)
+    fondo = np.asarray(fondo, dtype=np.uint8)
+
+    # Centros de las columnas de salida; las filas se recorren por franjas
+    xs = np.arange(ancho, dtype=np.float64) + 0.5
+    paso = max(1, config.TRANSFORMACION_BYTES_FRANJA // (ancho * config.TRANSFORMACION_BYTES_PIXEL))
+    proyectiva = not np.array_equal(inversa[2], [0.0, 0.0, 1.0])
+
+    for y in range(0, alto, paso):
+        ys = (np.arange(y, min(alto, y + paso), dtype=np.float64) + 0.5)[:, None]
+        u = inversa[0, 0] * xs + inversa[0, 1] * ys + inversa[0, 2]
+        v = inversa[1, 0] * xs + inversa[1, 1] * ys + inversa[1, 2]
+        if proyectiva:
+            w = inversa[2, 0] * xs + inversa[2, 1] * ys + inversa[2, 2]
+            u /= w
+            v /= w
+        # Pasar a coordenadas de índice (el centro del píxel (0, 0) es 0)
+        u -= 0.5
+        v -= 0.5
+
+        dentro = (u >= -0.5) & (u < ancho_origen - 0.5) & (v >= -0.5) & (v < alto_origen - 0.5)
+        valores = _muestrear(plano, ancho_origen, alto_origen, u, v, interpolacion)
+        if valores.dtype != np.uint8:
+            np.rint(valores, out=valores)
+            np.clip(valores, 0, 255, out=valores)
+        franja = salida[y:y + paso]
+        franja[...] = valores
+        franja[~dentro] = fondo
+    return salida
@@ -1,12 +1,18 @@
 """
 Módulo de componentes de interfaz gráfica
 Define todos los widgets y componentes visuales - VERSIÓN MEJORADA
+
+NumPy, PIL y los módulos que dependen de ellos se importan dentro de los
+métodos que muestran una imagen: la ventana se abre sin cargarlos
 """
 
+import time
+from collections import deque
 import tkinter as tk
 from tkinter import ttk
-from PIL import Image, ImageTk
 import config
+import instrumentacion
+from instrumentacion import medir
 
 
 class FrameControles:
@@ -36,7 +42,8 @@ class FrameControles:
         botones_info = [
             ("📂 Cargar", callbacks['cargar'], "Cargar una imagen"),
             ("💾 Guardar", callbacks['guardar'], "Guardar cambios"),
-            ("↩️ Deshacer", callbacks['deshacer'], "Deshacer último cambio"),
+            ("↩️ Deshacer", callbacks['deshacer'], "Deshacer último cambio (Ctrl+Z)"),
+            ("↪️ Rehacer", callbacks['rehacer'], "Rehacer el cambio deshecho (Ctrl+Y)"),
             ("🔄 Restaurar", callbacks['restaurar'], "Volver a original"),
         ]
         
@@ -84,11 +91,38 @@ class LabelInfo:
                              pady=8, bg="#ecf0f1", wraplength=600, justify=tk.LEFT)
         self.label.pack(fill=tk.X, padx=10)
     
+        # Barra de progreso de carga/guardado (oculta hasta que se usa)
+        self.progreso = ttk.Progressbar(self.frame, maximum=1.0, length=200)
+    
     def actualizar(self, texto):
         """Actualiza el texto del label con animación"""
         self.label.config(text=texto, fg="#27ae60")  # Verde cuando se carga
         # Volver a color normal después de 2 segundos
         self.label.after(2000, lambda: self.label.config(fg=config.COLOR_TEXT_INFO))
+    
+    def mostrar_progreso(self, texto, fraccion=None):
+        """
+        Muestra el avance de una operación en segundo plano
+        
+        Args:
+            texto (str): Descripción de la operación
+            fraccion (float): Avance de 0 a 1, o None si no se conoce
+        """
+        self.label.config(text=texto, fg=config.COLOR_TEXT_INFO)
+        if not self.progreso.winfo_ismapped():
+            self.progreso.pack(padx=10, pady=(0, 6), anchor=tk.W)
+        if fraccion is None:
+            if str(self.progreso.cget("mode")) != "indeterminate":
+                self.progreso.config(mode="indeterminate")
+                self.progreso.start(15)
+        else:
+            self.progreso.config(mode="determinate", value=fraccion)
+    
+    def ocultar_progreso(self):
+        """Oculta la barra de progreso"""
+        self.progreso.stop()
+        self.progreso.config(mode="determinate", value=0)
+        self.progreso.pack_forget()
 
 
 class LabelCoordenadas:
@@ -101,7 +135,90 @@ class LabelCoordenadas:
         self.label.pack(anchor=tk.W, padx=10)
 
     def actualizar(self, texto):
-        self.label.config(text=texto)
+        # Reconfigurar un Label cuesta un redibujado aunque el texto no cambie
+        if texto != self.label.cget("text"):
+            self.label.config(text=texto)
+
+
+class CoalescedorMovimiento:
+    """
+    Agrupa las ráfagas de eventos de movimiento del mouse en una sola
+    actualización por fotograma: solo se procesa el último evento recibido
+    """
+
+    def __init__(self, widget, callback):
+        """
+        Args:
+            widget: Widget de Tk con el que se agenda el procesamiento
+            callback: Función que recibe el último evento de cada ráfaga
+        """
+        self.widget = widget
+        self.callback = callback
+        self._evento = None          # Último evento aún sin procesar
+        self._recibido = None        # Instante en que llegó el primero de la ráfaga
+        self._pendiente = None       # Identificador de after/after_idle agendado
+        self._ultima = 0.0           # Instante de la última actualización
+
+        # Métricas: cuántos eventos llegan, cuántos se procesan y con qué retraso
+        self.eventos = 0
+        self.actualizaciones = 0
+        self.latencias = deque(maxlen=config.MOVIMIENTO_MUESTRAS_LATENCIA)
+
+    def __call__(self, event):
+        """Recibe un evento; se usa directamente como callback de bind()"""
+        self.eventos += 1
+        if self._evento is None:
+            self._recibido = time.perf_counter()
+        self._evento = event
+        if self._pendiente is not None:
+            return
+
+        # Como mucho una actualización por intervalo; si ya pasó, en cuanto Tk esté libre
+        espera = config.MOVIMIENTO_INTERVALO_MS / 1000 - (time.perf_counter() - self._ultima)
+        if espera > 0:
+            self._pendiente = self.widget.after(max(1, int(espera * 1000)), self._procesar)
+        else:
+            self._pendiente = self.widget.after_idle(self._procesar)
+
+    def _procesar(self):
+        """Entrega el último evento de la ráfaga al callback"""
+        self._pendiente = None
+        event, self._evento = self._evento, None
+        if event is None:
+            return
+        self.callback(event)
+        self._ultima = time.perf_counter()
+        self.actualizaciones += 1
+        self.latencias.append(self._ultima - self._recibido)
+
+    def vaciar(self):
+        """Procesa ya el evento pendiente, si lo hay (p. ej. antes de soltar el botón)"""
+        if self._pendiente is not None:
+            self.widget.after_cancel(self._pendiente)
+            self._procesar()
+
+    def cancelar(self):
+        """Descarta el evento pendiente sin procesarlo"""
+        if self._pendiente is not None:
+            self.widget.after_cancel(self._pendiente)
+            self._pendiente = None
+        self._evento = None
+
+    def resumen(self):
+        """
+        Returns:
+            dict: Eventos recibidos, actualizaciones y latencias (ms) media, p95 y máxima
+        """
+        muestras = sorted(self.latencias)
+        if not muestras:
+            return {'eventos': self.eventos, 'actualizaciones': self.actualizaciones}
+        return {
+            'eventos': self.eventos,
+            'actualizaciones': self.actualizaciones,
+            'latencia_media_ms': 1000 * sum(muestras) / len(muestras),
+            'latencia_p95_ms': 1000 * muestras[int(0.95 * (len(muestras) - 1))],
+            'latencia_max_ms': 1000 * muestras[-1],
+        }
 
 
 class CanvasImagen:
@@ -124,12 +241,30 @@ class CanvasImagen:
                                highlightbackground="#34495e", cursor="crosshair")
         self.canvas.pack(in_=self.frame_container, padx=3, pady=3)
         self.canvas.bind("<Button-1>", click_callback)
-        self.canvas.bind("<Motion>", motion_callback)
+        # Los movimientos se agrupan: una actualización por fotograma como mucho
+        self.movimiento = CoalescedorMovimiento(self.canvas, motion_callback)
+        self.canvas.bind("<Motion>", self.movimiento)
         self.canvas.bind("<Button-3>", self.click_derecho)  # Click derecho para más opciones
         
+        # Zoom con la rueda (Windows/macOS y X11) y desplazamiento con el botón central
+        self.canvas.bind("<MouseWheel>", self._rueda_zoom)
+        self.canvas.bind("<Button-4>", self._rueda_zoom)
+        self.canvas.bind("<Button-5>", self._rueda_zoom)
+        self.canvas.bind("<ButtonPress-2>", self._iniciar_desplazamiento)
+        self.canvas.bind("<B2-Motion>", self._desplazar)
+        
+        # Borde del canvas: la vista empieza dentro del resaltado
+        self.inset = int(self.canvas.cget("highlightthickness")) + int(self.canvas.cget("borderwidth"))
+        self.color_fondo = tuple(v // 256 for v in self.canvas.winfo_rgb(config.COLOR_BG_CANVAS))
+        
+        self.viewport = None  # Se crea con la primera imagen
+        self.piramide = None
         self.img_display = None
-        self.display_ratio = 1.0
+        self._previa = None  # (lut, región) de la vista previa de tonos en curso
+        self.pixeles_tocados = 0  # Píxeles de pantalla generados (para la instrumentación)
+        self._punto_desplazamiento = None
         self.rect_id = None  # Para almacenar ID del rectángulo de selección
+        self.seleccion = None  # Selección que muestra rect_id, en coordenadas de la imagen
         self.dibujar_rejilla_inicial()
     
     def dibujar_rejilla_inicial(self):
@@ -147,27 +282,200 @@ class CanvasImagen:
                                text="Carga una imagen aquí", font=("Arial", 12, "italic"),
                                fill="#95a5a6")
     
-    def mostrar_imagen(self, imagen):
+    @medir(categoria="interfaz")
+    def mostrar_imagen(self, img_array):
         """
-        Muestra la imagen en el canvas con ajuste proporcional
+        Muestra una imagen nueva en el canvas ajustada a la vista
         
         Args:
-            imagen: Objeto PIL Image
+            img_array (ndarray): Imagen completa (alto x ancho x 3)
         """
-        max_size = config.CANVAS_WIDTH
-        width, height = imagen.size
-        ratio = min(max_size / width, max_size / height)
-        nuevo_width = int(width * ratio)
-        nuevo_height = int(height * ratio)
+        from PIL import Image, ImageTk
+        from vista import PiramideImagen, Viewport
         
-        self.img_display = imagen.resize((nuevo_width, nuevo_height), Image.LANCZOS)
+        alto, ancho = img_array.shape[:2]
+        self.piramide = PiramideImagen(img_array)
+        if self.viewport is None:
+            self.viewport = Viewport(config.CANVAS_WIDTH, config.CANVAS_HEIGHT)
+        self.viewport.ajustar(ancho, alto)
+        
+        # Búfer de pantalla y PhotoImage persistentes: se reutilizan en cada refresco
+        self.img_display = Image.new("RGB", (config.CANVAS_WIDTH, config.CANVAS_HEIGHT))
         img_tk = ImageTk.PhotoImage(self.img_display)
         
         self.canvas.delete("all")
         self.canvas.img = img_tk
-        self.canvas.create_image(config.CANVAS_CENTER_X, config.CANVAS_CENTER_Y, image=img_tk)
+        self.canvas.create_image(self.inset, self.inset, image=img_tk, anchor=tk.NW)
+        self.rect_id = None
+        self.seleccion = None
+        self._previa = None
+        self.redibujar()
+    
+    @medir(categoria="interfaz")
+    def redibujar(self):
+        """Vuelve a generar toda la vista (tras un zoom o un desplazamiento)"""
+        if self.piramide is None:
+            return
+        
+        from PIL import Image
+        pixeles = self.viewport.renderizar(self.piramide, fondo=self.color_fondo)
+        self.pixeles_tocados += pixeles.shape[0] * pixeles.shape[1]
+        self.img_display = Image.fromarray(pixeles)
+        if self._previa is not None:
+            self._pintar_previa()
+        else:
+            self.canvas.img.paste(self.img_display)
+        if self.seleccion is not None:
+            self._colocar_seleccion()
+    
+    def mostrar_seleccion(self, seleccion):
+        """
+        Dibuja el rectángulo de una selección; al guardarse en coordenadas de
+        la imagen, sigue a la imagen en cada zoom o desplazamiento
+        
+        Args:
+            seleccion (tuple): (x1, y1, x2, y2) en la imagen o None para quitarla
+        """
+        self.seleccion = seleccion
+        if seleccion is None:
+            if self.rect_id is not None:
+                self.canvas.delete(self.rect_id)
+                self.rect_id = None
+            return
+        self._colocar_seleccion()
+    
+    def _colocar_seleccion(self):
+        """Proyecta la selección con la vista actual y crea o mueve su rectángulo"""
+        x1, y1 = self.viewport.imagen_a_canvas(self.seleccion[0], self.seleccion[1])
+        x2, y2 = self.viewport.imagen_a_canvas(self.seleccion[2], self.seleccion[3])
+        coordenadas = (x1 + self.inset, y1 + self.inset, x2 + self.inset, y2 + self.inset)
+        if self.rect_id is None:
+            self.rect_id = self.canvas.create_rectangle(
+                *coordenadas, outline="#3498db", width=2, dash=(4, 4))
+        else:
+            self.canvas.coords(self.rect_id, *coordenadas)
+    
+    @medir(categoria="interfaz")
+    def previsualizar_lut(self, lut, region=None):
+        """
+        Muestra el efecto de una LUT sin tocar la imagen: solo se aplica a los
+        píxeles de pantalla, así que el coste depende del canvas y no de la imagen
+        
+        Args:
+            lut (ndarray): LUT (3 x 256, uint8)
+            region (tuple): (x_min, y_min, x_max, y_max) de la imagen; None para toda
+        """
+        if self.piramide is None:
+            return
+        self._previa = (lut, region)
+        self._pintar_previa()
+    
+    def cancelar_previsualizacion(self):
+        """Vuelve a mostrar la vista sin la LUT de la vista previa"""
+        if self._previa is None:
+            return
+        self._previa = None
+        self.canvas.img.paste(self.img_display)
+    
+    def _pintar_previa(self):
+        """Copia a la PhotoImage el búfer de la vista con la LUT aplicada"""
+        import numpy as np
+        from PIL import Image
+        import tonos
+        
+        lut, region = self._previa
+        pixeles = np.array(self.img_display)
+        rect = self.viewport.region_en_vista(region or (0, 0) + self.piramide.dimensiones(0))
+        if rect is not None:
+            x0, y0, x1, y1 = rect
+            zona = pixeles[y0:y1, x0:x1]
+            tonos.aplicar_lut(zona, lut, zona)
+        self.canvas.img.paste(Image.fromarray(pixeles))
+    
+    @medir(categoria="interfaz")
+    def actualizar_region(self, img_array, region):
+        """
+        Redibuja solo la parte de la vista que corresponde a una región de la imagen
+        
+        Args:
+            img_array (ndarray): Imagen completa
+            region (tuple): (x_min, y_min, x_max, y_max) modificada en la imagen
+        """
+        if self.piramide is None or region is None:
+            return
+        
+        # Con otras dimensiones (p. ej. tras girar o escalar) se rehace la vista entera
+        if img_array.shape != self.piramide.fuente.shape:
+            self.mostrar_imagen(img_array)
+            return
+        
+        # La imagen puede haberse reemplazado (p. ej. al restaurar el original)
+        if self.piramide.fuente is not img_array:
+            self.piramide.fuente = img_array
+        self.piramide.invalidar(region)
+        
+        rect = self.viewport.region_en_vista(region)
+        if rect is None:
+            return
+        
+        # Actualizar el búfer de la vista y copiar solo el parche a la PhotoImage
+        from PIL import Image, ImageTk
+        x0, y0, x1, y1 = rect
+        self.pixeles_tocados += (x1 - x0) * (y1 - y0)
+        parche = Image.fromarray(self.viewport.renderizar(self.piramide, rect,
+                                                          fondo=self.color_fondo))
+        self.img_display.paste(parche, (x0, y0))
+        parche_tk = ImageTk.PhotoImage(parche)
+        self.canvas.tk.call(str(self.canvas.img), "copy", str(parche_tk), "-to", x0, y0)
+    
+    def canvas_a_coordenadas_imagen(self, x, y):
+        """
+        Convierte coordenadas del canvas a coordenadas de la imagen
+        
+        Args:
+            x, y (int): Coordenadas en el canvas
+            
+        Returns:
+            tuple: (x, y) en la imagen o (None, None) si no hay imagen mostrada
+        """
+        if self.piramide is None:
+            return None, None
+        return self.viewport.canvas_a_imagen(x - self.inset, y - self.inset)
+    
+    def vincular_arrastre(self, arrastre_callback, soltar_callback):
+        """
+        Conecta los eventos de arrastre con el botón izquierdo
+        
+        Args:
+            arrastre_callback: Función al mover el mouse con el botón pulsado
+            soltar_callback: Función al soltar el botón
+        """
+        self.canvas.bind("<B1-Motion>", arrastre_callback)
+        self.canvas.bind("<ButtonRelease-1>", soltar_callback)
+    
+    def _rueda_zoom(self, event):
+        """Acerca o aleja la vista con la rueda del mouse, centrada en el puntero"""
+        if self.piramide is None:
+            return
+        
+        acercar = event.num == 4 or getattr(event, 'delta', 0) > 0
+        factor = config.ZOOM_PASO if acercar else 1 / config.ZOOM_PASO
+        self.viewport.hacer_zoom(factor, event.x - self.inset, event.y - self.inset)
+        self.redibujar()
+    
+    def _iniciar_desplazamiento(self, event):
+        """Guarda el punto donde empieza el desplazamiento con el botón central"""
+        self._punto_desplazamiento = (event.x, event.y)
+    
+    def _desplazar(self, event):
+        """Desplaza la vista siguiendo el arrastre con el botón central"""
+        if self.piramide is None or self._punto_desplazamiento is None:
+            return
         
-        self.display_ratio = ratio
+        x_anterior, y_anterior = self._punto_desplazamiento
+        self.viewport.desplazar(event.x - x_anterior, event.y - y_anterior)
+        self._punto_desplazamiento = (event.x, event.y)
+        self.redibujar()
     
     def click_derecho(self, event):
         """Menú contextual al hacer click derecho"""
@@ -327,12 +635,18 @@ class FrameEdicion:
 class FrameSeleccionMultiple:
     """Frame para seleccionar múltiples píxeles - NUEVO"""
     
-    def __init__(self, parent, aplicar_callback):
+    def __init__(self, parent, aplicar_callback, reemplazar_callback=None,
+                 promedio_callback=None, paleta_callback=None, cuantizar_callback=None):
         """
         Args:
             parent: Widget padre
             aplicar_callback: Función al aplicar cambio
+            reemplazar_callback: Función al reemplazar un color (None para no mostrar el botón)
+            promedio_callback: Función que calcula el color promedio de la selección
+            paleta_callback: Función al extraer la paleta (None para no mostrar el botón)
+            cuantizar_callback: Función al llevar la imagen a la paleta (ídem)
         """
+        self._promedio_callback = promedio_callback
         self.frame = tk.LabelFrame(parent, text="🎯 Selección Múltiple",
                                   font=("Arial", 11, "bold"), padx=20, pady=15,
                                   bg="#ecf0f1", relief=tk.GROOVE, bd=2)
@@ -349,7 +663,9 @@ class FrameSeleccionMultiple:
         
         modos = [("🟫 Rectángulo", "rectangulo"), 
                 ("⭕ Círculo", "circulo"),
-                ("🎨 Pincel", "pincel")]
+                ("🎨 Pincel", "pincel"),
+                ("🪣 Relleno", "relleno"),
+                ("🪄 Varita", "varita")]
         
         for texto, valor in modos:
             rb = tk.Radiobutton(row1, text=texto, variable=self.modo_seleccion, 
@@ -377,6 +693,17 @@ class FrameSeleccionMultiple:
         self.lbl_tamaño.pack(side=tk.LEFT, padx=2)
         self.slider_tamaño.config(command=self._actualizar_tamaño)
         
+        # Tolerancia de color (relleno y varita mágica)
+        tk.Label(row2, text="Tolerancia:", font=("Arial", 9), bg="#ecf0f1").pack(side=tk.LEFT, padx=5)
+        self.slider_tolerancia = tk.Scale(row2, from_=0, to=255, orient=tk.HORIZONTAL,
+                                         bg="white", fg="#e67e22", highlightthickness=0, length=100)
+        self.slider_tolerancia.set(config.RELLENO_TOLERANCIA)
+        self.slider_tolerancia.pack(side=tk.LEFT, padx=2)
+        
+        # Cómo se mide la diferencia de color (ver relleno.MODOS)
+        self.distancia = tk.StringVar(value=config.DISTANCIAS_COLOR[0])
+        tk.OptionMenu(row2, self.distancia, *config.DISTANCIAS_COLOR).pack(side=tk.LEFT, padx=5)
+        
         # ===== FILA 3: COLOR RGB =====
         row3 = tk.Frame(self.frame, bg="#ecf0f1")
         row3.pack(pady=8, fill=tk.X)
@@ -437,6 +764,65 @@ class FrameSeleccionMultiple:
                                 cursor="hand2",
                                 activebackground="#8e44ad")
         btn_promedio.pack(side=tk.LEFT, padx=5)
+        
+        # Botón reemplazar color (el del píxel elegido por el de los sliders)
+        if reemplazar_callback is not None:
+            btn_reemplazar = tk.Button(row4, text="Reemplazar Color",
+                                      command=reemplazar_callback,
+                                      font=("Arial", 10),
+                                      bg="#e67e22", fg="white",
+                                      padx=15, pady=8,
+                                      relief=tk.RAISED, bd=2,
+                                      cursor="hand2",
+                                      activebackground="#d35400")
+            btn_reemplazar.pack(side=tk.LEFT, padx=5)
+        
+        # ===== FILA 5: PALETA =====
+        row5 = tk.Frame(self.frame, bg="#ecf0f1")
+        row5.pack(pady=8, fill=tk.X)
+        
+        tk.Label(row5, text="🎨 Paleta:", font=("Arial", 9, "bold"),
+                bg="#ecf0f1", fg="#2c3e50").pack(side=tk.LEFT, padx=5)
+        
+        self.slider_colores = tk.Scale(row5, from_=1, to=config.PALETA_MAX_COLORES,
+                                      orient=tk.HORIZONTAL, bg="white", fg="#9b59b6",
+                                      highlightthickness=0, length=80)
+        self.slider_colores.set(config.PALETA_COLORES)
+        self.slider_colores.pack(side=tk.LEFT, padx=2)
+        
+        self.metodo_paleta = tk.StringVar(value=config.PALETA_METODOS[0])
+        tk.OptionMenu(row5, self.metodo_paleta, *config.PALETA_METODOS).pack(side=tk.LEFT, padx=5)
+        
+        if paleta_callback is not None:
+            tk.Button(row5, text="Extraer", command=paleta_callback, font=("Arial", 9),
+                     bg="#9b59b6", fg="white", cursor="hand2",
+                     activebackground="#8e44ad").pack(side=tk.LEFT, padx=5)
+        if cuantizar_callback is not None:
+            tk.Button(row5, text="Cuantizar", command=cuantizar_callback, font=("Arial", 9),
+                     bg="#34495e", fg="white", cursor="hand2",
+                     activebackground="#2c3e50").pack(side=tk.LEFT, padx=5)
+        
+        # Muestras de la paleta extraída (un clic copia el color a los sliders)
+        self.frame_muestras = tk.Frame(row5, bg="#ecf0f1")
+        self.frame_muestras.pack(side=tk.LEFT, padx=5)
+    
+    def mostrar_paleta(self, colores, proporciones):
+        """
+        Muestra los colores de una paleta, de más a menos frecuente
+        
+        Args:
+            colores (list): [(r, g, b), ...]
+            proporciones (list): Fracción del área de cada color
+        """
+        for muestra in self.frame_muestras.winfo_children():
+            muestra.destroy()
+        for (r, g, b), proporcion in zip(colores, proporciones):
+            tk.Button(self.frame_muestras, text=f"{proporcion:.0%}", width=3,
+                     font=("Arial", 7), bg=f"#{r:02x}{g:02x}{b:02x}",
+                     fg="white" if r * 77 + g * 150 + b * 29 < 128 * 256 else "black",
+                     relief=tk.FLAT, cursor="hand2",
+                     command=lambda r=r, g=g, b=b: self.establecer_color(r, g, b)
+                     ).pack(side=tk.LEFT, padx=1)
     
     def _actualizar_tamaño(self, valor):
         """Actualiza el label del tamaño"""
@@ -447,6 +833,10 @@ class FrameSeleccionMultiple:
         return {
             'modo': self.modo_seleccion.get(),
             'tamaño': int(self.slider_tamaño.get()),
+            'tolerancia': int(self.slider_tolerancia.get()),
+            'tolerancia_modo': self.distancia.get(),
+            'colores': int(self.slider_colores.get()),
+            'metodo_paleta': self.metodo_paleta.get(),
             'r': int(self.slider_r.get()),
             'g': int(self.slider_g.get()),
             'b': int(self.slider_b.get())
@@ -457,11 +847,442 @@ class FrameSeleccionMultiple:
         pass  # Se implementa en main_editor.py
     
     def usar_color_promedio(self):
-        """Usa color promedio de la selección"""
-        pass  # Se implementa en main_editor.py
+        """Usa color promedio de la selección (lo calcula promedio_callback)"""
+        if self._promedio_callback is None:
+            return
+        color = self._promedio_callback()
+        if color is not None:
+            self.establecer_color(*color)
     
     def establecer_color(self, r, g, b):
         """Establece el color RGB en los sliders"""
         self.slider_r.set(r)
         self.slider_g.set(g)
-        self.slider_b.set(b)
\ No newline at end of file
+        self.slider_b.set(b)
+
+class DialogoTonos:
+    """Ventana de ajustes de tono con vista previa en vivo"""
+    
+    # (clave, etiqueta, mínimo, máximo, resolución, valor inicial)
+    CONTROLES = [
+        ("brillo", "☀️ Brillo", -100, 100, 1, 0),
+        ("contraste", "◐ Contraste", 0.1, 3.0, 0.05, 1.0),
+        ("gamma", "γ Gamma", 0.2, 3.0, 0.05, 1.0),
+        ("negro", "⬛ Nivel de negro", 0, 254, 1, 0),
+        ("blanco", "⬜ Nivel de blanco", 1, 255, 1, 255),
+    ]
+    
+    def __init__(self, parent, cambio_callback, aceptar_callback, cancelar_callback):
+        """
+        Args:
+            parent: Ventana principal
+            cambio_callback: Recibe los ajustes (dict) cada vez que se mueve un control
+            aceptar_callback: Recibe los ajustes definitivos
+            cancelar_callback: Se llama al cerrar sin aplicar
+        """
+        self._cambio = cambio_callback
+        self._aceptar = aceptar_callback
+        self._cancelar = cancelar_callback
+        
+        self.ventana = tk.Toplevel(parent)
+        self.ventana.title("Ajustes de tono")
+        self.ventana.configure(bg="#ecf0f1", padx=20, pady=15)
+        self.ventana.resizable(False, False)
+        self.ventana.transient(parent)
+        self.ventana.protocol("WM_DELETE_WINDOW", self.cancelar)
+        
+        self.sliders = {}
+        for clave, etiqueta, minimo, maximo, resolucion, inicial in self.CONTROLES:
+            fila = tk.Frame(self.ventana, bg="#ecf0f1")
+            fila.pack(fill=tk.X, pady=4)
+            tk.Label(fila, text=etiqueta, font=("Arial", 9, "bold"), bg="#ecf0f1",
+                     fg="#2c3e50", width=16, anchor=tk.W).pack(side=tk.LEFT)
+            slider = tk.Scale(fila, from_=minimo, to=maximo, resolution=resolucion,
+                              orient=tk.HORIZONTAL, length=220, bg="white",
+                              highlightthickness=0, command=self._en_cambio)
+            slider.set(inicial)
+            slider.pack(side=tk.LEFT, padx=5)
+            self.sliders[clave] = slider
+        
+        botones = tk.Frame(self.ventana, bg="#ecf0f1")
+        botones.pack(fill=tk.X, pady=(12, 0))
+        tk.Button(botones, text="✔ Aceptar", command=self.aceptar, font=("Arial", 10, "bold"),
+                  bg="#27ae60", fg="white", padx=15, pady=6, cursor="hand2",
+                  activebackground="#229954").pack(side=tk.LEFT, expand=True)
+        tk.Button(botones, text="↺ Restablecer", command=self.restablecer, font=("Arial", 10),
+                  bg="#95a5a6", fg="white", padx=15, pady=6, cursor="hand2",
+                  activebackground="#7f8c8d").pack(side=tk.LEFT, expand=True)
+        tk.Button(botones, text="✖ Cancelar", command=self.cancelar, font=("Arial", 10),
+                  bg="#e74c3c", fg="white", padx=15, pady=6, cursor="hand2",
+                  activebackground="#c0392b").pack(side=tk.LEFT, expand=True)
+        
+        # Modal: la imagen no puede cambiar mientras se previsualiza
+        self.ventana.grab_set()
+    
+    def obtener_ajustes(self):
+        """
+        Returns:
+            dict: Parámetros para tonos.construir_lut
+        """
+        ajustes = {clave: float(slider.get()) for clave, slider in self.sliders.items()}
+        ajustes["negro"] = int(ajustes["negro"])
+        ajustes["blanco"] = max(int(ajustes["blanco"]), ajustes["negro"] + 1)
+        return ajustes
+    
+    def _en_cambio(self, _valor):
+        """Avisa del cambio de cualquier control"""
+        self._cambio(self.obtener_ajustes())
+    
+    def restablecer(self):
+        """Vuelve todos los controles a su valor neutro"""
+        for clave, _, _, _, _, inicial in self.CONTROLES:
+            self.sliders[clave].set(inicial)
+        self._en_cambio(None)
+    
+    def aceptar(self):
+        """Cierra la ventana y aplica los ajustes"""
+        ajustes = self.obtener_ajustes()
+        self._cerrar()
+        self._aceptar(ajustes)
+    
+    def cancelar(self):
+        """Cierra la ventana sin aplicar nada"""
+        self._cerrar()
+        self._cancelar()
+    
+    def _cerrar(self):
+        self.ventana.grab_release()
+        self.ventana.destroy()
+
+
+class DialogoTransformacion:
+    """Ventana para girar, escalar, inclinar y voltear en un solo remuestreo"""
+    
+    # (clave, etiqueta, mínimo, máximo, resolución, valor inicial)
+    CONTROLES = [
+        ("rotar", "⟲ Giro (grados)", -180, 180, 1, 0),
+        ("escala_x", "↔ Escala horizontal", 0.1, 4.0, 0.05, 1.0),
+        ("escala_y", "↕ Escala vertical", 0.1, 4.0, 0.05, 1.0),
+        ("cizalla", "▱ Inclinación", -1.0, 1.0, 0.05, 0.0),
+    ]
+    
+    def __init__(self, parent, aceptar_callback):
+        """
+        Args:
+            parent: Ventana principal
+            aceptar_callback: Recibe (pasos, opciones) para ImageHandler.transformar_pasos
+        """
+        import transformaciones
+        
+        self._aceptar = aceptar_callback
+        
+        self.ventana = tk.Toplevel(parent)
+        self.ventana.title("Transformar")
+        self.ventana.configure(bg="#ecf0f1", padx=20, pady=15)
+        self.ventana.resizable(False, False)
+        self.ventana.transient(parent)
+        self.ventana.protocol("WM_DELETE_WINDOW", self._cerrar)
+        
+        self.sliders = {}
+        for clave, etiqueta, minimo, maximo, resolucion, inicial in self.CONTROLES:
+            fila = tk.Frame(self.ventana, bg="#ecf0f1")
+            fila.pack(fill=tk.X, pady=4)
+            tk.Label(fila, text=etiqueta, font=("Arial", 9, "bold"), bg="#ecf0f1",
+                     fg="#2c3e50", width=18, anchor=tk.W).pack(side=tk.LEFT)
+            slider = tk.Scale(fila, from_=minimo, to=maximo, resolution=resolucion,
+                              orient=tk.HORIZONTAL, length=220, bg="white",
+                              highlightthickness=0)
+            slider.set(inicial)
+            slider.pack(side=tk.LEFT, padx=5)
+            self.sliders[clave] = slider
+        
+        opciones = tk.Frame(self.ventana, bg="#ecf0f1")
+        opciones.pack(fill=tk.X, pady=4)
+        self.voltear_h = tk.BooleanVar(value=False)
+        self.voltear_v = tk.BooleanVar(value=False)
+        self.ajustar = tk.BooleanVar(value=True)
+        for texto, variable in (("Voltear horizontal", self.voltear_h),
+                                ("Voltear vertical", self.voltear_v),
+                                ("Ajustar lienzo", self.ajustar)):
+            tk.Checkbutton(opciones, text=texto, variable=variable, bg="#ecf0f1",
+                           font=("Arial", 9)).pack(side=tk.LEFT, padx=4)
+        
+        fila = tk.Frame(self.ventana, bg="#ecf0f1")
+        fila.pack(fill=tk.X, pady=4)
+        tk.Label(fila, text="Interpolación", font=("Arial", 9, "bold"), bg="#ecf0f1",
+                 fg="#2c3e50", width=18, anchor=tk.W).pack(side=tk.LEFT)
+        self.interpolacion = tk.StringVar(value=config.TRANSFORMACION_INTERPOLACION)
+        tk.OptionMenu(fila, self.interpolacion, *transformaciones.INTERPOLACIONES).pack(side=tk.LEFT)
+        
+        botones = tk.Frame(self.ventana, bg="#ecf0f1")
+        botones.pack(fill=tk.X, pady=(12, 0))
+        tk.Button(botones, text="✔ Aplicar", command=self.aceptar, font=("Arial", 10, "bold"),
+                  bg="#27ae60", fg="white", padx=15, pady=6, cursor="hand2",
+                  activebackground="#229954").pack(side=tk.LEFT, expand=True)
+        tk.Button(botones, text="✖ Cancelar", command=self._cerrar, font=("Arial", 10),
+                  bg="#e74c3c", fg="white", padx=15, pady=6, cursor="hand2",
+                  activebackground="#c0392b").pack(side=tk.LEFT, expand=True)
+        
+        self.ventana.grab_set()
+    
+    def obtener_pasos(self):
+        """
+        Returns:
+            list: Pasos para transformaciones.matriz_desde_pasos (se omiten los neutros)
+        """
+        valores = {clave: float(slider.get()) for clave, slider in self.sliders.items()}
+        pasos = []
+        if self.voltear_h.get():
+            pasos.append({"voltear": "horizontal"})
+        if self.voltear_v.get():
+            pasos.append({"voltear": "vertical"})
+        if valores["cizalla"]:
+            pasos.append({"cizalla": valores["cizalla"]})
+        if (valores["escala_x"], valores["escala_y"]) != (1.0, 1.0):
+            pasos.append({"escalar": [valores["escala_x"], valores["escala_y"]]})
+        if valores["rotar"]:
+            pasos.append({"rotar": valores["rotar"]})
+        return pasos
+    
+    def aceptar(self):
+        """Cierra la ventana y aplica todos los pasos compuestos"""
+        pasos = self.obtener_pasos()
+        opciones = {"interpolacion": self.interpolacion.get(), "ajustar": self.ajustar.get()}
+        self._cerrar()
+        if pasos:
+            self._aceptar(pasos, opciones)
+    
+    def _cerrar(self):
+        self.ventana.grab_release()
+        self.ventana.destroy()
+
+
+class PanelHistograma:
+    """Ventana con el histograma en vivo (R, G, B y luminancia)"""
+    
+    ANCHO = 512
+    ALTO = 160
+    
+    def __init__(self, parent, fuente):
+        """
+        Args:
+            parent: Ventana principal
+            fuente: Función sin argumentos que devuelve (versión, conteos 4 x 256) o None
+        """
+        self._fuente = fuente
+        self._version = None
+        self._pendiente = None
+        
+        self.ventana = tk.Toplevel(parent)
+        self.ventana.title("Histograma")
+        self.ventana.configure(bg="#ecf0f1", padx=10, pady=10)
+        self.ventana.resizable(False, False)
+        self.ventana.protocol("WM_DELETE_WINDOW", self.cerrar)
+        
+        self.canvas = tk.Canvas(self.ventana, width=self.ANCHO, height=self.ALTO, bg="white",
+                                highlightthickness=1, highlightbackground="#95a5a6")
+        self.canvas.pack()
+        self._consultar()
+    
+    def _consultar(self):
+        """Redibuja solo si el histograma cambió desde la última consulta"""
+        datos = self._fuente()
+        version = None if datos is None else datos[0]
+        if version != self._version:
+            self._version = version
+            self._dibujar(None if datos is None else datos[1])
+        self._pendiente = self.ventana.after(config.HISTOGRAMA_INTERVALO_MS, self._consultar)
+    
+    def _dibujar(self, conteos):
+        """Dibuja una línea por canal, escalada al valor más alto"""
+        self.canvas.delete("all")
+        if conteos is None:
+            return
+        
+        import numpy as np
+        xs = np.arange(256) * (self.ANCHO - 1) / 255.0
+        colores = (config.COLOR_RED, config.COLOR_GREEN, config.COLOR_BLUE, config.COLOR_LUMINANCIA)
+        for fila, color in zip(conteos, colores):
+            maximo = fila.max()
+            if maximo == 0:
+                continue
+            ys = (self.ALTO - 1) - fila * ((self.ALTO - 4) / maximo)
+            puntos = np.column_stack([xs, ys]).ravel().tolist()
+            self.canvas.create_line(*puntos, fill=color, width=1)
+    
+    def cerrar(self):
+        """Deja de consultar y cierra la ventana"""
+        if self._pendiente is not None:
+            self.ventana.after_cancel(self._pendiente)
+            self._pendiente = None
+        self.ventana.destroy()
+
+
+class PanelInstrumentacion:
+    """Ventana oculta (Ctrl+Mayús+E) con las métricas de la instrumentación"""
+    
+    # (clave del resumen, título, ancho, formato)
+    COLUMNAS = [
+        ("llamadas", "Llamadas", 70, "{:,}"),
+        ("p50_ms", "p50 ms", 70, "{:.2f}"),
+        ("p90_ms", "p90 ms", 70, "{:.2f}"),
+        ("p99_ms", "p99 ms", 70, "{:.2f}"),
+        ("max_ms", "Máx. ms", 70, "{:.2f}"),
+        ("total_ms", "Total ms", 80, "{:.0f}"),
+        ("pixeles", "Píxeles", 100, "{:,}"),
+        ("bytes_max", "Pico bytes", 100, "{:,}"),
+    ]
+    
+    def __init__(self, parent):
+        """
+        Args:
+            parent: Ventana principal
+        """
+        self.ventana = tk.Toplevel(parent)
+        self.ventana.title("Instrumentación")
+        self.ventana.protocol("WM_DELETE_WINDOW", self.cerrar)
+        self._pendiente = None
+        
+        claves = [clave for clave, _, _, _ in self.COLUMNAS]
+        self.tabla = ttk.Treeview(self.ventana, columns=claves, height=20)
+        self.tabla.heading("#0", text="Operación")
+        self.tabla.column("#0", width=260)
+        for clave, titulo, ancho, _ in self.COLUMNAS:
+            self.tabla.heading(clave, text=titulo)
+            self.tabla.column(clave, width=ancho, anchor=tk.E)
+        self.tabla.pack(fill=tk.BOTH, expand=True)
+        
+        botones = tk.Frame(self.ventana)
+        botones.pack(fill=tk.X, pady=4)
+        tk.Button(botones, text="Reiniciar métricas",
+                  command=instrumentacion.registro.reiniciar).pack(side=tk.LEFT, padx=6)
+        self.memoria = tk.BooleanVar(value=config.INSTRUMENTACION_MEMORIA)
+        tk.Checkbutton(botones, text="Medir bytes asignados (más lento)", variable=self.memoria,
+                       command=lambda: instrumentacion.registro.medir_memoria(self.memoria.get())
+                       ).pack(side=tk.LEFT, padx=6)
+        self._refrescar()
+    
+    def _refrescar(self):
+        """Vuelve a llenar la tabla, de la operación más costosa a la que menos"""
+        resumen = instrumentacion.resumen()
+        self.tabla.delete(*self.tabla.get_children())
+        for nombre, datos in sorted(resumen.items(), key=lambda e: -e[1]["total_ms"]):
+            valores = ["" if datos[clave] is None else formato.format(datos[clave])
+                       for clave, _, _, formato in self.COLUMNAS]
+            self.tabla.insert("", tk.END, text=nombre, values=valores)
+        self._pendiente = self.ventana.after(config.INSTRUMENTACION_INTERVALO_MS, self._refrescar)
+    
+    def cerrar(self):
+        """Deja de refrescar y cierra la ventana"""
+        if self._pendiente is not None:
+            self.ventana.after_cancel(self._pendiente)
+            self._pendiente = None
+        self.ventana.destroy()
+
+
+class PanelCapas:
+    """Ventana con la pila de capas: orden, visibilidad, opacidad y modo de fusión"""
+    
+    def __init__(self, parent, callbacks):
+        """
+        Args:
+            parent: Ventana principal
+            callbacks (dict): 'listar' (devuelve ImageHandler.listar_capas()),
+                'activar' (índice), 'modificar' (índice, visible, opacidad, modo),
+                'mover' (índice, destino), 'nueva', 'duplicar', 'importar',
+                'eliminar' (índice) y 'combinar'
+        """
+        self._callbacks = callbacks
+        self._capas = []
+        self._actualizando = False
+        
+        self.ventana = tk.Toplevel(parent)
+        self.ventana.title("Capas")
+        self.ventana.configure(bg="#ecf0f1", padx=10, pady=10)
+        self.ventana.resizable(False, False)
+        self.ventana.protocol("WM_DELETE_WINDOW", self.cerrar)
+        
+        # La capa de arriba se muestra primero, como en la pila
+        self.tabla = ttk.Treeview(self.ventana, columns=("visible", "opacidad", "modo"),
+                                  height=8, selectmode="browse")
+        self.tabla.heading("#0", text="Capa")
+        self.tabla.column("#0", width=160)
+        for clave, titulo, ancho in (("visible", "👁", 40), ("opacidad", "Opacidad", 70),
+                                     ("modo", "Modo", 90)):
+            self.tabla.heading(clave, text=titulo)
+            self.tabla.column(clave, width=ancho, anchor=tk.CENTER)
+        self.tabla.pack(fill=tk.X)
+        self.tabla.bind("<<TreeviewSelect>>", self._en_seleccion)
+        
+        propiedades = tk.Frame(self.ventana, bg="#ecf0f1")
+        propiedades.pack(fill=tk.X, pady=6)
+        self.visible = tk.BooleanVar(value=True)
+        tk.Checkbutton(propiedades, text="Visible", variable=self.visible, bg="#ecf0f1",
+                       font=("Arial", 9), command=self._en_propiedades).pack(side=tk.LEFT)
+        self.opacidad = tk.Scale(propiedades, from_=0, to=100, orient=tk.HORIZONTAL, length=140,
+                                 label="Opacidad %", bg="white", highlightthickness=0,
+                                 command=lambda _valor: self._en_propiedades())
+        self.opacidad.pack(side=tk.LEFT, padx=6)
+        self.modo = tk.StringVar(value="normal")
+        tk.OptionMenu(propiedades, self.modo, *config.CAPAS_MODOS,
+                      command=lambda _valor: self._en_propiedades()).pack(side=tk.LEFT)
+        
+        botones = tk.Frame(self.ventana, bg="#ecf0f1")
+        botones.pack(fill=tk.X)
+        for texto, accion in (("➕ Nueva", callbacks['nueva']),
+                              ("⧉ Duplicar", callbacks['duplicar']),
+                              ("📂 Importar...", callbacks['importar']),
+                              ("▲", lambda: self._mover(1)),
+                              ("▼", lambda: self._mover(-1)),
+                              ("🗑 Eliminar", lambda: self._callbacks['eliminar'](self._indice())),
+                              ("⤓ Combinar", callbacks['combinar'])):
+            tk.Button(botones, text=texto, command=accion, font=("Arial", 9), bg="#3498db",
+                      fg="white", padx=6, pady=3, cursor="hand2",
+                      activebackground="#2980b9").pack(side=tk.LEFT, padx=2)
+        self.actualizar()
+    
+    def actualizar(self):
+        """Vuelve a leer las capas y selecciona la activa"""
+        self._actualizando = True
+        self._capas = self._callbacks['listar']()
+        self.tabla.delete(*self.tabla.get_children())
+        for indice in reversed(range(len(self._capas))):
+            capa = self._capas[indice]
+            self.tabla.insert("", tk.END, iid=str(indice), text=capa["nombre"],
+                              values=("✔" if capa["visible"] else "",
+                                      f"{capa['opacidad']:.0%}", capa["modo"]))
+            if capa["activa"]:
+                self.tabla.selection_set(str(indice))
+                self.visible.set(capa["visible"])
+                self.opacidad.set(round(capa["opacidad"] * 100))
+                self.modo.set(capa["modo"])
+        # Los eventos de selección y del slider se procesan después: se ignoran hasta entonces
+        self.ventana.after_idle(self._fin_actualizacion)
+    
+    def _fin_actualizacion(self):
+        self._actualizando = False
+    
+    def _indice(self):
+        """Índice (de abajo arriba) de la capa seleccionada o None"""
+        seleccion = self.tabla.selection()
+        return int(seleccion[0]) if seleccion else None
+    
+    def _en_seleccion(self, _event):
+        indice = self._indice()
+        if not self._actualizando and indice is not None and not self._capas[indice]["activa"]:
+            self._callbacks['activar'](indice)
+    
+    def _en_propiedades(self):
+        if self._actualizando or self._indice() is None:
+            return
+        self._callbacks['modificar'](self._indice(), self.visible.get(),
+                                     self.opacidad.get() / 100, self.modo.get())
+    
+    def _mover(self, paso):
+        indice = self._indice()
+        if indice is not None and 0 <= indice + paso < len(self._capas):
+            self._callbacks['mover'](indice, indice + paso)
+    
+    def cerrar(self):
+        """Cierra la ventana"""
+        self.ventana.destroy()
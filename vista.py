@@ -0,0 +1,283 @@
+"""
+Módulo de la vista de la imagen
+Pirámide de resoluciones con caché por bloques y viewport con zoom y desplazamiento.
+No depende de tkinter: produce arrays de NumPy listos para mostrar.
+"""
+
+import math
+from collections import OrderedDict
+import numpy as np
+import config
+
+
+class PiramideImagen:
+    """
+    Pirámide de reducciones (filtro de caja 2x2 sobre el nivel anterior)
+    construida por bloques bajo demanda
+    """
+
+    def __init__(self, fuente, tamano_bloque=None, max_bloques=None):
+        """
+        Args:
+            fuente (ndarray): Imagen a resolución completa (alto x ancho x 3)
+            tamano_bloque (int): Lado de los bloques de cada nivel
+            max_bloques (int): Número máximo de bloques guardados en caché
+        """
+        self.fuente = fuente
+        self.tamano_bloque = tamano_bloque or config.PIRAMIDE_TAMANO_BLOQUE
+        self.max_bloques = max_bloques or config.PIRAMIDE_MAX_BLOQUES
+        self._bloques = OrderedDict()   # (nivel, fila, columna) -> ndarray
+
+    @property
+    def max_nivel(self):
+        """Último nivel útil (aquel en el que la imagen mide 1 píxel en su lado mayor)"""
+        alto, ancho = self.fuente.shape[:2]
+        return max(0, int(math.ceil(math.log2(max(ancho, alto, 1)))))
+
+    def dimensiones(self, nivel):
+        """
+        Args:
+            nivel (int): Nivel de la pirámide (0 = resolución completa)
+
+        Returns:
+            tuple: (ancho, alto) del nivel
+        """
+        alto, ancho = self.fuente.shape[:2]
+        factor = 1 << nivel
+        return -(-ancho // factor), -(-alto // factor)
+
+    def nivel_para_zoom(self, zoom):
+        """
+        Nivel más reducido cuya resolución sigue siendo mayor o igual a la pedida
+
+        Args:
+            zoom (float): Píxeles de pantalla por píxel de imagen
+
+        Returns:
+            int: Nivel de la pirámide
+        """
+        if zoom >= 1:
+            return 0
+        return min(self.max_nivel, int(math.floor(math.log2(1 / zoom))))
+
+    def _calcular_bloque(self, nivel, fila, columna):
+        """
+        Reduce 2x2 los bloques del nivel anterior que cubren un bloque (que
+        salen de la caché), así que cada nivel lee a lo sumo cuatro bloques en
+        vez de todo el trozo de la imagen a resolución completa
+        """
+        tam = self.tamano_bloque
+        ancho, alto = self.dimensiones(nivel)
+        ancho_previo, alto_previo = self.dimensiones(nivel - 1)
+        y0, x0 = fila * tam, columna * tam
+        y1, x1 = min(y0 + tam, alto), min(x0 + tam, ancho)
+        trozo = self.leer(nivel - 1, 2 * x0, 2 * y0,
+                          min(2 * x1, ancho_previo), min(2 * y1, alto_previo))
+
+        # Con un número impar de filas o columnas se repite la última: la media
+        # de la pareja incompleta es entonces la de sus píxeles reales
+        impar_y, impar_x = trozo.shape[0] % 2, trozo.shape[1] % 2
+        if impar_y or impar_x:
+            trozo = np.pad(trozo, ((0, impar_y), (0, impar_x), (0, 0)), mode="edge")
+
+        suma = trozo[0::2, 0::2].astype(np.uint16)
+        suma += trozo[1::2, 0::2]
+        suma += trozo[0::2, 1::2]
+        suma += trozo[1::2, 1::2]
+        suma += 2
+        suma >>= 2
+        return suma.astype(np.uint8)
+
+    def bloque(self, nivel, fila, columna):
+        """
+        Devuelve un bloque de un nivel, calculándolo solo si no está en caché
+
+        Args:
+            nivel, fila, columna (int): Posición del bloque
+
+        Returns:
+            ndarray: Píxeles del bloque
+        """
+        if nivel == 0:
+            tam = self.tamano_bloque
+            return self.fuente[fila * tam:(fila + 1) * tam, columna * tam:(columna + 1) * tam]
+
+        clave = (nivel, fila, columna)
+        bloque = self._bloques.get(clave)
+        if bloque is not None:
+            self._bloques.move_to_end(clave)
+            return bloque
+
+        bloque = self._calcular_bloque(nivel, fila, columna)
+        self._bloques[clave] = bloque
+        while len(self._bloques) > self.max_bloques:
+            self._bloques.popitem(last=False)
+        return bloque
+
+    def leer(self, nivel, x0, y0, x1, y1):
+        """
+        Lee un rectángulo de un nivel ensamblando los bloques necesarios
+
+        Args:
+            nivel (int): Nivel de la pirámide
+            x0, y0, x1, y1 (int): Rectángulo en coordenadas del nivel (extremo final exclusivo)
+
+        Returns:
+            ndarray: Píxeles del rectángulo
+        """
+        if nivel == 0:
+            return self.fuente[y0:y1, x0:x1]
+
+        tam = self.tamano_bloque
+        salida = np.empty((y1 - y0, x1 - x0, 3), dtype=np.uint8)
+        for fila in range(y0 // tam, (y1 - 1) // tam + 1):
+            for columna in range(x0 // tam, (x1 - 1) // tam + 1):
+                bloque = self.bloque(nivel, fila, columna)
+                by, bx = fila * tam, columna * tam
+                sy0, sy1 = max(y0, by), min(y1, by + bloque.shape[0])
+                sx0, sx1 = max(x0, bx), min(x1, bx + bloque.shape[1])
+                salida[sy0 - y0:sy1 - y0, sx0 - x0:sx1 - x0] = \
+                    bloque[sy0 - by:sy1 - by, sx0 - bx:sx1 - bx]
+        return salida
+
+    def invalidar(self, region):
+        """
+        Descarta los bloques de todos los niveles que cubren una región modificada
+
+        Args:
+            region (tuple): (x_min, y_min, x_max, y_max) en coordenadas de la imagen
+        """
+        x_min, y_min, x_max, y_max = region
+        tam = self.tamano_bloque
+        for clave in list(self._bloques):
+            nivel, fila, columna = clave
+            lado = tam << nivel
+            if (columna * lado < x_max and (columna + 1) * lado > x_min and
+                    fila * lado < y_max and (fila + 1) * lado > y_min):
+                del self._bloques[clave]
+
+
+class Viewport:
+    """Transformación entre el canvas y la imagen (zoom y desplazamiento)"""
+
+    def __init__(self, ancho, alto):
+        """
+        Args:
+            ancho, alto (int): Tamaño de la vista en píxeles de pantalla
+        """
+        self.ancho = ancho
+        self.alto = alto
+        self.zoom = 1.0        # Píxeles de pantalla por píxel de imagen
+        self.origen_x = 0.0    # Coordenada de la imagen en el borde izquierdo de la vista
+        self.origen_y = 0.0    # Coordenada de la imagen en el borde superior de la vista
+        self.zoom_min = 1.0
+
+    def ajustar(self, ancho_img, alto_img):
+        """Ajusta el zoom para ver la imagen completa y la centra"""
+        self.zoom = min(self.ancho / ancho_img, self.alto / alto_img)
+        self.zoom_min = min(self.zoom, 1.0)
+        self.origen_x = (ancho_img - self.ancho / self.zoom) / 2
+        self.origen_y = (alto_img - self.alto / self.zoom) / 2
+
+    def canvas_a_imagen(self, x, y):
+        """
+        Args:
+            x, y (float): Coordenadas en la vista
+
+        Returns:
+            tuple: (x, y) enteros del píxel de la imagen bajo ese punto
+        """
+        return (math.floor(self.origen_x + x / self.zoom),
+                math.floor(self.origen_y + y / self.zoom))
+
+    def imagen_a_canvas(self, x, y):
+        """
+        Args:
+            x, y (float): Coordenadas en la imagen
+
+        Returns:
+            tuple: (x, y) en la vista
+        """
+        return (x - self.origen_x) * self.zoom, (y - self.origen_y) * self.zoom
+
+    def hacer_zoom(self, factor, x, y):
+        """
+        Cambia el zoom manteniendo fijo el punto de la imagen bajo (x, y)
+
+        Args:
+            factor (float): Multiplicador del zoom
+            x, y (float): Punto de la vista que queda fijo
+        """
+        nuevo = min(config.ZOOM_MAX, max(self.zoom_min, self.zoom * factor))
+        img_x = self.origen_x + x / self.zoom
+        img_y = self.origen_y + y / self.zoom
+        self.zoom = nuevo
+        self.origen_x = img_x - x / nuevo
+        self.origen_y = img_y - y / nuevo
+
+    def desplazar(self, dx, dy):
+        """Desplaza la vista (dx, dy) píxeles de pantalla"""
+        self.origen_x -= dx / self.zoom
+        self.origen_y -= dy / self.zoom
+
+    def region_en_vista(self, region):
+        """
+        Convierte una región de la imagen al rectángulo de la vista que la muestra
+
+        Args:
+            region (tuple): (x_min, y_min, x_max, y_max) en la imagen
+
+        Returns:
+            tuple: (x0, y0, x1, y1) en la vista o None si no es visible
+        """
+        x_min, y_min, x_max, y_max = region
+        vx0, vy0 = self.imagen_a_canvas(x_min, y_min)
+        vx1, vy1 = self.imagen_a_canvas(x_max, y_max)
+        vx0 = max(0, int(math.floor(vx0)))
+        vy0 = max(0, int(math.floor(vy0)))
+        vx1 = min(self.ancho, int(math.ceil(vx1)))
+        vy1 = min(self.alto, int(math.ceil(vy1)))
+        if vx1 <= vx0 or vy1 <= vy0:
+            return None
+        return vx0, vy0, vx1, vy1
+
+    def renderizar(self, piramide, rect=None, fondo=(236, 240, 241)):
+        """
+        Genera los píxeles de pantalla de un rectángulo de la vista
+
+        Args:
+            piramide (PiramideImagen): Origen de los píxeles
+            rect (tuple): (x0, y0, x1, y1) de la vista; None para la vista completa
+            fondo (tuple): Color RGB de la zona fuera de la imagen
+
+        Returns:
+            ndarray: Píxeles del rectángulo (alto x ancho x 3)
+        """
+        x0, y0, x1, y1 = rect or (0, 0, self.ancho, self.alto)
+        salida = np.empty((y1 - y0, x1 - x0, 3), dtype=np.uint8)
+        salida[:] = fondo
+
+        # Nivel con resolución suficiente y posición de cada píxel de pantalla en él
+        nivel = piramide.nivel_para_zoom(self.zoom)
+        escala = 1.0 / (self.zoom * (1 << nivel))
+        ancho_n, alto_n = piramide.dimensiones(nivel)
+        origen_x = self.origen_x / (1 << nivel)
+        origen_y = self.origen_y / (1 << nivel)
+        columnas = np.floor(origen_x + (np.arange(x0, x1) + 0.5) * escala).astype(np.int64)
+        filas = np.floor(origen_y + (np.arange(y0, y1) + 0.5) * escala).astype(np.int64)
+
+        validas_x = np.nonzero((columnas >= 0) & (columnas < ancho_n))[0]
+        validas_y = np.nonzero((filas >= 0) & (filas < alto_n))[0]
+        if len(validas_x) == 0 or len(validas_y) == 0:
+            return salida
+
+        columnas = columnas[validas_x]
+        filas = filas[validas_y]
+        c0, c1 = int(columnas[0]), int(columnas[-1]) + 1
+        f0, f1 = int(filas[0]), int(filas[-1]) + 1
+        trozo = piramide.leer(nivel, c0, f0, c1, f1)
+
+        # Vecino más cercano: indexar filas y columnas del trozo leído
+        salida[validas_y[0]:validas_y[-1] + 1, validas_x[0]:validas_x[-1] + 1] = \
+            trozo[(filas - f0)[:, None], (columnas - c0)[None, :]]
+        return salida